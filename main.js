@@ -1,12 +1,26 @@
-let simulation;
-let canvas, context;
+let canvas, context, zoom;
 let networkData = null;
 let visibleLayers = -1;
 let maxLayers = 0;
 let nodes = [];
 let links = [];
+let nodeTree = null; // quadtree of `nodes` by position, for finding the clicked node
 let transform = d3.zoomIdentity;
 let isLoad = true;
+let scopingGraphData = null; // graph data object handed over by `main.py`, read on (re)load
+
+// Called from `main.py` (so it has to be a property of `window`) with the columnar
+// graph data built by the scoping worker. Results arrive asynchronously, so a graph
+// that is already shown is redrawn right away, and otherwise loaded when it is shown.
+window.setScopingData = (graphData) => {
+    scopingGraphData = graphData;
+    if (context) {
+        loadData();
+        isLoad = false;
+    } else {
+        isLoad = true;
+    }
+};
 
 const width = 1000;
 const height = 600;
@@ -15,7 +29,8 @@ const nodeRadius = 6;
 const init = () => {
     canvas = d3.select("#networkCanvas");
     context = canvas.node().getContext("2d");
-    canvas.call(d3.zoom().scaleExtent([0.1, 4]).on("zoom", zoomed));
+    zoom = d3.zoom().scaleExtent([0.001, 4]).on("zoom", zoomed);
+    canvas.call(zoom);
     canvas.on("click", handleCanvasClick);
 };
 
@@ -28,50 +43,48 @@ const handleCanvasClick = (event) => {
     const [mouseX, mouseY] = d3.pointer(event);
     const [x, y] = transform.invert([mouseX, mouseY]);
 
-    const clickedNode = nodes.find((node) => {
-        const dx = x - node.x;
-        const dy = y - node.y;
-        return Math.sqrt(dx * dx + dy * dy) < nodeRadius + 5;
-    });
+    const clickedNode = nodeTree && nodeTree.find(x, y, nodeRadius + 5);
 
     if (clickedNode) {
         showNodeDetails(clickedNode);
     }
 };
 
-const hasConnections = (nodeId, links) => {
-    return links.some(
-        (link) =>
-            link.source === nodeId ||
-            link.target === nodeId ||
-            (typeof link.source === "object" && link.source.id === nodeId) ||
-            (typeof link.target === "object" && link.target.id === nodeId)
-    );
-};
-
-const getClusterX = () => {
-    return networkData && networkData.is_forward ? width - 80 : 80;
-};
-
-const getNodeX = (node) => {
-    if (node.isolated || !node.visible) {
-        return getClusterX();
-    }
-
-    if (networkData.is_forward) {
-        return width * (0.1 + (0.8 * node.group) / maxLayers);
-    } else {
-        return width * (0.9 - (0.8 * node.group) / maxLayers);
-    }
+// Ids of the nodes with at least one link, so isolated nodes can be found without scanning the links for each node
+const getConnectedIds = (links) => {
+    const connectedIds = new Set();
+    links.forEach((link) => {
+        connectedIds.add(link.source);
+        connectedIds.add(link.target);
+    });
+    return connectedIds;
 };
 
 const loadData = () => {
-    networkData = JSON.parse(window.localStorage.getItem("scoping_data"));
-
-    maxLayers = Math.max(...networkData.nodes.map((n) => n.group));
+    if (!scopingGraphData) return;
+    // Nodes and links arrive as columns, with nodes referred to by their index
+    const data = scopingGraphData;
+    networkData = {
+        is_forward: data.is_forward,
+        nodes: data.nodes.name.map((name, id) => ({
+            id: id,
+            name: name,
+            group: data.nodes.group[id],
+            precondition: data.nodes.precondition[id],
+            effect: data.nodes.effect[id],
+            members: data.nodes.members[id],
+            x: data.nodes.x[id],
+            y: data.nodes.y[id],
+        })),
+        links: data.links.source.map((source, i) => ({
+            source: source,
+            target: data.links.target[i],
+        })),
+    };
+
+    maxLayers = data.nodes.group.reduce((a, b) => Math.max(a, b), 0);
     visibleLayers = -1;
 
-    nodes = [];
     updateButtons();
     createNetwork();
 };
@@ -79,135 +92,114 @@ const loadData = () => {
 const createNetwork = () => {
     if (!networkData) return;
 
-    const clusterX = getClusterX();
-
-    if (nodes.length === 0) {
-        nodes = networkData.nodes.map((d, index) => {
-            return {
-                ...d,
-                x: clusterX + (Math.random() - 0.5) * 60,
-                y: height / 2 + (Math.random() - 0.5) * height * 0.6,
-                visible: d.group <= visibleLayers,
-                isolated: !hasConnections(d.id, networkData.links),
-            };
-        });
-    } else {
-        nodes.forEach((node) => {
-            node.visible = node.group <= visibleLayers;
-            node.isolated = !hasConnections(node.id, networkData.links);
-        });
-    }
+    const connectedIds = getConnectedIds(networkData.links);
+
+    // Nodes are drawn where the layered layout computed by the scoping worker put them
+    nodes = networkData.nodes.map((d) => {
+        return {
+            ...d,
+            visible: d.group <= visibleLayers,
+            isolated: !connectedIds.has(d.id),
+        };
+    });
 
+    // Node ids are their positions in `nodes`
     links = networkData.links.map((d) => ({
-        source: nodes.find((n) => n.id === d.source),
-        target: nodes.find((n) => n.id === d.target),
+        source: nodes[d.source],
+        target: nodes[d.target],
     }));
 
-    if (simulation) simulation.stop();
-
-    simulation = d3
-        .forceSimulation(nodes)
-        .force(
-            "link",
-            d3
-                .forceLink(links)
-                .id((d) => d.id)
-                .strength((d) => {
-                    return d.source.visible && d.target.visible ? 0.6 : 0.1;
-                })
-                .distance((d) => {
-                    return d.source.visible && d.target.visible ? 80 : 20;
-                })
-        )
-        .force(
-            "charge",
-            d3.forceManyBody().strength((d) => {
-                return d.visible && !d.isolated ? -200 : -50;
-            })
-        )
-        .force(
-            "x",
-            d3
-                .forceX((d) => getNodeX(d))
-                .strength((d) => {
-                    if (d.isolated) return 3.0;
-                    return d.visible ? 2.5 : 2.0;
-                })
-        )
-        .force(
-            "y",
-            d3.forceY(height / 2).strength((d) => {
-                if (d.isolated) return 1.0;
-                return d.visible ? 0.1 : 0.8;
-            })
-        )
-        .force(
-            "collision",
-            d3.forceCollide((d) => {
-                if (d.isolated) return nodeRadius + 2;
-                return d.visible ? nodeRadius + 8 : nodeRadius + 1;
-            })
-        )
-        .force("sameLayerRepulsion", () => {
-            nodes.forEach((nodeA) => {
-                if (!nodeA.visible || nodeA.isolated) return;
-
-                nodes.forEach((nodeB) => {
-                    if (
-                        !nodeB.visible ||
-                        nodeB.isolated ||
-                        nodeA === nodeB ||
-                        nodeA.group !== nodeB.group
-                    )
-                        return;
-
-                    const dx = nodeB.x - nodeA.x;
-                    const dy = nodeB.y - nodeA.y;
-                    const distance = Math.sqrt(dx * dx + dy * dy);
-
-                    if (distance < 150) {
-                        const force = ((150 - distance) / distance) * 0.3;
-                        const fx = dx * force;
-                        const fy = dy * force;
-
-                        nodeA.vx -= fx;
-                        nodeA.vy -= fy;
-                        nodeB.vx += fx;
-                        nodeB.vy += fy;
-                    }
-                });
-            });
-        })
-        .on("tick", drawNetwork);
-
-    simulation.alpha(0.8).restart();
+    // Node positions are fixed, so the quadtree only has to be built once per load
+    nodeTree = d3.quadtree(nodes, (node) => node.x, (node) => node.y);
+
+    fitView();
+};
+
+// Zooms to fit the linked nodes (or all of them, if there are no links), since the
+// operators that aren't in the graph can make a very long column of their own
+const fitView = () => {
+    const connectedNodes = nodes.filter((node) => !node.isolated);
+    const fitNodes = connectedNodes.length ? connectedNodes : nodes;
+    if (!fitNodes.length) return;
+
+    const [x0, x1] = d3.extent(fitNodes, (node) => node.x);
+    const [y0, y1] = d3.extent(fitNodes, (node) => node.y);
+    const margin = 40;
+    const scale = Math.min(
+        4,
+        (width - 2 * margin) / Math.max(x1 - x0, 1),
+        (height - 2 * margin) / Math.max(y1 - y0, 1)
+    );
+    const fitTransform = d3.zoomIdentity
+        .translate(width / 2, height / 2)
+        .scale(scale)
+        .translate(-(x0 + x1) / 2, -(y0 + y1) / 2);
+    // Calls `zoomed`, which redraws the graph
+    canvas.call(zoom.transform, fitTransform);
+};
+
+// Shows the layers up to `visibleLayers`
+const updateVisibleLayers = () => {
+    nodes.forEach((node) => {
+        node.visible = node.group <= visibleLayers;
+    });
+    drawNetwork();
+};
+
+// Above this many nodes, the hidden layers are drawn without outlines or labels, and
+// labels are only drawn when zoomed in enough to read them
+const largeGraphNodeCount = 500;
+const minLabelScale = 0.8;
+
+// The part of the graph's coordinates that is on screen, plus a margin for labels
+const getViewBounds = () => {
+    const margin = nodeRadius + 40;
+    const [x0, y0] = transform.invert([0, 0]);
+    const [x1, y1] = transform.invert([width, height]);
+    return { x0: x0 - margin, y0: y0 - margin, x1: x1 + margin, y1: y1 + margin };
 };
 
+const isOnScreen = (node, bounds) =>
+    node.x >= bounds.x0 && node.x <= bounds.x1 && node.y >= bounds.y0 && node.y <= bounds.y1;
+
+const isLinkOnScreen = (link, bounds) =>
+    Math.max(link.source.x, link.target.x) >= bounds.x0 &&
+    Math.min(link.source.x, link.target.x) <= bounds.x1 &&
+    Math.max(link.source.y, link.target.y) >= bounds.y0 &&
+    Math.min(link.source.y, link.target.y) <= bounds.y1;
+
 const drawNetwork = () => {
+    const bounds = getViewBounds();
+    const isLargeGraph = nodes.length > largeGraphNodeCount;
+    const showLabels = !isLargeGraph || transform.k >= minLabelScale;
+
     context.save();
     context.clearRect(0, 0, width, height);
     context.translate(transform.x, transform.y);
     context.scale(transform.k, transform.k);
 
+    const visibleLinks = links.filter(
+        (link) => link.source.visible && link.target.visible && isLinkOnScreen(link, bounds)
+    );
+
     context.beginPath();
     context.strokeStyle = "#999";
     context.lineWidth = 1.5;
-    links.forEach((link) => {
-        if (link.source.visible && link.target.visible) {
-            context.moveTo(link.source.x, link.source.y);
-            context.lineTo(link.target.x, link.target.y);
-        }
+    visibleLinks.forEach((link) => {
+        context.moveTo(link.source.x, link.source.y);
+        context.lineTo(link.target.x, link.target.y);
     });
     context.stroke();
 
     context.fillStyle = "#666";
-    links.forEach((link) => {
-        if (link.source.visible && link.target.visible) {
-            drawArrowhead(context, link.source, link.target);
-        }
+    visibleLinks.forEach((link) => {
+        drawArrowhead(context, link.source, link.target);
     });
 
     nodes.forEach((node) => {
+        if (!isOnScreen(node, bounds)) return;
+        const isDetailed = node.visible || !isLargeGraph;
+
         context.beginPath();
         context.arc(node.x, node.y, nodeRadius, 0, 2 * Math.PI);
 
@@ -223,15 +215,18 @@ const drawNetwork = () => {
         }
 
         context.fill();
+        if (!isDetailed) return;
+
         context.strokeStyle = node.visible ? "#333" : "#555";
         context.lineWidth = node.visible ? 2 : 1.5;
         context.stroke();
 
+        if (!showLabels) return;
         context.globalAlpha = node.visible ? 1.0 : 0.8;
         context.fillStyle = "#333";
         context.font = "11px Arial";
         context.textAlign = "center";
-        context.fillText(node.id, node.x, node.y - nodeRadius - 5);
+        context.fillText(node.name, node.x, node.y - nodeRadius - 5);
     });
 
     context.globalAlpha = 1.0;
@@ -286,7 +281,7 @@ const stepForward = () => {
     if (visibleLayers < maxLayers) {
         visibleLayers++;
 
-        createNetwork();
+        updateVisibleLayers();
         updateButtons();
     }
 };
@@ -300,7 +295,7 @@ const stepBack = () => {
     if (visibleLayers >= 0) {
         visibleLayers--;
 
-        createNetwork();
+        updateVisibleLayers();
         updateButtons();
     }
 };
@@ -317,12 +312,20 @@ const showNodeDetails = (node) => {
         ? node.precondition.join(", ")
         : "None";
     const effects = node.effect ? node.effect.join(", ") : "None";
+    // Collapsed nodes stand for several equivalent actions, listed in an expandable section
+    const members = node.members
+        ? `<details>
+                    <summary><strong>${node.members.length} equivalent actions</strong></summary>
+                    <p>${node.members.join("<br>")}</p>
+                </details>`
+        : "";
 
     detailsDiv.innerHTML = `
                 <h3>Node Details</h3>
-                <h4>${node.id}</h4>
+                <h4>${node.name}</h4>
                 <p><strong>Preconditions:</strong><br>${preconditions}</p>
                 <p><strong>Effects:</strong><br>${effects || "None"}</p>
+                ${members}
             `;
 };
 
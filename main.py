@@ -1,14 +1,8 @@
-from browser import bind, window, document
-from browser.local_storage import storage
+from browser import bind, window, document, worker
 
 import json
-import io
 
 from scoping.options import ScopingOptions
-from scoping.task import ScopingTask
-from scoping.sas_parser import SasParser
-from scoping.visualization import TaskGraph
-from scoping.core import scope
 
 
 # DOM elements (accessed by `id` attribute in index.html)
@@ -19,27 +13,46 @@ ENABLE_MERGING = document["enable_merging"]
 ENABLE_FACT_BASED = document["enable_fact_based"]
 ENABLE_FORWARD_PASS = document["enable_forward_pass"]
 ENABLE_LOOP = document["enable_loop"]
+COLLAPSE_ACTIONS = document["collapse_actions"]
 START_BTN = document["start"]
 NEXT_BTN = document["next"]
 PREV_BTN = document["prev"]
+CANCEL_BTN = document["cancel"]
+STATUS = document["status"]
 
 
 # Global objects (remember to access these with the `global` keyword in functions)
-sas_parser = SasParser(s_sas="")
-sas_task = None
-graph = None
 scoping_options = ScopingOptions(
     enable_causal_links=False,
     enable_merging=False,
     enable_forward_pass=False,
     enable_loop=False
 )
+# Whether the graph shows one node per group of equivalent actions (see
+# `TaskGraph.collapse`)
+collapse_actions = False
 layer_count = 0 # actual/total number of layers in the graph
 visible_layers = 1 # number of layers currently in the graph (nodes that are bunched up on the left/right without any links adjacent to them are not considered) -- lines up with the number of "visualize"-"visualize back" button clicks
 
+# Scoping runs in a Web Worker (`scoping_worker.py`), so the page stays responsive.
+# Every request gets a new job number, and messages about older jobs are ignored.
+scoping_worker = None  # set once the worker has started
+worker_busy = False
+pending_request = None  # request waiting for the worker to start
+job_count = 0
+
+# Every option combination scopes the task as it was uploaded (not the scoped task in
+# the `sas_content` textarea), and the results for the current upload are cached, so
+# switching back to a combination that was already computed is instant
+uploaded_sas = None
+upload_count = 0
+# option combination (see `get_options_key`) -> result message from the worker
+result_cache = {}
+# option combination of the current job, under which its result is cached
+requested_key = None
+
 
 def visualize(step_back=False):
-    global graph
     global layer_count
     global visible_layers
 
@@ -64,65 +77,168 @@ def visualize(step_back=False):
     visible_layers += 1
 
 
-@bind(UPLOAD_BTN, "input")
-def file_read(ev):
+def set_status(text):
+    STATUS.text = text
+
+
+def start_worker():
+    worker.create_worker(
+        "scoping_worker", on_worker_ready, on_worker_message, on_worker_error
+    )
+
+
+def on_worker_ready(new_worker):
+    global scoping_worker
+
+    scoping_worker = new_worker
+    send_pending_request()
+
+
+def send_pending_request():
+    global pending_request
+    global worker_busy
+
+    if scoping_worker is None or pending_request is None:
+        return
+    scoping_worker.send(pending_request)
+    pending_request = None
+    worker_busy = True
+    CANCEL_BTN.disabled = False
+
+
+def get_options():
+    return {
+        "enable_causal_links": scoping_options.enable_causal_links,
+        "enable_merging": scoping_options.enable_merging,
+        "enable_fact_based": scoping_options.enable_fact_based,
+        "enable_forward_pass": scoping_options.enable_forward_pass,
+        "enable_loop": scoping_options.enable_loop,
+    }
+
+
+def get_options_key(options, collapse):
+    return tuple(options[name] for name in sorted(options)) + (collapse,)
+
+
+def request_scoping():
+    # Shows the cached result for the current options, or else sends the uploaded SAS
+    # content and the options to the worker. Either way, any job that is still running
+    # is cancelled
+    global job_count
+    global pending_request
+    global requested_key
+
+    if worker_busy:
+        cancel_scoping()
+    job_count += 1
+    options = get_options()
+    requested_key = get_options_key(options, collapse_actions)
+    cached_result = result_cache.get(requested_key)
+    if cached_result is not None:
+        show_result(cached_result)
+        return
+    pending_request = json.dumps(
+        {
+            "job": job_count,
+            "upload": upload_count,
+            "sas_content": uploaded_sas,
+            "options": options,
+            "collapse_actions": collapse_actions,
+        }
+    )
+    set_status("Starting...")
+    send_pending_request()
+
+
+def cancel_scoping():
+    global scoping_worker
+    global worker_busy
+    global pending_request
+
+    pending_request = None
+    if worker_busy:
+        # The worker can't be interrupted mid-computation, so replace it with a new one
+        scoping_worker.terminate()
+        scoping_worker = None
+        worker_busy = False
+        start_worker()
+    CANCEL_BTN.disabled = True
+    set_status("Cancelled")
+
+
+def on_worker_message(ev):
+    global worker_busy
+
+    # Parsed by the browser rather than by `json.loads`, so the (possibly large) graph
+    # data stays a JavaScript object that is passed to `main.js` without being
+    # converted to Python and back
+    message = window.JSON.parse(ev.data)
+    if message.job != job_count:
+        return  # stale message from a job that has been superseded
+    if message.type == "progress":
+        set_status(message.stage + "...")
+        return
+
+    worker_busy = False
+    CANCEL_BTN.disabled = True
+    if message.type == "error":
+        set_status("Scoping failed: " + message.message)
+        return
+
+    result_cache[requested_key] = message
+    show_result(message)
+
+
+def show_result(result):
     global layer_count
+    global visible_layers
+
+    send_graph(result.graph)
+    # saves scoped task SAS to the DOM (for downloading purposes, can also be displayed
+    # in the DOM)
+    document["sas_content"].value = result.sas_content
+    layer_count = result.layer_count
+    visible_layers = 1
+    set_status("")
+    START_BTN.disabled = False
+    NEXT_BTN.disabled = False
+
+
+def on_worker_error(ev):
+    global worker_busy
 
+    worker_busy = False
+    CANCEL_BTN.disabled = True
+    set_status("Scoping worker error")
+
+
+@bind(UPLOAD_BTN, "input")
+def file_read(ev):
     def onload(event):
+        global uploaded_sas
+        global upload_count
+
         DOWNLOAD_BTN.style.display = "inline"
         DOWNLOAD_BTN.attrs["download"] = file.name
 
-        scoped_task, layers = read_sas(event.target.result) # creates scoped task and graph data
-        write_json(layers)
-
-        f = io.StringIO()
-        scoped_task.to_sas().output(f)
-        document['sas_content'].value = f.getvalue() # saves scoped task SAS to the DOM (for downloading purposes, can also be displayed in the DOM)
-
-        NEXT_BTN.disabled = False
+        uploaded_sas = event.target.result
+        upload_count += 1
+        result_cache.clear()
+        request_scoping()  # creates scoped task and graph data in the worker
 
     file = UPLOAD_BTN.files[0]
     reader = window.FileReader.new()
     reader.readAsText(file)
     reader.bind("load", onload)
-    START_BTN.disabled = False
-
-
-def read_sas(sas_file):
-    global sas_task
-    global graph
-    global layer_count
-
-    # Read uploaded .sas file
-    sas_parser.s_sas = sas_file
-    sas_parser.parse()
-    sas_task = sas_parser.to_fd()
-
-    # Run scoping
-    scoping_task = ScopingTask.from_sas(sas_task)
-
-    # Build graph for visualization
-    graph = TaskGraph(scoping_task, scoping_options)
-    scoped_task = scope(scoping_task, scoping_options)
-    graph.layers = [l for l in graph.layers if l]
-    layer_count = len(graph.layers)
-
-    return scoped_task, graph.layers
 
 
 def update_sas():
-    # This function is useful when the enable/disable buttons are clicked (e.g. enable forward pass)
-    # Recreates the scoped task and graph data, saves the new scoped task SAS in the DOM, and resets the layer counter
-
-    global visible_layers
-
-    scoped_task, layers = read_sas(document['sas_content'].value)
-    write_json(layers)
-
-    f = io.StringIO()
-    scoped_task.to_sas().output(f)
-    document['sas_content'].value = f.getvalue()
-    visible_layers = 1
+    # This function is useful when the enable/disable buttons are clicked (e.g. enable
+    # forward pass)
+    # Recreates (or fetches from the cache) the scoped task and graph data, saves the
+    # new scoped task SAS in the DOM, and resets the layer counter
+    if uploaded_sas is not None:
+        request_scoping()
 
 
 @bind(DOWNLOAD_BTN, "mousedown")
@@ -135,35 +251,38 @@ def mousedown(ev):
 def toggle_causal_links(ev):
     scoping_options.enable_causal_links = not scoping_options.enable_causal_links
     update_sas()
-    NEXT_BTN.disabled = False
 
 
 @bind(ENABLE_MERGING, "click")
 def toggle_merging(ev):
     scoping_options.enable_merging = not scoping_options.enable_merging
     update_sas()
-    NEXT_BTN.disabled = False
 
 
 @bind(ENABLE_FACT_BASED, "click")
 def toggle_fact_based(ev):
     scoping_options.enable_fact_based = not scoping_options.enable_fact_based
     update_sas()
-    NEXT_BTN.disabled = False
 
 
 @bind(ENABLE_FORWARD_PASS, "click")
 def toggle_forward_pass(ev):
     scoping_options.enable_forward_pass = not scoping_options.enable_forward_pass
     update_sas()
-    NEXT_BTN.disabled = False
 
 
 @bind(ENABLE_LOOP, "click")
 def toggle_loop(ev):
     scoping_options.enable_loop = not scoping_options.enable_loop
     update_sas()
-    NEXT_BTN.disabled = False
+
+
+@bind(COLLAPSE_ACTIONS, "click")
+def toggle_collapse_actions(ev):
+    global collapse_actions
+
+    collapse_actions = not collapse_actions
+    update_sas()
 
 
 @bind(NEXT_BTN, "click")
@@ -176,28 +295,15 @@ def run_visualize_backwards(ev):
     visualize(step_back=True)
 
 
-def write_json(layers):
-    data = {"nodes": [], "links": [], "is_forward": None} # graph data to be saved in localStorage and then read in `main.js`
-    node_names = [] # auxiliary var for building `data`
+@bind(CANCEL_BTN, "click")
+def run_cancel(ev):
+    cancel_scoping()
 
-    for i in range(len(layers)):
-        layer = layers[i]
-        for node in layer:
-            if node.name not in node_names:
-                node_names.append(node.name)
-                precondition = list(map(lambda tup: " ".join(str(x) for x in tup), node.precondition))
-                effect = list(map(lambda tup: " ".join(str(x) for x in tup), node.effect))
-                data["nodes"].append(
-                    {"id": node.name, "group": i, "precondition": precondition, "effect": effect}
-                )
-                for p in node.parents:
-                    data["links"].append({"source": p.name, "target": node.name})
 
-    for op in sas_task.operators:
-        if op.name not in node_names:
-            node_names.append(op.name)
-            data["nodes"].append({"id": op.name, "group": len(layers)})
+def send_graph(graph_data):
+    # Hands the graph data parsed from the worker's message straight to `main.js`,
+    # which reads it when the graph is (re)loaded
+    window.setScopingData(graph_data)
 
-    data["is_forward"] = scoping_options.enable_forward_pass
 
-    storage["scoping_data"] = json.dumps(data)
+start_worker()
@@ -1,71 +1,160 @@
-from typing import Any, List, Tuple
+from typing import Any, Iterable, Tuple, Union
 
 from translate.sas_tasks import SASOperator
-from scoping.factset import FactSet, VarValPair
+from scoping.factset import VarValPair
+
+
+def get_prevail(
+    precondition: Tuple[VarValPair, ...], effect: Tuple[VarValPair, ...]
+) -> Tuple[VarValPair, ...]:
+    """Get the precondition facts whose variables the effect leaves unchanged"""
+    effect_values = {}
+    for var, val in effect:
+        effect_values.setdefault(var, set()).add(val)
+
+    def is_prevail(var_val: VarValPair):
+        var, val = var_val
+        if var not in effect_values:
+            return True
+        return effect_values[var] == {val}
+
+    return tuple(fact for fact in precondition if is_prevail(fact))
+
+
+def get_pre_post(
+    precondition: Tuple[VarValPair, ...],
+    effect: Tuple[VarValPair, ...],
+    prevail: Tuple[VarValPair, ...],
+) -> Tuple[Tuple[int, int, int, Tuple[VarValPair, ...]], ...]:
+    """Get the SAS (var, pre, post, conditions) effects, where pre is -1 if the
+    precondition doesn't constrain var"""
+    prevails = set(prevail)
+    precond_values = {}
+    for var, val in precondition:
+        if (var, val) not in prevails:
+            precond_values.setdefault(var, []).append(val)
+
+    def get_precond(var):
+        if precond_values.get(var):
+            return precond_values[var].pop()
+        return -1
+
+    return tuple(
+        (var, get_precond(var), val, ())
+        for var, val in effect
+        if (var, val) not in prevails
+    )
 
 
 class VarValAction:
+    """An immutable action whose precondition and effect are sorted tuples of facts
+
+    The hash, prevail and pre_post are computed at most once per action, since
+    actions are hashed and compared on every iteration of the scoping fixpoints.
+    """
+
+    __slots__ = (
+        "name",
+        "precondition",
+        "effect",
+        "cost",
+        "_hash",
+        "_prevail",
+        "_pre_post",
+    )
+
     def __init__(
         self,
         name: str,
-        precondition: List[VarValPair],
-        effect: List[VarValPair],
+        precondition: Iterable[VarValPair],
+        effect: Iterable[VarValPair],
         cost: int,
     ):
-        self.name = name
-        self.precondition = precondition
-        self.effect = effect
-        self.cost = cost
+        set_attr = super().__setattr__
+        set_attr("name", name)
+        set_attr("precondition", tuple(sorted(set(precondition))))
+        set_attr("effect", tuple(sorted(set(effect))))
+        set_attr("cost", cost)
+        set_attr("_hash", hash((name, self.precondition, self.effect, cost)))
+        set_attr("_prevail", None)
+        set_attr("_pre_post", None)
 
-    @classmethod
-    def from_sas(cls, sas_operator: SASOperator):
-        assert not any(
-            [cond for (_, _, _, cond) in sas_operator.pre_post]
-        ), "Conditional effects not implemented"
-        pre_list = [
-            (var, pre) for (var, pre, _, _) in sas_operator.pre_post if pre != -1
-        ]
-        pre_list += sas_operator.prevail
-        eff_list = [(var, post) for (var, pre, post, conds) in sas_operator.pre_post]
-        # Remove any duplicates while preserving order
-        pre_list = list(dict.fromkeys(pre_list))
-        return cls(sas_operator.name, pre_list, eff_list, sas_operator.cost)
+    def __setattr__(self, key, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
 
-    @property
-    def prevail(self) -> list[VarValPair]:
-        effect_facts = FactSet(self.effect)
+    def __delattr__(self, key):
+        raise AttributeError(f"{type(self).__name__} is immutable")
 
-        def is_prevail(var_val: VarValPair):
-            if var_val not in self.precondition:
-                return False
-            var, val = var_val
-            if var not in effect_facts.variables:
-                return True
-            if set([val]) != effect_facts[var]:
-                return False
-            return True
+    def __reduce__(self):
+        return (type(self), (self.name, self.precondition, self.effect, self.cost))
 
-        return [fact for fact in self.precondition if is_prevail(fact)]
-
-    @property
-    def pre_post(self) -> List[Tuple[int, int, int, List[VarValPair]]]:
-        prevails = self.prevail
-        precond_facts = FactSet(
-            [fact for fact in self.precondition if fact not in prevails]
+    @classmethod
+    def from_sas(cls, sas_operator: SASOperator):
+        return cls.from_pre_post(
+            sas_operator.name,
+            sas_operator.prevail,
+            sas_operator.pre_post,
+            sas_operator.cost,
         )
 
-        def get_precond(var):
-            if precond_facts[var]:
-                return precond_facts[var].pop()
-            return -1
+    @classmethod
+    def from_pre_post(
+        cls,
+        name: str,
+        prevail: Iterable[VarValPair],
+        pre_post: Iterable[Tuple[Any, Any, Any, Any]],
+        cost: int,
+    ):
+        """Build the action from the prevail and pre_post of a SAS operator (in any
+        numbering of the variables and values).
+
+        If no variable appears twice among them, as in any well-formed SAS operator,
+        the action's own prevail and pre_post follow directly from them, and are
+        stored rather than derived again when the action is converted back to SAS.
+        """
+        pre_list = [tuple(fact) for fact in prevail]
+        eff_list = []
+        prevail_list = list(pre_list)
+        pre_post_list = []
+        variables = {var for var, _ in pre_list}
+        for var, pre, post, cond in pre_post:
+            assert not cond, "Conditional effects not implemented"
+            if pre != -1:
+                pre_list.append((var, pre))
+            eff_list.append((var, post))
+            # Effects that the precondition already implies count as prevail
+            if pre == post:
+                prevail_list.append((var, pre))
+            else:
+                pre_post_list.append((var, pre, post, ()))
+            variables.add(var)
+        action = cls(name, pre_list, eff_list, cost)
+        if len(variables) == len(prevail_list) + len(pre_post_list):
+            set_attr = super(VarValAction, action).__setattr__
+            set_attr("_prevail", tuple(sorted(prevail_list)))
+            set_attr("_pre_post", tuple(sorted(pre_post_list)))
+        return action
 
-        return [
-            (var, get_precond(var), val, [])
-            for var, val in self.effect
-            if (var, val) not in prevails
-        ]
+    @property
+    def prevail(self) -> Tuple[VarValPair, ...]:
+        if self._prevail is None:
+            super().__setattr__("_prevail", get_prevail(self.precondition, self.effect))
+        return self._prevail
+
+    @property
+    def pre_post(self) -> Tuple[Tuple[int, int, int, Tuple[VarValPair, ...]], ...]:
+        if self._pre_post is None:
+            pre_post = get_pre_post(self.precondition, self.effect, self.prevail)
+            super().__setattr__("_pre_post", pre_post)
+        return self._pre_post
 
     def __eq__(self, other: "VarValAction") -> bool:
+        if not isinstance(other, VarValAction):
+            return NotImplemented
+        if self is other:
+            return True
+        if self._hash != other._hash:
+            return False
         if self.name != other.name:
             return False
         if self.precondition != other.precondition:
@@ -80,18 +169,35 @@ class VarValAction:
         return f"VarValAction({self.name}, pre={self.precondition}, eff={self.effect})"
 
     def __hash__(self) -> int:
-        return hash(
-            (self.name, tuple(self.precondition), tuple(self.effect), self.cost)
-        )
+        return self._hash
 
     def effect_hash(
-        self, relevant_variables: List[Any]
-    ) -> Tuple[List[VarValPair], int]:
-        return tuple(
-            [(var, val) for (var, val) in self.effect if var in relevant_variables]
-        ), self.cost
+        self, relevant_variables: Union[set[Any], int]
+    ) -> Tuple[Tuple[VarValPair, ...], int]:
+        """Get the (effect, cost) of the action, ignoring irrelevant variables
+
+        `relevant_variables` is either a set of variables, or a bitmask with bit
+        `var` set for each relevant (integer) variable.
+        """
+        if isinstance(relevant_variables, int):
+            return (
+                tuple(
+                    [
+                        (var, val)
+                        for (var, val) in self.effect
+                        if relevant_variables >> var & 1
+                    ]
+                ),
+                self.cost,
+            )
+        return (
+            tuple(
+                [(var, val) for (var, val) in self.effect if var in relevant_variables]
+            ),
+            self.cost,
+        )
 
-    def can_run(self, state: List[VarValPair]) -> bool:
+    def can_run(self, state: Iterable[VarValPair]) -> bool:
         state_facts = set(state)
         for fact in self.precondition:
             if fact not in state_facts:
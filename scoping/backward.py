@@ -7,9 +7,12 @@ from typing import Any, Tuple
 
 from translate.sas_tasks import SASTask, VarValPair
 from scoping.actions import VarValAction
+from scoping.columnar import ColumnarActions
 from scoping.factset import FactSet
-from scoping.merging import merge
+from scoping.merging import MergeCache, merge
+from scoping.profiler import ScopingProfiler, disabled_profiler
 from scoping.task import ScopingTask
+from scoping.vectorized import can_vectorize, compute_vectorized_goal_relevance
 
 
 def filter_causal_links(
@@ -23,6 +26,19 @@ def filter_causal_links(
     affected_facts = FactSet()
     for a in actions:
         affected_facts.add(a.effect)
+    return filter_unthreatened_facts(
+        facts, init, affected_facts, enable_fact_based=enable_fact_based
+    )
+
+
+def filter_unthreatened_facts(
+    facts: FactSet,
+    init: list[VarValPair],
+    affected_facts: FactSet,
+    enable_fact_based: bool = False,
+) -> FactSet:
+    """Remove any facts from `facts` that are present in the initial state `init` and
+    not threatened by any of the `affected_facts`."""
 
     def benign_sets(val):
         return [set(), set([val])] if enable_fact_based else [set()]
@@ -47,11 +63,22 @@ def get_goal_relevant_actions(
     return list(set([a for a in actions for fact in a.effect if fact in facts]))
 
 
+def build_achievers_index(
+    actions: list[VarValAction],
+) -> dict[VarValPair, list[int]]:
+    """Map each fact to the positions in `actions` of the actions that achieve it."""
+    achievers = defaultdict(list)
+    for i, a in enumerate(actions):
+        for fact in a.effect:
+            achievers[fact].append(i)
+    return achievers
+
+
 def partition_actions(
     relevant_variables: list[Any], actions: list[VarValAction]
 ) -> list[list[VarValAction]]:
     """Partition actions by (effect, cost), ignoring irrelevant variables"""
-    # TODO: replace with hash map
+    relevant_variables = set(relevant_variables)
     unique_effects_and_costs = defaultdict(list)
     for a in actions:
         unique_effects_and_costs[a.effect_hash(relevant_variables)].append(a)
@@ -75,6 +102,7 @@ def get_goal_relevant_facts(
     relevant_facts: FactSet,
     relevant_actions: list[VarValAction],
     enable_merging: bool = False,
+    merge_cache: MergeCache = None,
 ) -> tuple[FactSet, dict]:
     """Find all facts that appear in the (simplified) preconditions
     of the (possibly merged) relevant actions."""
@@ -88,7 +116,9 @@ def get_goal_relevant_facts(
     relevant_facts = FactSet()
     aggregated_info = defaultdict(int)
     for actions in action_partitions:
-        relevant_precond_facts, info = merge(actions, relevant_vars, domains)
+        relevant_precond_facts, info = merge(
+            actions, relevant_vars, domains, cache=merge_cache
+        )
         for key, val in info.items():
             aggregated_info[key] += val
         relevant_facts.union(relevant_precond_facts)
@@ -105,6 +135,7 @@ def goal_relevance_step(
     enable_merging: bool = False,
     enable_causal_links: bool = False,
     enable_fact_based: bool = False,
+    merge_cache: MergeCache = None,
 ) -> Tuple[FactSet, list[VarValAction], dict]:
     if enable_causal_links:
         filtered_facts = filter_causal_links(
@@ -120,6 +151,7 @@ def goal_relevance_step(
         filtered_facts,
         relevant_actions,
         enable_merging=enable_merging,
+        merge_cache=merge_cache,
     )
     relevant_facts.union(filtered_facts)
 
@@ -131,26 +163,130 @@ def compute_goal_relevance(
     enable_merging: bool = False,
     enable_causal_links: bool = False,
     enable_fact_based: bool = False,
+    profiler: ScopingProfiler = disabled_profiler,
+    vectorize: bool = True,
+    merge_cache: MergeCache = None,
 ) -> Tuple[FactSet, list[VarValAction], dict]:
+    """Compute the goal-relevant facts and actions of `scoping_task`.
+
+    This reaches the same fixpoint as repeatedly calling `goal_relevance_step`, but
+    only looks up the achievers of facts that became relevant since the previous
+    iteration. The filtered facts (and hence the relevant actions) only ever grow
+    between iterations, so the relevant actions are accumulated rather than
+    recomputed, and without merging so are their precondition facts.
+
+    If the task's actions are `ColumnarActions`, the relevant actions are returned
+    as `ColumnarActions` too, and only the actions that need merging are converted
+    to VarValActions. Without merging, and if NumPy is installed, they are handed
+    to `compute_vectorized_goal_relevance` instead, unless `vectorize` is False.
+
+    Merge results are cached in `merge_cache`, or else in a cache for this call.
+    """
+    if vectorize and can_vectorize(scoping_task, enable_merging):
+        return compute_vectorized_goal_relevance(
+            scoping_task, enable_causal_links, enable_fact_based, profiler
+        )
+    if isinstance(scoping_task.actions, ColumnarActions):
+        columnar_actions = scoping_task.actions
+        # The same action may appear more than once, so only the first of each is used
+        action_ids = columnar_actions.get_unique_ids()
+        achievers = columnar_actions.index_by_fact(effect=True, action_ids=action_ids)
+        # Merging needs VarValActions, which are converted once each
+        merged_actions = {}
+
+        def get_action(i):
+            if i not in merged_actions:
+                merged_actions[i] = columnar_actions[i]
+            return merged_actions[i]
+
+        get_precondition = columnar_actions.get_precondition
+        get_effect = columnar_actions.get_effect
+    else:
+        # The same action may appear more than once, so we de-duplicate up front
+        actions = list(dict.fromkeys(scoping_task.actions))
+        achievers = build_achievers_index(actions)
+        get_action = actions.__getitem__
+
+        def get_precondition(i):
+            return actions[i].precondition
+
+        def get_effect(i):
+            return actions[i].effect
+
+    if merge_cache is None:
+        merge_cache = MergeCache()
+    domains = scoping_task.domains
+    init = scoping_task.init
+
     relevant_facts = FactSet(scoping_task.goal)
     if not enable_fact_based:
-        coarsen_facts_to_variables(relevant_facts, scoping_task.domains)
-    relevant_actions = []
+        coarsen_facts_to_variables(relevant_facts, domains)
+    relevant_action_ids = set()
+    prev_filtered_facts = FactSet()
+    affected_facts = FactSet()
+    precond_facts = FactSet()
+    info = {
+        "Scoping merge attempts": 0,
+        "Scoping merge cache hits": 0,
+        "Scoping merge cache misses": 0,
+    }
     prev_facts = None
-    prev_actions = []
-    while relevant_facts != prev_facts or len(relevant_actions) != len(prev_actions):
-        prev_facts, prev_actions = relevant_facts, relevant_actions
-        relevant_facts, relevant_actions, info = goal_relevance_step(
-            scoping_task.domains,
-            relevant_facts,
-            scoping_task.init,
-            scoping_task.actions,
-            relevant_actions,
-            enable_merging,
-            enable_causal_links,
-            enable_fact_based=enable_fact_based,
-        )
-    relevant_facts.add(scoping_task.init)
+    n_prev_actions = -1
+    n_iterations = 0
+    while relevant_facts != prev_facts or len(relevant_action_ids) != n_prev_actions:
+        prev_facts, n_prev_actions = relevant_facts, len(relevant_action_ids)
+        n_iterations += 1
+        if enable_causal_links:
+            filtered_facts = filter_unthreatened_facts(
+                relevant_facts, init, affected_facts, enable_fact_based
+            )
+        else:
+            filtered_facts = relevant_facts
+        if not enable_fact_based:
+            coarsen_facts_to_variables(filtered_facts, domains)
+
+        # Only achievers of newly filtered facts can be new relevant actions
+        new_action_ids = set()
+        n_new_facts = 0
+        for var, values in filtered_facts:
+            for val in values:
+                if (var, val) not in prev_filtered_facts:
+                    new_action_ids.update(achievers.get((var, val), ()))
+                    n_new_facts += 1
+        new_action_ids.difference_update(relevant_action_ids)
+        profiler.count("Scoping backward facts touched", n_new_facts)
+        profiler.count("Scoping backward actions touched", len(new_action_ids))
+        relevant_action_ids.update(new_action_ids)
+        prev_filtered_facts = FactSet(filtered_facts)
+        for i in new_action_ids:
+            affected_facts.add(get_effect(i))
+
+        if enable_merging:
+            relevant_actions = [get_action(i) for i in sorted(relevant_action_ids)]
+            with profiler.phase("merging"):
+                relevant_facts, info = get_goal_relevant_facts(
+                    domains,
+                    filtered_facts,
+                    relevant_actions,
+                    enable_merging=enable_merging,
+                    merge_cache=merge_cache,
+                )
+        else:
+            for i in new_action_ids:
+                for var, val in get_precondition(i):
+                    if val == -1:
+                        precond_facts.union(var, domains[var])
+                    else:
+                        precond_facts.add(var, val)
+            relevant_facts = FactSet(precond_facts)
+        relevant_facts.union(filtered_facts)
+
+    profiler.record_iterations("backward relevance", n_iterations)
+    if isinstance(scoping_task.actions, ColumnarActions):
+        relevant_actions = columnar_actions.select(sorted(relevant_action_ids))
+    else:
+        relevant_actions = [actions[i] for i in sorted(relevant_action_ids)]
+    relevant_facts.add(init)
     return relevant_facts, relevant_actions, info
 
 
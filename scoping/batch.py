@@ -0,0 +1,190 @@
+import glob
+import json
+import multiprocessing
+from multiprocessing.connection import wait
+import os
+import signal
+import time
+
+from scoping.options import ScopingOptions
+from scoping.profiler import ScopingProfiler
+from scoping.sas_parser import SasTaskReader
+
+
+class ScopingTimeout(Exception):
+    pass
+
+
+class WorkerCrash(Exception):
+    """A worker process died without returning a result"""
+
+    def __init__(self, exitcode: int):
+        if exitcode < 0:
+            reason = f"killed by {signal.Signals(-exitcode).name}"
+        else:
+            reason = f"exited with code {exitcode}"
+        super().__init__(f"worker process {reason}")
+        self.exitcode = exitcode
+
+
+def raise_timeout(signum, frame):
+    raise ScopingTimeout()
+
+
+def find_sas_files(batch_dir: str) -> list[str]:
+    """Find all sas files under `batch_dir`, skipping previously scoped outputs"""
+    sas_paths = glob.glob(os.path.join(batch_dir, "**", "*.sas"), recursive=True)
+    return sorted(pth for pth in sas_paths if not pth.endswith("_scoped.sas"))
+
+
+def set_limits(time_limit: float = None, memory_limit: int = None):
+    """Limit the current process to `time_limit` seconds of wall-clock time and
+    `memory_limit` MiB of address space"""
+    if memory_limit is not None:
+        import resource
+
+        limit = memory_limit * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if time_limit is not None:
+        signal.signal(signal.SIGALRM, raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, time_limit)
+
+
+def scope_sas_file_with_limits(
+    sas_path: str,
+    scoping_options: ScopingOptions,
+    time_limit: float = None,
+    memory_limit: int = None,
+    columnar: bool = False,
+) -> dict:
+    """Scope the sas file at `sas_path` and return a JSON-serializable record of the
+    scoping info, timings and outcome.
+
+    This is meant to run in a fresh worker process, since the limits apply to the
+    whole process. For the same reason, the process peak memory it records is the
+    task's own (on top of what the worker inherited when it was forked).
+    """
+    from scoping.core import get_scoped_filename, scope_sas_task
+
+    result = {"sas_file": sas_path, "status": "ok", "info": {}, "timings": {}}
+    profiler = ScopingProfiler()
+    timings = result["timings"]
+    start_time = last_time = time.time()
+    start_clock = sum(os.times()[:2])
+
+    def record_timing(phase):
+        nonlocal last_time
+        now = time.time()
+        timings[phase] = now - last_time
+        last_time = now
+
+    try:
+        set_limits(time_limit, memory_limit)
+        sas_task = SasTaskReader.from_path(sas_path)
+        record_timing("parse")
+        scoped_sas, result["info"] = scope_sas_task(
+            sas_task, scoping_options, profiler=profiler, columnar=columnar
+        )
+        record_timing("scope")
+        if scoping_options.write_output_file:
+            with open(get_scoped_filename(sas_path), "w") as f:
+                scoped_sas.output(f)
+            record_timing("write")
+    except ScopingTimeout:
+        result["status"] = "timeout"
+    except MemoryError:
+        result["status"] = "out of memory"
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        if time_limit is not None:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+    timings["total"] = time.time() - start_time
+    timings["total CPU"] = sum(os.times()[:2]) - start_clock
+    result["profile"] = profiler.summary()
+    result["process peak memory KB"] = result["profile"]["process peak memory KB"]
+    return result
+
+
+def _send_result(connection, function, args):
+    connection.send(function(*args))
+    connection.close()
+
+
+def run_in_fresh_processes(function, args_list: list[tuple], jobs: int = 1):
+    """Call `function(*args)` for each `args` in `args_list`, each in a fresh process
+    and at most `jobs` at a time, and yield `(args, result)` as each call finishes.
+
+    If a process dies without returning (say, killed by the OOM killer, or after a
+    segfault in an extension), the result is a WorkerCrash, and the other calls are
+    unaffected.
+    """
+    args_iter = iter(args_list)
+    running = {}
+    while True:
+        for args in args_iter:
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(
+                target=_send_result, args=(sender, function, args)
+            )
+            process.start()
+            # The receiver only sees the end of the pipe once the process's copy of
+            # the sender is the last one left
+            sender.close()
+            running[receiver] = (args, process)
+            if len(running) >= jobs:
+                break
+        if not running:
+            return
+        for receiver in wait(list(running)):
+            args, process = running.pop(receiver)
+            try:
+                result = receiver.recv()
+            except EOFError:
+                result = None
+            receiver.close()
+            process.join()
+            if process.exitcode != 0:
+                result = WorkerCrash(process.exitcode)
+            yield args, result
+
+
+def scope_sas_batch(
+    scoping_options: ScopingOptions,
+    batch_dir: str,
+    results_path: str,
+    jobs: int = 1,
+    time_limit: float = None,
+    memory_limit: int = None,
+    columnar: bool = False,
+) -> list[dict]:
+    """Scope every sas file under `batch_dir` in up to `jobs` parallel processes, and
+    stream one JSON line per task to `results_path` as each one finishes. Tasks
+    whose process dies have the status "crashed"."""
+    sas_paths = find_sas_files(batch_dir)
+    entries = [
+        (sas_path, scoping_options, time_limit, memory_limit, columnar)
+        for sas_path in sas_paths
+    ]
+    results = []
+    # Use a fresh process for every task, so the limits don't carry over
+    with open(results_path, "w") as results_file:
+        for entry, result in run_in_fresh_processes(
+            scope_sas_file_with_limits, entries, jobs
+        ):
+            if isinstance(result, WorkerCrash):
+                result = {
+                    "sas_file": entry[0],
+                    "status": "crashed",
+                    "error": f"{type(result).__name__}: {result}",
+                    "info": {},
+                    "timings": {},
+                }
+            results_file.write(json.dumps(result) + "\n")
+            results_file.flush()
+            results.append(result)
+            progress = f"[{len(results)}/{len(entries)}]"
+            print(f"{progress} {result['status']}: {result['sas_file']}")
+    return results
@@ -0,0 +1,289 @@
+from array import array
+from typing import Iterable, Iterator, Tuple
+
+import translate.sas_tasks as fd
+from scoping.actions import VarValAction, get_pre_post, get_prevail
+from scoping.factset import FactIndex, VarValPair
+from scoping.task import SasRemapping, ScopingTask
+
+
+class ColumnarActions:
+    """Actions stored column-wise rather than as VarValAction objects.
+
+    Facts are interned to integer ids by `fact_index`, and the preconditions and
+    effects are stored in CSR form: the (sorted, distinct) fact ids of action i's
+    precondition are `pre_facts[pre_offsets[i]:pre_offsets[i + 1]]`, and likewise
+    for its effect. Costs are in an array, and names are concatenated into a single
+    UTF-8 blob with offsets. On generated tasks this takes about 45 bytes per action,
+    against over 300 for the equivalent VarValActions, and the arrays can be handed
+    to NumPy without copying.
+
+    Indexing or iterating gives VarValActions, so code written for a list of actions
+    still works, but the passes in `backward.py`, `forward.py` and `core.py` use the
+    columns directly.
+    """
+
+    def __init__(self, fact_index: FactIndex):
+        self.fact_index = fact_index
+        self.names = bytearray()
+        self.name_offsets = array("I", [0])
+        self.pre_offsets = array("I", [0])
+        self.pre_facts = array("i")
+        self.eff_offsets = array("I", [0])
+        self.eff_facts = array("i")
+        self.costs = array("q")
+
+    @classmethod
+    def from_actions(
+        cls, actions: Iterable[VarValAction], fact_index: FactIndex
+    ) -> "ColumnarActions":
+        columnar_actions = cls(fact_index)
+        for a in actions:
+            columnar_actions.append(a.name, a.precondition, a.effect, a.cost)
+        return columnar_actions
+
+    def append(
+        self,
+        name: str,
+        precondition: Iterable[VarValPair],
+        effect: Iterable[VarValPair],
+        cost: int,
+    ):
+        fact_id = self.fact_index.id
+        self.append_ids(
+            name,
+            [fact_id(var, val) for var, val in precondition],
+            [fact_id(var, val) for var, val in effect],
+            cost,
+        )
+
+    def append_ids(
+        self,
+        name: str,
+        precondition_ids: Iterable[int],
+        effect_ids: Iterable[int],
+        cost: int,
+    ):
+        self.names += name.encode()
+        self.name_offsets.append(len(self.names))
+        self.pre_facts.extend(sorted(set(precondition_ids)))
+        self.pre_offsets.append(len(self.pre_facts))
+        self.eff_facts.extend(sorted(set(effect_ids)))
+        self.eff_offsets.append(len(self.eff_facts))
+        self.costs.append(cost)
+
+    def __len__(self) -> int:
+        return len(self.costs)
+
+    def get_name(self, i: int) -> str:
+        return self.names[self.name_offsets[i] : self.name_offsets[i + 1]].decode()
+
+    def get_precondition_ids(self, i: int) -> array:
+        return self.pre_facts[self.pre_offsets[i] : self.pre_offsets[i + 1]]
+
+    def get_effect_ids(self, i: int) -> array:
+        return self.eff_facts[self.eff_offsets[i] : self.eff_offsets[i + 1]]
+
+    def get_changed_effect_ids(self, i: int) -> list[int]:
+        """Get the ids of the effect facts that the precondition doesn't already
+        imply, i.e. those in the action's pre_post rather than its prevail"""
+        effect_ids = self.get_effect_ids(i)
+        precondition_ids = set(self.get_precondition_ids(i))
+        if precondition_ids.isdisjoint(effect_ids):
+            return list(effect_ids)
+        facts = self.fact_index.facts
+        effect_vars = [facts[f][0] for f in effect_ids]
+        return [
+            f
+            for f, var in zip(effect_ids, effect_vars)
+            if f not in precondition_ids or effect_vars.count(var) > 1
+        ]
+
+    def get_precondition(self, i: int) -> Tuple[VarValPair, ...]:
+        facts = self.fact_index.facts
+        return tuple([facts[f] for f in self.get_precondition_ids(i)])
+
+    def get_effect(self, i: int) -> Tuple[VarValPair, ...]:
+        facts = self.fact_index.facts
+        return tuple([facts[f] for f in self.get_effect_ids(i)])
+
+    def iter_preconditions(self) -> Iterator[Tuple[VarValPair, ...]]:
+        return map(self.get_precondition, range(len(self)))
+
+    def iter_effects(self) -> Iterator[Tuple[VarValPair, ...]]:
+        return map(self.get_effect, range(len(self)))
+
+    def __getitem__(self, i: int) -> VarValAction:
+        return VarValAction(
+            self.get_name(i),
+            self.get_precondition(i),
+            self.get_effect(i),
+            self.costs[i],
+        )
+
+    def __iter__(self) -> Iterator[VarValAction]:
+        return map(self.__getitem__, range(len(self)))
+
+    def select(self, action_ids: Iterable[int]) -> "ColumnarActions":
+        """Get the actions with the given ids (in that order)"""
+        selected = ColumnarActions(self.fact_index)
+        for i in action_ids:
+            selected.names += self.names[
+                self.name_offsets[i] : self.name_offsets[i + 1]
+            ]
+            selected.name_offsets.append(len(selected.names))
+            selected.pre_facts.extend(self.get_precondition_ids(i))
+            selected.pre_offsets.append(len(selected.pre_facts))
+            selected.eff_facts.extend(self.get_effect_ids(i))
+            selected.eff_offsets.append(len(selected.eff_facts))
+            selected.costs.append(self.costs[i])
+        return selected
+
+    def get_unique_ids(self) -> list[int]:
+        """Get the id of the first occurrence of each distinct action"""
+        first_ids = {}
+        for i in range(len(self)):
+            key = (
+                bytes(self.names[self.name_offsets[i] : self.name_offsets[i + 1]]),
+                self.get_precondition_ids(i).tobytes(),
+                self.get_effect_ids(i).tobytes(),
+                self.costs[i],
+            )
+            first_ids.setdefault(key, i)
+        return sorted(first_ids.values())
+
+    def index_by_fact(
+        self, effect: bool = True, action_ids: Iterable[int] = None
+    ) -> dict[VarValPair, list[int]]:
+        """Map each fact to the ids of the actions (out of `action_ids`, or else all
+        of them) that have it in their effect, or precondition if `effect` is False"""
+        offsets, fact_ids = (
+            (self.eff_offsets, self.eff_facts)
+            if effect
+            else (self.pre_offsets, self.pre_facts)
+        )
+        if action_ids is None:
+            action_ids = range(len(self))
+        actions_by_id = {}
+        for i in action_ids:
+            for f in fact_ids[offsets[i] : offsets[i + 1]]:
+                actions_by_id.setdefault(f, []).append(i)
+        facts = self.fact_index.facts
+        return {facts[f]: ids for f, ids in actions_by_id.items()}
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the columns, in bytes"""
+        return len(self.names) + sum(
+            column.itemsize * len(column)
+            for column in [
+                self.name_offsets,
+                self.pre_offsets,
+                self.pre_facts,
+                self.eff_offsets,
+                self.eff_facts,
+                self.costs,
+            ]
+        )
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ColumnarActions):
+            return NotImplemented
+        if self.fact_index is not other.fact_index:
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return (
+            self.costs == other.costs
+            and self.name_offsets == other.name_offsets
+            and self.names == other.names
+            and self.pre_offsets == other.pre_offsets
+            and self.pre_facts == other.pre_facts
+            and self.eff_offsets == other.eff_offsets
+            and self.eff_facts == other.eff_facts
+        )
+
+
+class ColumnarScopingTask(ScopingTask):
+    """A ScopingTask whose actions are `ColumnarActions`, for tasks with too many
+    operators to hold as VarValActions.
+
+    `compute_goal_relevance`, `compute_reachability` and `prune_task` (and hence
+    `scope`) work on it directly, and keep the same fact index, so the fact ids of
+    a scoped task's actions match those of the original task.
+    """
+
+    actions: ColumnarActions
+
+    @staticmethod
+    def from_sas(sas_task: fd.SASTask) -> "ColumnarScopingTask":
+        task = ScopingTask.from_sas(sas_task, include_operators=False)
+        # Intern the facts in (var, val) order, so that the id of (var, val) is
+        # fact_offsets[var] + val, and sorted ids are sorted facts
+        fact_index = FactIndex()
+        fact_offsets = []
+        for var, r in enumerate(sas_task.variables.ranges):
+            fact_offsets.append(len(fact_index))
+            for val in range(r):
+                fact_index.id(var, val)
+        actions = ColumnarActions(fact_index)
+        for op in sas_task.operators:
+            assert not any(
+                [cond for (_, _, _, cond) in op.pre_post]
+            ), "Conditional effects not implemented"
+            pre_ids = [
+                fact_offsets[var] + pre for (var, pre, _, _) in op.pre_post if pre != -1
+            ]
+            pre_ids += [fact_offsets[var] + val for var, val in op.prevail]
+            eff_ids = [fact_offsets[var] + post for (var, _, post, _) in op.pre_post]
+            actions.append_ids(op.name, pre_ids, eff_ids, op.cost)
+        return ColumnarScopingTask.from_scoping_task(task, actions)
+
+    @staticmethod
+    def from_scoping_task(
+        scoping_task: ScopingTask, actions: ColumnarActions = None
+    ) -> "ColumnarScopingTask":
+        if actions is None:
+            actions = ColumnarActions.from_actions(
+                scoping_task.actions, FactIndex(scoping_task.domains)
+            )
+        return ColumnarScopingTask(
+            domains=scoping_task.domains,
+            init=scoping_task.init,
+            goal=scoping_task.goal,
+            actions=actions,
+            mutexes=scoping_task.mutexes,
+            axioms=scoping_task.axioms,
+            metric=scoping_task.metric,
+            value_names=scoping_task.value_names,
+        )
+
+    def to_scoping_task(self) -> ScopingTask:
+        return ScopingTask(
+            domains=self.domains,
+            init=self.init,
+            goal=self.goal,
+            actions=list(self.actions),
+            mutexes=self.mutexes,
+            axioms=self.axioms,
+            metric=self.metric,
+            value_names=self.value_names,
+        )
+
+    def get_sas_operators(self, remapping: SasRemapping) -> list[fd.SASOperator]:
+        operators = []
+        for i in range(len(self.actions)):
+            # Fact ids are only in (var, val) order if the facts were interned in
+            # that order, as they are by `from_sas`
+            precondition = tuple(sorted(self.actions.get_precondition(i)))
+            effect = tuple(sorted(self.actions.get_effect(i)))
+            prevail = get_prevail(precondition, effect)
+            operators.append(
+                fd.SASOperator(
+                    name=self.actions.get_name(i),
+                    prevail=remapping.map_facts(prevail),
+                    pre_post=remapping.map_pre_post(
+                        get_pre_post(precondition, effect, prevail)
+                    ),
+                    cost=self.actions.costs[i],
+                )
+            )
+        return operators
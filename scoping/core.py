@@ -7,14 +7,18 @@ import os
 import translate.sas_tasks as fd
 from scoping.actions import VarValAction
 from scoping.backward import compute_goal_relevance
-from scoping.forward import compute_reachability
+from scoping.columnar import ColumnarActions, ColumnarScopingTask
+from scoping.forward import compute_dtg_reachability, compute_reachability
 from scoping.factset import FactSet, VarValPair
+from scoping.merging import MergeCache
 from scoping.options import ScopingOptions
-from scoping.sas_parser import SasParser
+from scoping.profiler import ScopingProfiler, disabled_profiler
+from scoping.sas_parser import SasTaskReader
 from scoping.task import ScopingTask
+from scoping.visualization import trace_scoping_layers
 from translate import timers
 from translate import simplify
-from translate.translate import unsolvable_sas_task, solvable_sas_task, trivial_task
+from translate.translate import unsolvable_sas_task, solvable_sas_task
 
 
 def scope_backward(
@@ -22,88 +26,342 @@ def scope_backward(
     enable_merging: bool = True,
     enable_causal_links: bool = True,
     enable_fact_based: bool = True,
+    profiler: ScopingProfiler = disabled_profiler,
+    goal_relevance: tuple[FactSet, list[VarValAction], dict] = None,
+    remove_redundant: bool = False,
+    merge_cache: MergeCache = None,
 ) -> tuple[ScopingTask, dict]:
-    facts, actions, info = compute_goal_relevance(
-        scoping_task=scoping_task,
-        enable_merging=enable_merging,
-        enable_causal_links=enable_causal_links,
-        enable_fact_based=enable_fact_based,
-    )
+    """Prune the facts and actions that aren't goal-relevant. If the result of
+    `compute_goal_relevance` is already known, it can be passed as `goal_relevance`.
+    `remove_redundant` is passed on to `prune_task`, and `merge_cache` to
+    `compute_goal_relevance`."""
+    if goal_relevance is not None:
+        facts, actions, info = goal_relevance
+    else:
+        with profiler.phase("backward relevance"):
+            facts, actions, info = compute_goal_relevance(
+                scoping_task=scoping_task,
+                enable_merging=enable_merging,
+                enable_causal_links=enable_causal_links,
+                enable_fact_based=enable_fact_based,
+                profiler=profiler,
+                merge_cache=merge_cache,
+            )
+    if isinstance(actions, ColumnarActions):
+        preconditions, effects = actions.iter_preconditions(), actions.iter_effects()
+    else:
+        preconditions = (a.precondition for a in actions)
+        effects = (a.effect for a in actions)
     # Explicitly add precond facts in case preconds were dropped in a merge
     precond_facts = FactSet()
-    for a in actions:
-        precond_facts.add(a.precondition)
+    for precondition in preconditions:
+        precond_facts.add(precondition)
     facts.union(precond_facts)
 
     # Also add side-effects on vars that appear in preconds
-    for a in actions:
-        for var, val in a.effect:
-            if var in precond_facts.variables:
+    precond_vars = set(precond_facts.variables)
+    for effect in effects:
+        for var, val in effect:
+            if var in precond_vars:
                 facts.add(var, val)
-    return prune_task(scoping_task, facts, actions), info
-
-
-def scope_forward(scoping_task: ScopingTask) -> tuple[ScopingTask, bool]:
-    facts, actions, goal_reachable = compute_reachability(scoping_task=scoping_task)
-    return prune_task(scoping_task, facts, actions), goal_reachable
+    with profiler.phase("prune task"):
+        return prune_task(scoping_task, facts, actions, remove_redundant), info
 
 
-def prune_facts(fact_list: list[VarValPair], relevant_facts: FactSet):
-    return [fact for fact in fact_list if fact in relevant_facts]
+def scope_forward(
+    scoping_task: ScopingTask, profiler: ScopingProfiler = disabled_profiler
+) -> tuple[ScopingTask, bool]:
+    with profiler.phase("forward reachability"):
+        facts, actions, goal_reachable = compute_reachability(
+            scoping_task=scoping_task, profiler=profiler
+        )
+    with profiler.phase("prune task"):
+        return prune_task(scoping_task, facts, actions), goal_reachable
 
 
 def prune_mutexes(
     mutex_list: list[list[VarValPair]], relevant_facts: FactSet
 ) -> list[list[VarValPair]]:
-    # Prune irrelevant facts
-    mutexes = [prune_facts(mutex, relevant_facts) for mutex in mutex_list]
-    # Prune mutexes with < 2 facts
-    mutexes = [mutex for mutex in mutexes if mutex and len(mutex) > 1]
-    # Prune mutexes with < 2 variables
-    mutex_facts = [FactSet(mutex) for mutex in mutexes]
-    mutexes = [
-        mutex for mutex, facts in zip(mutexes, mutex_facts) if len(facts.variables) > 1
-    ]
-    # Prune duplicate mutexes, then convert back to list of lists
-    mutexes = list(
-        map(
-            list,
-            dict.fromkeys(tuple(dict.fromkeys(mutex)) for mutex in mutexes),
+    """Remove the facts that aren't in `relevant_facts` (and repeated facts) from
+    each mutex group, then drop the groups left with facts of fewer than two
+    variables, and the repeats of earlier groups.
+
+    Each group is filtered, canonicalized and checked in a single pass over its
+    facts, so beyond the result, only the group in progress is held in memory.
+    """
+    kept_values = relevant_facts.facts
+    no_values = ()
+    no_var = object()
+    mutexes = {}
+    for mutex in mutex_list:
+        group = {}
+        first_var = no_var
+        has_two_vars = False
+        for fact in mutex:
+            var, val = fact
+            if val in kept_values.get(var, no_values):
+                group[fact] = None
+                if first_var is no_var:
+                    first_var = var
+                elif var != first_var:
+                    has_two_vars = True
+        if has_two_vars:
+            mutexes.setdefault(tuple(group), None)
+    return [list(mutex) for mutex in mutexes]
+
+
+def compile_fact_filter(facts: FactSet):
+    """Compile `facts` into a per-variable lookup table of the values to keep, and
+    return a function that prunes a list of facts down to those in it, without a
+    FactSet lookup per fact."""
+    kept_values = {var: frozenset(values) for var, values in facts}
+    no_values = frozenset()
+
+    def prune(fact_list: list[VarValPair]) -> list[VarValPair]:
+        return [
+            (var, val)
+            for var, val in fact_list
+            if val in kept_values.get(var, no_values)
+        ]
+
+    return prune
+
+
+def prune_actions(actions: list[VarValAction], prune) -> list[VarValAction]:
+    """Prune the preconditions and effects of the actions with `prune` (see
+    `compile_fact_filter`), reusing the actions that it doesn't change"""
+    pruned_actions = []
+    for a in actions:
+        precondition = prune(a.precondition)
+        effect = prune(a.effect)
+        if len(precondition) == len(a.precondition) and len(effect) == len(a.effect):
+            pruned_actions.append(a)
+        else:
+            pruned_actions.append(VarValAction(a.name, precondition, effect, a.cost))
+    return pruned_actions
+
+
+def remove_redundant_actions(actions: list[VarValAction]) -> list[VarValAction]:
+    """Drop the actions whose effect doesn't change anything, i.e. whose pre_post is
+    empty since the precondition already implies the effect, and of the actions with
+    the same precondition and effect, keep only the cheapest (the first of them, if
+    tied), at the position of the first of them. Either way, any plan still has a
+    counterpart that is no more expensive.
+
+    ColumnarActions are compared by their fact ids, and returned as ColumnarActions.
+    """
+    if isinstance(actions, ColumnarActions):
+        kept_ids = []
+        positions = {}
+        for i in range(len(actions)):
+            if not actions.get_changed_effect_ids(i):
+                continue
+            key = (
+                actions.get_precondition_ids(i).tobytes(),
+                actions.get_effect_ids(i).tobytes(),
+            )
+            j = positions.get(key)
+            if j is None:
+                positions[key] = len(kept_ids)
+                kept_ids.append(i)
+            elif actions.costs[i] < actions.costs[kept_ids[j]]:
+                kept_ids[j] = i
+        return actions.select(kept_ids)
+    kept_actions = []
+    positions = {}
+    for a in actions:
+        if not a.pre_post:
+            continue
+        key = (a.precondition, a.effect)
+        i = positions.get(key)
+        if i is None:
+            positions[key] = len(kept_actions)
+            kept_actions.append(a)
+        elif a.cost < kept_actions[i].cost:
+            kept_actions[i] = a
+    return kept_actions
+
+
+def prune_columnar_actions(actions: ColumnarActions, facts: FactSet) -> ColumnarActions:
+    """Remove the facts that aren't in `facts` from the actions' preconditions and
+    effects, working on the fact ids"""
+    fact_index = actions.fact_index
+    is_kept = bytearray(len(fact_index))
+    for var, values in facts:
+        for val in values:
+            fact_id = fact_index.ids.get((var, val))
+            if fact_id is not None:
+                is_kept[fact_id] = 1
+    columnar_actions = ColumnarActions(fact_index)
+    for i in range(len(actions)):
+        columnar_actions.append_ids(
+            actions.get_name(i),
+            [f for f in actions.get_precondition_ids(i) if is_kept[f]],
+            [f for f in actions.get_effect_ids(i) if is_kept[f]],
+            actions.costs[i],
         )
-    )
-
-    return mutexes
+    return columnar_actions
 
 
 def prune_task(
-    scoping_task: ScopingTask, facts: FactSet, actions: list[VarValAction]
+    scoping_task: ScopingTask,
+    facts: FactSet,
+    actions: list[VarValAction],
+    remove_redundant: bool = False,
 ) -> ScopingTask:
+    """Restrict the task to the `actions` and to the variables with more than one
+    value in `facts`, and remove any other facts from everything that mentions
+    them. The facts are compiled into a lookup table once (see
+    `compile_fact_filter`), and actions and axioms that pruning doesn't change are
+    reused. If `remove_redundant` is set, then `remove_redundant_actions` is applied
+    to the pruned actions."""
     facts = FactSet({var: values for var, values in facts if len(values) > 1})
+    prune = compile_fact_filter(facts)
+
+    init = prune(scoping_task.init)
+    goal = prune(scoping_task.goal)
+    if isinstance(scoping_task, ColumnarScopingTask):
+        if not isinstance(actions, ColumnarActions):
+            actions = ColumnarActions.from_actions(
+                actions, scoping_task.actions.fact_index
+            )
+        actions = prune_columnar_actions(actions, facts)
+    else:
+        actions = prune_actions(actions, prune)
+    if remove_redundant:
+        actions = remove_redundant_actions(actions)
+    mutexes = prune_mutexes(scoping_task.mutexes, facts)
+    axioms = prune_actions(scoping_task.axioms, prune)
+    return type(scoping_task)(
+        domains=facts,
+        init=init,
+        goal=goal,
+        actions=actions,
+        mutexes=mutexes,
+        axioms=axioms,
+        metric=scoping_task.metric,
+        value_names=scoping_task.value_names,
+    )
 
-    init = prune_facts(scoping_task.init, facts)
-    goal = prune_facts(scoping_task.goal, facts)
-    actions = [
-        VarValAction(
-            name=a.name,
-            precondition=prune_facts(a.precondition, facts),
-            effect=prune_facts(a.effect, facts),
-            cost=a.cost,
+
+def prune_unreachable_actions(
+    actions: list[VarValAction], reachable_facts: FactSet, constant_vars: set
+) -> list[VarValAction]:
+    """Drop the actions whose precondition isn't reachable, and the facts on
+    `constant_vars` from the rest. Effects that the precondition already implies
+    don't change anything, so they are dropped too, and so are actions left without
+    an effect."""
+    pruned_actions = []
+    for a in actions:
+        if not all(fact in reachable_facts for fact in a.precondition):
+            continue
+        prevail = a.prevail
+        effect = [
+            fact
+            for fact in a.effect
+            if fact[0] not in constant_vars and fact not in prevail
+        ]
+        if not effect:
+            continue
+        precondition = [fact for fact in a.precondition if fact[0] not in constant_vars]
+        if len(precondition) == len(a.precondition) and len(effect) == len(a.effect):
+            pruned_actions.append(a)
+        else:
+            pruned_actions.append(VarValAction(a.name, precondition, effect, a.cost))
+    return pruned_actions
+
+
+def prune_unreachable_columnar_actions(
+    actions: ColumnarActions, reachable_facts: FactSet, constant_vars: set
+) -> ColumnarActions:
+    """Do what `prune_unreachable_actions` does, on the fact ids"""
+    fact_index = actions.fact_index
+    is_reachable = bytearray(len(fact_index))
+    for var, values in reachable_facts:
+        for val in values:
+            fact_id = fact_index.ids.get((var, val))
+            if fact_id is not None:
+                is_reachable[fact_id] = 1
+    is_constant = bytearray([var in constant_vars for var, _ in fact_index.facts])
+    pruned_actions = ColumnarActions(fact_index)
+    for i in range(len(actions)):
+        precondition_ids = actions.get_precondition_ids(i)
+        if not all([is_reachable[f] for f in precondition_ids]):
+            continue
+        effect_ids = [
+            f for f in actions.get_changed_effect_ids(i) if not is_constant[f]
+        ]
+        if not effect_ids:
+            continue
+        pruned_actions.append_ids(
+            actions.get_name(i),
+            [f for f in precondition_ids if not is_constant[f]],
+            effect_ids,
+            actions.costs[i],
         )
-        for a in actions
-    ]
-    mutexes = prune_mutexes(scoping_task.mutexes, facts)
-    axioms = [
-        VarValAction(
-            name="",
-            precondition=prune_facts(ax.precondition, facts),
-            effect=prune_facts(ax.effect, facts),
-            cost=0,
+    return pruned_actions
+
+
+def prune_unreachable_values(scoping_task: ScopingTask) -> ScopingTask:
+    """Remove the values that are unreachable in their variable's domain transition
+    graph, and then the variables that only have one value left.
+
+    This is `simplify.filter_unreachable_propositions` in ScopingTask space (without
+    renumbering), and likewise raises simplify.Impossible if the goal is unreachable
+    and simplify.TriviallySolvable if no goal facts are left.
+
+    A ColumnarScopingTask is pruned on its fact ids, and stays columnar.
+    """
+    reachable_facts = compute_dtg_reachability(scoping_task)
+    constant_vars = set(var for var, values in reachable_facts if len(values) == 1)
+    facts = FactSet({var: values for var, values in reachable_facts if len(values) > 1})
+
+    def is_possible(fact_list):
+        return all(fact in reachable_facts for fact in fact_list)
+
+    def prune_constants(fact_list):
+        return [fact for fact in fact_list if fact[0] not in constant_vars]
+
+    if not is_possible(scoping_task.goal):
+        raise simplify.Impossible
+    goal = prune_constants(scoping_task.goal)
+    if not goal:
+        raise simplify.TriviallySolvable
+
+    if isinstance(scoping_task.actions, ColumnarActions):
+        actions = prune_unreachable_columnar_actions(
+            scoping_task.actions, reachable_facts, constant_vars
+        )
+    else:
+        actions = prune_unreachable_actions(
+            scoping_task.actions, reachable_facts, constant_vars
         )
-        for ax in scoping_task.axioms
+
+    axioms = []
+    for ax in scoping_task.axioms:
+        if not ax.effect or not is_possible(ax.precondition):
+            continue
+        if ax.effect[0][0] in constant_vars:
+            continue
+        axioms.append(
+            VarValAction(
+                name="",
+                precondition=prune_constants(ax.precondition),
+                effect=ax.effect[:1],
+                cost=0,
+            )
+        )
+
+    mutexes = [
+        mutex
+        for mutex in (
+            [fact for fact in mutex if fact in facts] for mutex in scoping_task.mutexes
+        )
+        if len(mutex) > 1
     ]
-    return ScopingTask(
+    return type(scoping_task)(
         domains=facts,
-        init=init,
+        init=prune_constants(scoping_task.init),
         goal=goal,
         actions=actions,
         mutexes=mutexes,
@@ -116,19 +374,43 @@ def prune_task(
 def scope(
     scoping_task: ScopingTask,
     options: ScopingOptions,
+    profiler: ScopingProfiler = disabled_profiler,
+    return_layers: bool = False,
 ):
+    """Scope the task. If `return_layers` is set, also return the scoping layers of
+    the task that `TaskGraph` visualizes, i.e. the forward fixpoint if the forward
+    pass is enabled, or else the backward fixpoint. The latter is then reused as the
+    first backward pass, rather than computing it twice."""
     aggregated_info = defaultdict(int)
+    merge_cache = MergeCache()
+    goal_relevance = None
+    if return_layers:
+        with profiler.phase("scoping layers"):
+            layers, facts, actions, info = trace_scoping_layers(
+                scoping_task, options, merge_cache
+            )
+        if not options.enable_forward_pass:
+            # Match the action order of compute_goal_relevance
+            actions_in_order = dict.fromkeys(scoping_task.actions)
+            action_ids = {a: i for i, a in enumerate(actions_in_order)}
+            goal_relevance = (facts, sorted(actions, key=action_ids.get), info)
+    n_rounds = 0
     while True:
+        n_rounds += 1
         scoped_task, info = scope_backward(
             scoping_task,
             enable_merging=options.enable_merging,
             enable_causal_links=options.enable_causal_links,
             enable_fact_based=options.enable_fact_based,
+            profiler=profiler,
+            goal_relevance=goal_relevance,
+            merge_cache=merge_cache,
         )
+        goal_relevance = None
         for key, val in info.items():
             aggregated_info[key] += val
         if options.enable_forward_pass:
-            scoped_task, goal_reachable = scope_forward(scoped_task)
+            scoped_task, goal_reachable = scope_forward(scoped_task, profiler=profiler)
             if not goal_reachable:
                 # TODO: do something smart
                 pass
@@ -140,6 +422,10 @@ def scope(
             scoping_task = scoped_task
         else:
             break
+    profiler.record_iterations("scoping loop", n_rounds)
+    profiler.add_info(aggregated_info)
+    if return_layers:
+        return scoped_task, layers
     return scoped_task
 
 
@@ -150,90 +436,159 @@ def track_scoping_progress(info: dict, sas_task: fd.SASTask):
     return info
 
 
+def get_task_size(scoping_task: ScopingTask) -> tuple[int, int, int]:
+    """Count the variables, facts and actions of the task"""
+    return (
+        len(scoping_task.domains),
+        scoping_task.domains.n_facts,
+        len(scoping_task.actions),
+    )
+
+
 def scope_sas_task(
     sas_task: fd.SASTask,
     scoping_options: ScopingOptions,
+    profiler: ScopingProfiler = disabled_profiler,
+    columnar: bool = False,
 ) -> tuple[fd.SASTask, dict]:
+    """Scope the task, looping until nothing more is removed if enable_loop is set.
+
+    Rounds stay in ScopingTask space: the forward pass is done with
+    `prune_unreachable_values`, which gives the same result as converting to SAS and
+    running `simplify.filter_unreachable_propositions`, so the task is only
+    converted to SAS once at the end.
+
+    Since the result is meant for search, actions whose effects change nothing and
+    duplicate actions are removed as well (see `remove_redundant_actions`).
+
+    If `columnar` is set, the task is held as a `ColumnarScopingTask` throughout,
+    which takes a fraction of the memory for tasks with very many operators, and
+    lets backward relevance without merging run on NumPy.
+
+    Pass a `ScopingProfiler` to record the time spent in each phase, alongside the
+    returned info.
+    """
     aggregated_info = {
         "Scoping merge attempts": 0,
+        "Scoping merge cache hits": 0,
+        "Scoping merge cache misses": 0,
         "Scoping vars": f"{len(sas_task.variables.ranges)}",
         "Scoping facts": f"{sum(sas_task.variables.ranges)}",
         "Scoping operators": f"{len(sas_task.operators)}",
     }
-    info = {}
+    with profiler.phase("from_sas"):
+        if columnar:
+            scoping_task = ColumnarScopingTask.from_sas(sas_task)
+        else:
+            scoping_task = ScopingTask.from_sas(sas_task)
+    # Merge results are reused across rounds, but not across tasks
+    merge_cache = MergeCache()
+    scoped_sas = None
+    n_rounds = 0
     should_continue = True
     while should_continue:
         should_continue = False
-        scoping_task = ScopingTask.from_sas(sas_task)
+        n_rounds += 1
         scoped_task, info = scope_backward(
             scoping_task,
             enable_merging=scoping_options.enable_merging,
             enable_causal_links=scoping_options.enable_causal_links,
             enable_fact_based=scoping_options.enable_fact_based,
+            profiler=profiler,
+            remove_redundant=True,
+            merge_cache=merge_cache,
         )
         for key, val in info.items():
             aggregated_info[key] += val
-        scoped_sas = scoped_task.to_sas()
         if scoping_options.enable_forward_pass:
             try:
-                simplify.filter_unreachable_propositions(scoped_sas, quiet=True)
+                with profiler.phase("simplify"):
+                    scoped_task = prune_unreachable_values(scoped_task)
+                    # Dropping constant variables can leave duplicate actions
+                    scoped_task.actions = remove_redundant_actions(scoped_task.actions)
             except simplify.Impossible:
                 scoped_sas = unsolvable_sas_task("Simplified to trivially false goal")
             except simplify.TriviallySolvable:
                 scoped_sas = solvable_sas_task("Simplified to empty goal")
-
-            if scoping_options.enable_loop:
-                n_vars_removed = len(sas_task.variables.ranges) - len(
-                    scoped_sas.variables.ranges
-                )
-                n_facts_removed = sum(sas_task.variables.ranges) - sum(
-                    scoped_sas.variables.ranges
-                )
-                n_actions_removed = len(sas_task.operators) - len(scoped_sas.operators)
-                something_was_removed = (
-                    n_vars_removed + n_facts_removed + n_actions_removed
-                )
-                if something_was_removed and scoped_sas not in [
-                    trivial_task(solvable=True),
-                    trivial_task(solvable=False),
-                ]:
-                    sas_task = scoped_sas
+            else:
+                if scoping_options.enable_loop and get_task_size(
+                    scoped_task
+                ) != get_task_size(scoping_task):
+                    scoping_task = scoped_task
                     should_continue = True
-        aggregated_info["Scoping vars"] += f" -> {len(scoped_sas.variables.ranges)}"
-        aggregated_info["Scoping facts"] += f" -> {sum(scoped_sas.variables.ranges)}"
-        aggregated_info["Scoping operators"] += f" -> {len(scoped_sas.operators)}"
 
-    scoped_sas._sort_all()
+        if scoped_sas is None:
+            n_vars, n_facts, n_actions = get_task_size(scoped_task)
+        else:
+            n_vars = len(scoped_sas.variables.ranges)
+            n_facts = sum(scoped_sas.variables.ranges)
+            n_actions = len(scoped_sas.operators)
+        aggregated_info["Scoping vars"] += f" -> {n_vars}"
+        aggregated_info["Scoping facts"] += f" -> {n_facts}"
+        aggregated_info["Scoping operators"] += f" -> {n_actions}"
+
+    profiler.record_iterations("scoping loop", n_rounds)
+    profiler.add_info(aggregated_info)
+    with profiler.phase("to_sas"):
+        if scoped_sas is None:
+            scoped_sas = scoped_task.to_sas()
+        scoped_sas._sort_all()
     return scoped_sas, aggregated_info
 
 
 def scope_sas_file(
     scoping_options: ScopingOptions,
     sas_path: str = None,
-    sas_task = None
+    sas_task=None,
+    profiler: ScopingProfiler = disabled_profiler,
+    columnar: bool = False,
 ):
     # We can provide the sas_task directly as an arg, or pass the sas_path str (this latter case enters the if block)
     if sas_path:
-        parser = SasParser(pth=sas_path)
-        parser.parse()
-        sas_task: fd.SASTask = parser.to_fd()
+        with profiler.phase("parse"):
+            sas_task: fd.SASTask = SasTaskReader.from_path(sas_path)
 
-    scoped_sas, info = scope_sas_task(sas_task, scoping_options)
+    scoped_sas, info = scope_sas_task(
+        sas_task, scoping_options, profiler=profiler, columnar=columnar
+    )
     for key, val in sorted(info.items()):
         print(f"{key}: {val}")
 
     if scoping_options.write_output_file:
-        filepath, ext = os.path.splitext(sas_path)
-        output_filename = filepath + "_scoped" + ext
-        with timers.timing("Writing output"):
-            with open(output_filename, "w") as f:
+        with timers.timing("Writing output"), profiler.phase("write"):
+            with open(get_scoped_filename(sas_path), "w") as f:
                 scoped_sas.output(f)
     return info
 
 
+def get_scoped_filename(sas_path: str) -> str:
+    filepath, ext = os.path.splitext(sas_path)
+    return filepath + "_scoped" + ext
+
+
 def parse_args():
     parser = argparse.ArgumentParser()
-    parser.add_argument("sas_file", help="path to sas file")
+    parser.add_argument("sas_file", nargs="?", help="path to sas file")
+    parser.add_argument(
+        "--batch",
+        metavar="DIR",
+        help="scope every sas file under DIR instead of a single sas_file",
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=1, help="number of parallel processes for --batch"
+    )
+    parser.add_argument(
+        "--results",
+        default="scoping_results.jsonl",
+        help="path to the JSONL file of per-task results for --batch "
+        "(default: %(default)s)",
+    )
+    parser.add_argument(
+        "--time-limit", type=float, help="per-task time limit in seconds for --batch"
+    )
+    parser.add_argument(
+        "--memory-limit", type=int, help="per-task memory limit in MiB for --batch"
+    )
     parser.add_argument(
         "--disable-merging", dest="enable_merging", action="store_false"
     )
@@ -247,7 +602,33 @@ def parse_args():
         "--disable-forward-pass", dest="enable_forward_pass", action="store_false"
     )
     parser.add_argument("--disable-loop", dest="enable_loop", action="store_false")
-    return parser.parse_args()
+    parser.add_argument(
+        "--columnar",
+        action="store_true",
+        help="hold the operators in columnar arrays (see ColumnarScopingTask), "
+        "for tasks with very many operators",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="write a per-phase profile of the scoping run to FILE",
+    )
+    parser.add_argument(
+        "--profile-format",
+        choices=["json", "chrome"],
+        default="json",
+        help="format of the --profile output; 'chrome' can be loaded in "
+        "chrome://tracing or Perfetto (default: %(default)s)",
+    )
+    args = parser.parse_args()
+    if (args.sas_file is None) == (args.batch is None):
+        parser.error("specify exactly one of sas_file or --batch")
+    if args.batch and args.profile:
+        parser.error(
+            "--profile only applies to a single sas_file; with --batch, each "
+            "task's profile summary is in the --results file"
+        )
+    return args
 
 
 def main():
@@ -259,7 +640,28 @@ def main():
         enable_forward_pass=args.enable_forward_pass,
         enable_loop=args.enable_loop,
     )
-    scope_sas_file(scoping_options, sas_path=args.sas_file)
+    if args.batch:
+        from scoping.batch import scope_sas_batch
+
+        scope_sas_batch(
+            scoping_options,
+            args.batch,
+            args.results,
+            jobs=args.jobs,
+            time_limit=args.time_limit,
+            memory_limit=args.memory_limit,
+            columnar=args.columnar,
+        )
+    else:
+        profiler = ScopingProfiler(enabled=args.profile is not None)
+        scope_sas_file(
+            scoping_options,
+            sas_path=args.sas_file,
+            profiler=profiler,
+            columnar=args.columnar,
+        )
+        if args.profile:
+            profiler.dump(args.profile, format=args.profile_format)
 
 
 if __name__ == "__main__":
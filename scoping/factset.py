@@ -1,9 +1,38 @@
 from collections import defaultdict
+from collections.abc import MutableSet
 from typing import Any, Iterable, Optional, overload, Tuple, Union
 
 VarValPair = Tuple[int, int]
 
 
+def get_set_bits(digits: str) -> list[int]:
+    """Get the positions of the 1s in `digits`, a string of binary digits with the
+    lowest bit first, in increasing order"""
+    positions = []
+    i = digits.find("1")
+    while i != -1:
+        positions.append(i)
+        i = digits.find("1", i + 1)
+    return positions
+
+
+def get_bits(positions: list[int]) -> int:
+    """Get the int with the bits at `positions` set, in time linear in its size"""
+    if not positions:
+        return 0
+    digits = bytearray(b"0" * (max(positions) + 1))
+    for i in positions:
+        digits[i] = ord("1")
+    digits.reverse()
+    return int(digits, 2)
+
+
+def get_digits(bits: int) -> str:
+    """Get the binary digits of `bits`, lowest bit first. Unlike shifting a big int,
+    indexing the string takes constant time per bit."""
+    return bin(bits)[:1:-1]
+
+
 class FactSet:
     facts: dict[Any, set[Any]]
 
@@ -97,3 +126,247 @@ class FactSet:
                 return False
             values = self.facts[var]
             return val in values
+
+
+class FactIndex:
+    """Intern (var, val) pairs to dense integer ids, so that sets of facts can be
+    stored as bitmasks. Build one per task, e.g. `FactIndex(scoping_task.domains)`."""
+
+    ids: dict[VarValPair, int]
+    facts: list[VarValPair]
+    var_ids: dict[Any, list[int]]
+
+    def __init__(self, domains=None) -> None:
+        self.ids = {}
+        self.facts = []
+        self.var_ids = {}
+        if domains is None:
+            return
+        if isinstance(domains, FactSet):
+            domains = domains.facts
+        for var, values in domains.items():
+            for val in values:
+                self.id(var, val)
+
+    def __len__(self) -> int:
+        return len(self.facts)
+
+    def id(self, var: Any, val: Any) -> int:
+        """Get the id of the fact (var = val), interning it if necessary"""
+        fact = (var, val)
+        fact_id = self.ids.get(fact)
+        if fact_id is None:
+            fact_id = len(self.facts)
+            self.ids[fact] = fact_id
+            self.facts.append(fact)
+            self.var_ids.setdefault(var, []).append(fact_id)
+        return fact_id
+
+    def decode(self, bits: int) -> dict[Any, set[Any]]:
+        """Convert a bitmask of fact ids back to a dict of var -> values"""
+        return self.decode_ids(get_set_bits(get_digits(bits)))
+
+    def decode_ids(self, fact_ids: Iterable[int]) -> dict[Any, set[Any]]:
+        """Convert fact ids back to a dict of var -> values"""
+        facts = {}
+        for fact_id in fact_ids:
+            var, val = self.facts[fact_id]
+            facts.setdefault(var, set()).add(val)
+        return facts
+
+
+class BitFactValues(MutableSet):
+    """The values of one variable in a BitFactSet, as a live view, so that
+    `facts[var].add(val)` changes `facts` as it does for a FactSet"""
+
+    def __init__(self, fact_set: "BitFactSet", var: Any) -> None:
+        self.fact_set = fact_set
+        self.var = var
+
+    @classmethod
+    def _from_iterable(cls, values):
+        return set(values)
+
+    def __contains__(self, val) -> bool:
+        return (self.var, val) in self.fact_set
+
+    def __iter__(self):
+        facts, has_id = self.fact_set.index.facts, self.fact_set.has_id
+        fact_ids = self.fact_set.index.var_ids.get(self.var, ())
+        return iter([facts[i][1] for i in fact_ids if has_id(i)])
+
+    def __len__(self) -> int:
+        has_id = self.fact_set.has_id
+        return sum([has_id(i) for i in self.fact_set.index.var_ids.get(self.var, ())])
+
+    def __repr__(self) -> str:
+        return repr(set(self))
+
+    def add(self, val) -> None:
+        self.fact_set.add(self.var, val)
+
+    def discard(self, val) -> None:
+        fact_id = self.fact_set.index.ids.get((self.var, val))
+        if fact_id is not None:
+            self.fact_set.bits &= ~(1 << fact_id)
+
+    def union(self, *others) -> set[Any]:
+        return set(self).union(*others)
+
+    def copy(self) -> set[Any]:
+        return set(self)
+
+
+class BitFactSet(FactSet):
+    """A FactSet stored as a Python int bitmask over the fact ids of a FactIndex
+
+    Union, subset and equality checks between BitFactSets with the same index are
+    single integer operations. Sets with different indices (or plain FactSets) are
+    still supported: adding their facts interns them into this set's index, while
+    comparing with them leaves the index alone.
+
+    Reading single facts, variables or values goes through the binary digits of the
+    bitmask, which are computed once per change, so each read is constant time
+    rather than a shift of the whole bitmask.
+
+    The index should be built per task, and is either passed explicitly or bound to
+    a subclass with `BitFactSet.with_index(FactIndex(scoping_task.domains))`, which
+    can then be used instead of FactSet for that task. No pass uses it by default.
+    """
+
+    index: FactIndex
+    default_index: Optional[FactIndex] = None
+
+    def __init__(
+        self,
+        facts=None,
+        index: Optional[FactIndex] = None,
+    ) -> None:
+        if index is None:
+            if isinstance(facts, BitFactSet):
+                index = facts.index
+            else:
+                index = self.default_index
+        if index is None:
+            raise TypeError("BitFactSet needs a FactIndex")
+        self.index = index
+        self.bits = 0
+        if facts is None:
+            return
+        if isinstance(facts, (FactSet, dict)):
+            self.union(facts)
+        else:
+            self.add(facts)
+
+    @classmethod
+    def with_index(cls, index: FactIndex) -> type:
+        """Get a subclass whose sets use `index` unless given another one"""
+        return type(cls.__name__, (cls,), {"default_index": index})
+
+    @property
+    def bits(self) -> int:
+        return self._bits
+
+    @bits.setter
+    def bits(self, bits: int) -> None:
+        self._bits = bits
+        self._digits = None
+
+    def get_digits(self) -> str:
+        if self._digits is None:
+            self._digits = get_digits(self._bits)
+        return self._digits
+
+    def has_id(self, fact_id: int) -> bool:
+        digits = self.get_digits()
+        return fact_id < len(digits) and digits[fact_id] == "1"
+
+    @property
+    def facts(self) -> dict[Any, set[Any]]:
+        return self.index.decode_ids(get_set_bits(self.get_digits()))
+
+    def __repr__(self) -> str:
+        return f"BitFactSet({repr(self.facts)})"
+
+    def __getitem__(self, key: Any) -> BitFactValues:
+        return BitFactValues(self, key)
+
+    def __eq__(self, other) -> bool:
+        if other is None:
+            return False
+        return self.bits == self._bits_of(other, intern=False)
+
+    def __len__(self) -> int:
+        return len(self.variables)
+
+    def __iter__(self):
+        return iter(self.facts.items())
+
+    @property
+    def variables(self) -> list[Any]:
+        facts = self.index.facts
+        fact_ids = get_set_bits(self.get_digits())
+        return list(dict.fromkeys([facts[i][0] for i in fact_ids]))
+
+    @property
+    def n_facts(self) -> int:
+        return self.get_digits().count("1")
+
+    def add(
+        self,
+        facts_iterable_or_var: Union[Any, Iterable[VarValPair]],
+        val: Optional[Any] = None,
+    ) -> None:
+        """Add a new fact (var = val), or an iterable of such facts, to the FactSet"""
+        if val is None:
+            facts_iterable = facts_iterable_or_var
+            fact_id = self.index.id
+            self.bits |= get_bits([fact_id(var, val) for var, val in facts_iterable])
+        else:
+            var = facts_iterable_or_var
+            self.bits |= 1 << self.index.id(var, val)
+
+    def union(
+        self,
+        other_facts_or_var,
+        values: Optional[set[Any]] = None,
+    ) -> None:
+        """Take the in-place union of the FactSet with the specified additional facts"""
+        if values is None:
+            self.bits |= self._bits_of(other_facts_or_var)
+        else:
+            var = other_facts_or_var
+            self.add((var, val) for val in values)
+
+    def __contains__(self, item) -> bool:
+        """Check if a (var, val) pair is an element of the FactSet, or if another
+        FactSet is a subset of this one"""
+        if isinstance(item, FactSet):
+            bits = self._bits_of(item, intern=False)
+            return bits is not None and not (bits & ~self.bits)
+        else:
+            fact_id = self.index.ids.get(item)
+            if fact_id is None:
+                return False
+            return self.has_id(fact_id)
+
+    def _bits_of(self, other_facts, intern: bool = True) -> Optional[int]:
+        """Get the bitmask of `other_facts` with respect to this set's index. Unless
+        `intern` is set, facts that aren't in the index aren't added to it, and None
+        is returned if there are any."""
+        if isinstance(other_facts, BitFactSet) and other_facts.index is self.index:
+            return other_facts.bits
+        if isinstance(other_facts, FactSet):
+            other_facts = other_facts.facts
+        ids = self.index.ids
+        fact_ids = []
+        for var, values in other_facts.items():
+            for val in values:
+                if intern:
+                    fact_id = self.index.id(var, val)
+                else:
+                    fact_id = ids.get((var, val))
+                    if fact_id is None:
+                        return None
+                fact_ids.append(fact_id)
+        return get_bits(fact_ids)
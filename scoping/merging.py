@@ -1,4 +1,5 @@
-from typing import Any
+from collections import defaultdict, OrderedDict
+from typing import Any, Hashable, Optional
 
 from translate.normalize import convert_to_DNF
 from translate.pddl.conditions import Condition, Disjunction, Conjunction
@@ -40,35 +41,121 @@ def simplify_tautologies(
     return partial_states
 
 
-def select_actions_matching_var(
-    actions: list[VarValAction], var: Any
-) -> list[VarValAction]:
-    """Select actions that have a specific variable in their precondition"""
-    selected_actions = []
+class MergeCache:
+    """LRU cache of merge results, keyed by the set of action preconditions along
+    with the domains of the precondition variables
+
+    Make one per scoping run (as `scope` and `scope_sas_task` do), so that results
+    aren't kept, or shared, beyond the task they came from. The domains mustn't be
+    modified in place while the cache is in use, since their keys are memoized.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self.results: OrderedDict[Hashable, tuple[FactSet, dict]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._domains: Optional[FactSet] = None
+        self._domain_keys: dict[Any, tuple[Any, frozenset]] = {}
+
+    def make_key(
+        self, actions: list[VarValAction], variable_domains: FactSet
+    ) -> Hashable:
+        # Preconditions are sorted tuples already, and the result doesn't depend on
+        # the order of the actions or on how many share a precondition, so a set of
+        # them will do, without sorting anything
+        preconditions = frozenset(a.precondition for a in actions)
+        if variable_domains is not self._domains:
+            self._domains = variable_domains
+            self._domain_keys = {}
+        domain_keys = self._domain_keys
+        precond_vars = {var for precond in preconditions for var, _ in precond}
+        for var in precond_vars.difference(domain_keys):
+            domain_keys[var] = (var, frozenset(variable_domains[var]))
+        domains = frozenset(domain_keys[var] for var in precond_vars)
+        return preconditions, domains
+
+    def get(self, key: Hashable) -> Optional[tuple[FactSet, dict]]:
+        result = self.results.get(key)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.results.move_to_end(key)
+        return result
+
+    def put(self, key: Hashable, result: tuple[FactSet, dict]) -> None:
+        self.results[key] = result
+        self.results.move_to_end(key)
+        while len(self.results) > self.maxsize:
+            self.results.popitem(last=False)
+
+    def clear(self) -> None:
+        self.results.clear()
+        self.hits = 0
+        self.misses = 0
+        self._domains = None
+        self._domain_keys = {}
+
+
+def index_actions_by_var(
+    actions: list[VarValAction],
+) -> dict[Any, list[VarValAction]]:
+    """Map each variable to the actions that have it in their precondition"""
+    index = defaultdict(list)
     for action in actions:
-        if any(a_var == var for a_var, _ in action.precondition):
-            selected_actions.append(action)
-    return selected_actions
+        for var in dict.fromkeys(var for var, _ in action.precondition):
+            index[var].append(action)
+    return index
+
 
+def get_precond_without_var(action: VarValAction, free_var: Any) -> tuple[VarValPair]:
+    # The precondition is sorted already, and so is what is left of it
+    return tuple((var, val) for var, val in action.precondition if var != free_var)
 
-def select_actions_matching_precond(
-    actions: list[VarValAction], precond: list[VarValPair], free_var: Any
-) -> list[VarValAction]:
-    """Select actions that have a specific precondition, not accounting for free_var"""
-    selected_actions = []
+
+def index_actions_by_precond(
+    actions: list[VarValAction], free_var: Any
+) -> dict[tuple[VarValPair], list[VarValAction]]:
+    """Map each precondition, not accounting for free_var, to the actions with it"""
+    index = defaultdict(list)
     for action in actions:
-        precond_without_var = sorted(
-            [(var, val) for var, val in action.precondition if var != free_var]
-        )
-        if precond_without_var == sorted(precond):
-            selected_actions.append(action)
-    return selected_actions
+        index[get_precond_without_var(action, free_var)].append(action)
+    return index
 
 
 def merge(
     actions: list[VarValAction],
     relevant_variables: list[Any],
     variable_domains: FactSet,
+    cache: Optional[MergeCache] = None,
+) -> tuple[FactSet, dict]:
+    """Get the relevant precondition facts after merging actions
+
+    Results for partitions of more than one action are memoized in `cache`, if
+    given. The result only depends on the actions' preconditions
+    and the domains of their variables; `relevant_variables` is just used to check
+    that the actions are mergeable.
+    """
+    if cache is None or len(actions) == 1:
+        return merge_uncached(actions, relevant_variables, variable_domains)
+    key = cache.make_key(actions, variable_domains)
+    result = cache.get(key)
+    if result is None:
+        result = merge_uncached(actions, relevant_variables, variable_domains)
+        cache.put(key, result)
+        cache_info = {"Scoping merge cache hits": 0, "Scoping merge cache misses": 1}
+    else:
+        cache_info = {"Scoping merge cache hits": 1, "Scoping merge cache misses": 0}
+    relevant_precond_facts, info = result
+    # Copy the facts, so callers can't modify the cached result
+    return FactSet(relevant_precond_facts), dict(info, **cache_info)
+
+
+def merge_uncached(
+    actions: list[VarValAction],
+    relevant_variables: list[Any],
+    variable_domains: FactSet,
 ) -> tuple[FactSet, dict]:
     """Get the relevant precondition facts after merging actions"""
     info = {
@@ -76,9 +163,10 @@ def merge(
     }
     if len(actions) == 1:
         return get_precondition_facts(actions[0], variable_domains), info
-    h0 = actions[0].effect_hash(relevant_variables)
+    relevant_variable_set = set(relevant_variables)
+    h0 = actions[0].effect_hash(relevant_variable_set)
     for a in actions[1:]:
-        h = a.effect_hash(relevant_variables)
+        h = a.effect_hash(relevant_variable_set)
         assert h == h0, "Attempted to merge skills with different effects/costs"
     info["Scoping merge attempts"] += 1
 
@@ -100,33 +188,35 @@ def merge(
         return precond_facts, info
 
     relevant_precond_facts = FactSet()
-    visited_action_names = set()
+    # Track the actions themselves rather than their names, which needn't be unique,
+    # so that the result only depends on the preconditions
+    visited_actions = set()
+    actions_by_var = index_actions_by_var(actions)
+    actions_by_whole_precond = defaultdict(list)
+    for action in actions:
+        actions_by_whole_precond[action.precondition].append(action)
     for var_to_remove in spanning_vars:
         # find all actions that have this variable in their precondition
         # and look for ways to simplify the preconditions
-        matching_actions = select_actions_matching_var(actions, var_to_remove)
+        matching_actions = actions_by_var.get(var_to_remove)
         if not matching_actions:
             # no actions have this variable in their precondition, so the
             # variable can be deleted, and there are no relevant facts to add
             continue
 
-        # compute the unique preconditions for the actions, excluding this variable
-        preconds_without_var = [
-            [(var, val) for var, val in action.precondition if var != var_to_remove]
-            for action in matching_actions
-        ]
-        unique_preconds_without_var = set(
-            [tuple(sorted(precond)) for precond in preconds_without_var]
-        )
-        for precond_without_var in unique_preconds_without_var:
-            # get all actions that match this partial precondition
-            considered_actions = select_actions_matching_precond(
-                actions, precond_without_var, var_to_remove
+        # group the actions by their preconditions, excluding this variable
+        actions_by_precond = index_actions_by_precond(matching_actions, var_to_remove)
+        for precond_without_var, considered_actions in actions_by_precond.items():
+            # actions without this variable whose whole precondition is the partial
+            # precondition match it as well (they leave the variable free)
+            considered_actions = considered_actions + actions_by_whole_precond.get(
+                precond_without_var, []
             )
 
             # get list of values of var_to_remove required for the considered_actions
             var_to_remove_values = [
-                FactSet(a.precondition)[var_to_remove] for a in considered_actions
+                set(val for var, val in a.precondition if var == var_to_remove)
+                for a in considered_actions
             ]
             var_to_remove_values = set().union(
                 *[
@@ -146,15 +236,14 @@ def merge(
             relevant_precond_facts.add(precond_without_var)
 
             # mark the considered_actions as visited
-            for a in considered_actions:
-                visited_action_names.add(a.name)
+            visited_actions.update(considered_actions)
 
     # We should have marked actions as visited already so there shouldn't be too
     # many left to consider. There are no variables to remove in these actions,
     # because we've already tried to remove all possible variables. so we just mark
     # their preconditions as relevant.
     for action in actions:
-        if action.name not in visited_action_names:
+        if action not in visited_actions:
             relevant_precond_facts.add(action.precondition)
 
     return relevant_precond_facts, info
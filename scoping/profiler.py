@@ -0,0 +1,127 @@
+from collections import defaultdict
+import contextlib
+import json
+import time
+
+
+class ScopingProfiler:
+    """Record where a scoping run spends its time.
+
+    Each phase records its wall-clock and CPU time, and phases can be nested. There
+    are also named counters (e.g. actions touched, merge cache hits) and the number
+    of iterations of each fixpoint computation. A disabled profiler records nothing,
+    so it can be passed around unconditionally.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.start_time = time.perf_counter()
+        self.events = []
+        self.counters = defaultdict(int)
+        self.iterations = defaultdict(list)
+        self._depth = 0
+
+    @contextlib.contextmanager
+    def phase(self, name: str, **args):
+        if not self.enabled:
+            yield
+            return
+        start_time = time.perf_counter()
+        start_clock = time.process_time()
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            self.events.append(
+                {
+                    "name": name,
+                    "start": start_time - self.start_time,
+                    "wall": time.perf_counter() - start_time,
+                    "cpu": time.process_time() - start_clock,
+                    "depth": self._depth,
+                    "args": args,
+                }
+            )
+
+    def count(self, key: str, n: int = 1):
+        if self.enabled:
+            self.counters[key] += n
+
+    def add_info(self, info: dict):
+        """Add the numeric entries of a scoping info dict to the counters"""
+        for key, val in info.items():
+            if isinstance(val, int) and not isinstance(val, bool):
+                self.count(key, val)
+
+    def record_iterations(self, fixpoint: str, n_iterations: int):
+        if self.enabled:
+            self.iterations[fixpoint].append(n_iterations)
+
+    def get_phase_totals(self) -> dict:
+        totals = {}
+        for event in self.events:
+            total = totals.setdefault(event["name"], {"calls": 0, "wall": 0, "cpu": 0})
+            total["calls"] += 1
+            total["wall"] += event["wall"]
+            total["cpu"] += event["cpu"]
+        return totals
+
+    def summary(self) -> dict:
+        from translate import tools
+
+        try:
+            peak_memory = tools.get_peak_memory_in_kb()
+        except Warning:
+            peak_memory = None
+        return {
+            "phases": self.get_phase_totals(),
+            "iterations": dict(self.iterations),
+            "counters": dict(self.counters),
+            "process peak memory KB": peak_memory,
+        }
+
+    def to_json(self) -> dict:
+        profile = self.summary()
+        profile["events"] = sorted(self.events, key=lambda event: event["start"])
+        return profile
+
+    def to_chrome_trace(self) -> dict:
+        """Convert to the Trace Event Format read by chrome://tracing and Perfetto"""
+        trace_events = [
+            {
+                "name": event["name"],
+                "ph": "X",
+                "ts": event["start"] * 1e6,
+                "dur": event["wall"] * 1e6,
+                "pid": 0,
+                "tid": 0,
+                "args": dict(event["args"], cpu=event["cpu"]),
+            }
+            for event in self.events
+        ]
+        end_time = max((e["start"] + e["wall"] for e in self.events), default=0)
+        trace_events.extend(
+            {
+                "name": key,
+                "ph": "C",
+                "ts": end_time * 1e6,
+                "pid": 0,
+                "args": {key: val},
+            }
+            for key, val in self.counters.items()
+        )
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def dump(self, path: str, format: str = "json"):
+        if format == "chrome":
+            profile = self.to_chrome_trace()
+        elif format == "json":
+            profile = self.to_json()
+        else:
+            raise ValueError(f"Unknown profile format: {format}")
+        with open(path, "w") as f:
+            json.dump(profile, f, indent=2)
+
+
+disabled_profiler = ScopingProfiler(enabled=False)
@@ -1,6 +1,6 @@
 import os
 import re
-from typing import Tuple, List, NewType, Optional
+from typing import Iterable, Tuple, List, NewType, Optional
 
 
 import translate.sas_tasks as fd
@@ -788,6 +788,163 @@ class SasParser:
         return sas_task
 
 
+class SasTaskReader:
+    """
+    Read a sas file into an fd.SASTask in a single pass over its lines.
+
+    Unlike SasParser, this never holds the whole file in memory, and builds the
+    fd datastructures directly instead of going through SasVar, SasOperator, etc.
+    There is one reading function per section, called in file order by `read`.
+    """
+
+    def __init__(self, lines: Iterable[str]) -> None:
+        """
+        `lines` can be any iterable of lines, e.g. an open text file or
+        `s_sas.splitlines()`.
+        """
+        self.lines = iter(lines)
+        self.line_number = 0
+
+    @classmethod
+    def from_path(cls, pth: str) -> fd.SASTask:
+        with open(pth, "r") as f:
+            return cls(f).read()
+
+    @classmethod
+    def from_str(cls, s_sas: str) -> fd.SASTask:
+        return cls(s_sas.splitlines()).read()
+
+    def read(self) -> fd.SASTask:
+        """Do entire reading"""
+        self.read_version()
+        metric = self.read_metric()
+        variables = self.read_variables()
+        mutexes = self.read_mutexes()
+        init = self.read_initial_state(len(variables.ranges))
+        goal = self.read_goal()
+        operators = self.read_operators()
+        axioms = self.read_axioms()
+        return fd.SASTask(variables, mutexes, init, goal, operators, axioms, metric)
+
+    # Reading functions
+    def read_version(self) -> str:
+        self.expect("begin_version")
+        version = self.next_line()
+        self.expect("end_version")
+        return version
+
+    def read_metric(self) -> int:
+        """The metric should be 0 or 1"""
+        self.expect("begin_metric")
+        metric = self.next_int()
+        self.expect("end_metric")
+        return metric
+
+    def read_variables(self) -> fd.SASVariables:
+        ranges = []
+        axiom_layers = []
+        value_names = []
+        for _ in range(self.next_int()):
+            self.expect("begin_variable")
+            self.next_line()  # variable name, which fd regenerates on output
+            axiom_layers.append(self.next_int())
+            var_range = self.next_int()
+            ranges.append(var_range)
+            value_names.append([self.next_line() for _ in range(var_range)])
+            self.expect("end_variable")
+        return fd.SASVariables(ranges, axiom_layers, value_names)
+
+    def read_mutexes(self) -> List[fd.SASMutexGroup]:
+        mutexes = []
+        for _ in range(self.next_int()):
+            self.expect("begin_mutex_group")
+            facts = [self.next_pair() for _ in range(self.next_int())]
+            self.expect("end_mutex_group")
+            mutexes.append(fd.SASMutexGroup(facts))
+        return mutexes
+
+    def read_initial_state(self, n_vars: int) -> fd.SASInit:
+        self.expect("begin_state")
+        values = [self.next_int() for _ in range(n_vars)]
+        self.expect("end_state")
+        return fd.SASInit(values)
+
+    def read_goal(self) -> fd.SASGoal:
+        self.expect("begin_goal")
+        pairs = [self.next_pair() for _ in range(self.next_int())]
+        self.expect("end_goal")
+        return fd.SASGoal(pairs)
+
+    def read_operators(self) -> List[fd.SASOperator]:
+        operators = []
+        for _ in range(self.next_int()):
+            self.expect("begin_operator")
+            name = self.next_line()
+            prevail = [self.next_pair() for _ in range(self.next_int())]
+            pre_post = [self.read_effect() for _ in range(self.next_int())]
+            cost = self.next_int()
+            self.expect("end_operator")
+            operators.append(fd.SASOperator(f"({name})", prevail, pre_post, cost))
+        return operators
+
+    def read_effect(self) -> Tuple[int, int, int, List[Tuple[int, int]]]:
+        nums = [int(x) for x in self.next_line().split()]
+        n_cond = nums[0]
+        if len(nums) != 2 * n_cond + 4:
+            raise ValueError(
+                f"Line {self.line_number}: we miscounted the total number of "
+                "elements in the effect"
+            )
+        cond = [(nums[i], nums[i + 1]) for i in range(1, 2 * n_cond, 2)]
+        var, pre, post = nums[-3:]
+        return var, pre, post, cond
+
+    def read_axioms(self) -> List[fd.SASAxiom]:
+        axioms = []
+        for _ in range(self.next_int()):
+            self.expect("begin_rule")
+            condition = [self.next_pair() for _ in range(self.next_int())]
+            var, _, post = [int(x) for x in self.next_line().split()]
+            self.expect("end_rule")
+            axioms.append(fd.SASAxiom(condition, (var, post)))
+        return axioms
+
+    # Helper functions
+    def next_line(self) -> str:
+        try:
+            line = next(self.lines)
+        except StopIteration:
+            raise ValueError(
+                f"Unexpected end of sas file after line {self.line_number}"
+            )
+        self.line_number += 1
+        return line.rstrip("\r\n")
+
+    def next_int(self) -> int:
+        line = self.next_line()
+        try:
+            return int(line)
+        except ValueError:
+            raise ValueError(f"Line {self.line_number}: expected an int, got {line!r}")
+
+    def next_pair(self) -> Tuple[int, int]:
+        line = self.next_line()
+        try:
+            var, val = line.split()
+            return int(var), int(val)
+        except ValueError:
+            raise ValueError(
+                f"Line {self.line_number}: expected a pair of ints, got {line!r}"
+            )
+
+    def expect(self, keyword: str) -> None:
+        line = self.next_line()
+        if line != keyword:
+            raise ValueError(
+                f"Line {self.line_number}: expected {keyword!r}, got {line!r}"
+            )
+
+
 def test():
     repo_root = "../../.."
     # pth = "../../../gripper-painting.sas"
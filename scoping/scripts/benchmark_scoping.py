@@ -0,0 +1,347 @@
+#!%cd ~/dev/downward/src/translate
+# %%
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+from scoping.actions import VarValAction
+from scoping.backward import compute_goal_relevance, partition_actions
+from scoping.batch import WorkerCrash, run_in_fresh_processes
+from scoping.core import prune_task, scope_sas_task
+from scoping.factset import FactSet
+from scoping.forward import compute_reachability
+from scoping.merging import merge
+from scoping.options import ScopingOptions
+from scoping.task import ScopingTask
+from translate import tools
+
+
+def make_task(domains, init, goal, actions, mutexes=None):
+    value_names = {
+        var: [f"Atom v{var}({val})" for val in sorted(values)]
+        for var, values in domains
+    }
+    return ScopingTask(
+        domains, init, goal, actions, mutexes=mutexes, value_names=value_names
+    )
+
+
+def generate_chain_task(n_actions, seed=0, n_values=10, chain_length=5):
+    """Chains of `chain_length` variables, where each variable counts up from 0 to
+    `n_values` - 1, but only once the previous variable in its chain has finished.
+    Only the chains whose last variable appears in the goal are relevant."""
+    rng = random.Random(seed)
+    n_vars = max(chain_length, n_actions // (n_values - 1))
+    domains = FactSet({var: set(range(n_values)) for var in range(n_vars)})
+    actions = []
+    for var in range(n_vars):
+        for val in range(n_values - 1):
+            precondition = [(var, val)]
+            if var % chain_length:
+                precondition.append((var - 1, n_values - 1))
+            actions.append(
+                VarValAction(f"count-{var}-{val}", precondition, [(var, val + 1)], 1)
+            )
+    chain_ends = list(range(chain_length - 1, n_vars, chain_length))
+    goal_vars = rng.sample(chain_ends, max(1, len(chain_ends) // 2))
+    goal = [(var, n_values - 1) for var in sorted(goal_vars)]
+    init = [(var, 0) for var in range(n_vars)]
+    return make_task(domains, init, goal, actions)
+
+
+def generate_grid_task(n_actions, seed=0, n_agents=4):
+    """Agents moving around a square grid, where entering the last column requires
+    a key that has to be picked up first. Only the first agent has a goal."""
+    rng = random.Random(seed)
+    width = max(2, int((n_actions / (4 * n_agents)) ** 0.5))
+    cells = [(x, y) for x in range(width) for y in range(width)]
+    cell_ids = {cell: i for i, cell in enumerate(cells)}
+    key = n_agents
+    domains = FactSet({agent: set(range(len(cells))) for agent in range(n_agents)})
+    domains.union(key, {0, 1})
+    key_cell = cell_ids[rng.choice(cells)]
+    actions = []
+    for agent in range(n_agents):
+        for (x, y), cell in cell_ids.items():
+            for dx, dy in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
+                target = cell_ids.get((x + dx, y + dy))
+                if target is None:
+                    continue
+                precondition = [(agent, cell)]
+                if x + dx == width - 1:
+                    precondition.append((key, 1))
+                actions.append(
+                    VarValAction(
+                        f"move-{agent}-{cell}-{target}",
+                        precondition,
+                        [(agent, target)],
+                        1,
+                    )
+                )
+        actions.append(
+            VarValAction(f"pickup-{agent}", [(agent, key_cell)], [(key, 1)], 1)
+        )
+    # The first agent starts in the opposite corner to its goal
+    init = [(0, cell_ids[(0, 0)])]
+    init.extend((agent, cell_ids[rng.choice(cells)]) for agent in range(1, n_agents))
+    init.append((key, 0))
+    goal = [(0, cell_ids[(width - 1, width - 1)])]
+    mutexes = [[(agent, 0) for agent in range(n_agents)]]
+    return make_task(domains, init, goal, actions, mutexes=mutexes)
+
+
+def generate_merge_task(n_actions, seed=0, n_selectors=8):
+    """Groups of interchangeable actions that achieve the same target fact, one for
+    each value of a selector variable, which merging can prove irrelevant."""
+    rng = random.Random(seed)
+    n_groups = max(1, n_actions // (2 * n_selectors))
+    domains = FactSet()
+    actions = []
+    for group in range(n_groups):
+        target, selector = 2 * group, 2 * group + 1
+        domains.union(target, {0, 1})
+        domains.union(selector, set(range(n_selectors)))
+        for val in range(n_selectors):
+            actions.append(
+                VarValAction(
+                    f"achieve-{group}-{val}", [(selector, val)], [(target, 1)], 1
+                )
+            )
+            actions.append(
+                VarValAction(f"select-{group}-{val}", [], [(selector, val)], 1)
+            )
+    init = [(var, 0) for var in sorted(domains.variables)]
+    goal_groups = rng.sample(range(n_groups), max(1, n_groups // 2))
+    goal = [(2 * group, 1) for group in sorted(goal_groups)]
+    return make_task(domains, init, goal, actions)
+
+
+def generate_random_task(n_actions, seed=0, max_n_vals=5):
+    """Actions with random preconditions and effects on up to 3 of the variables"""
+    rng = random.Random(seed)
+    n_vars = max(3, n_actions // 10)
+    domains = FactSet(
+        {var: set(range(rng.randint(2, max_n_vals))) for var in range(n_vars)}
+    )
+
+    def random_facts(n_facts):
+        return [
+            (var, rng.randrange(len(domains[var])))
+            for var in rng.sample(range(n_vars), n_facts)
+        ]
+
+    actions = []
+    for i in range(n_actions):
+        effect = random_facts(rng.randint(1, 2))
+        precondition = [
+            fact for fact in random_facts(rng.randint(0, 3)) if fact not in effect
+        ]
+        actions.append(VarValAction(f"action-{i}", precondition, effect, 1))
+    init = [(var, 0) for var in range(n_vars)]
+    goal = random_facts(3)
+    return make_task(domains, init, goal, actions)
+
+
+task_generators = {
+    "chain": generate_chain_task,
+    "grid": generate_grid_task,
+    "merge": generate_merge_task,
+    "random": generate_random_task,
+}
+
+
+def measure(fn, repeat=1, trace_memory=False):
+    """Time `fn`, reporting the fastest of `repeat` runs, and optionally the peak
+    memory it allocates (in a separate run, since tracing slows it down)"""
+    measurement = {"wall": float("inf"), "cpu": float("inf")}
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        start_clock = time.process_time()
+        result = fn()
+        measurement["wall"] = min(measurement["wall"], time.perf_counter() - start_time)
+        measurement["cpu"] = min(measurement["cpu"], time.process_time() - start_clock)
+    if trace_memory:
+        tracemalloc.start()
+        fn()
+        measurement["peak allocated KB"] = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+    return result, measurement
+
+
+def benchmark_task(
+    scoping_task: ScopingTask,
+    scoping_options: ScopingOptions,
+    repeat: int = 1,
+    trace_memory: bool = False,
+) -> dict:
+    """Time each stage of scoping `scoping_task` separately"""
+    n_actions = len(scoping_task.actions)
+    timings = {}
+
+    def run(stage, fn):
+        result, timings[stage] = measure(fn, repeat, trace_memory)
+        wall = timings[stage]["wall"]
+        timings[stage]["actions per second"] = n_actions / wall if wall else None
+        return result
+
+    facts, actions, _ = run(
+        "compute_goal_relevance",
+        lambda: compute_goal_relevance(
+            scoping_task,
+            enable_merging=scoping_options.enable_merging,
+            enable_causal_links=scoping_options.enable_causal_links,
+            enable_fact_based=scoping_options.enable_fact_based,
+        ),
+    )
+    run("compute_reachability", lambda: compute_reachability(scoping_task))
+    relevant_vars = facts.variables
+    partitions = partition_actions(relevant_vars, actions)
+    run(
+        "merge",
+        lambda: [
+            merge(partition, relevant_vars, scoping_task.domains, cache=None)
+            for partition in partitions
+        ],
+    )
+    run("prune_task", lambda: prune_task(scoping_task, facts, actions))
+    sas_task = run("to_sas", scoping_task.to_sas)
+    run("scope_sas_task", lambda: scope_sas_task(sas_task, scoping_options))
+    return {
+        "vars": len(scoping_task.domains),
+        "facts": scoping_task.domains.n_facts,
+        "actions": n_actions,
+        "relevant actions": len(actions),
+        "timings": timings,
+    }
+
+
+def benchmark_generated_task(
+    family: str,
+    size: int,
+    seed: int,
+    scoping_options: ScopingOptions,
+    repeat: int = 1,
+    trace_memory: bool = False,
+) -> dict:
+    start_time = time.perf_counter()
+    scoping_task = task_generators[family](size, seed=seed)
+    generation_time = time.perf_counter() - start_time
+    result = {"family": family, "size": size, "seed": seed}
+    result.update(benchmark_task(scoping_task, scoping_options, repeat, trace_memory))
+    result["generation time"] = generation_time
+    try:
+        result["process peak memory KB"] = tools.get_peak_memory_in_kb()
+    except Warning:
+        result["process peak memory KB"] = None
+    return result
+
+
+def run_benchmarks(
+    families: list[str],
+    sizes: list[int],
+    seed: int = 0,
+    scoping_options: ScopingOptions = None,
+    repeat: int = 1,
+    trace_memory: bool = False,
+) -> list[dict]:
+    """Benchmark each family at each size, one task at a time, each in a fresh
+    process, so that its process peak memory only covers generating and scoping
+    that task"""
+    if scoping_options is None:
+        scoping_options = ScopingOptions()
+    args_list = [
+        (family, size, seed, scoping_options, repeat, trace_memory)
+        for family in families
+        for size in sizes
+    ]
+    results = []
+    for args, result in run_in_fresh_processes(benchmark_generated_task, args_list):
+        family, size = args[:2]
+        if isinstance(result, WorkerCrash):
+            print(f"{family} ({size} actions): {result}")
+            results.append(
+                {
+                    "family": family,
+                    "size": size,
+                    "seed": seed,
+                    "error": f"{type(result).__name__}: {result}",
+                }
+            )
+            continue
+        print(
+            f"{family} ({result['actions']} actions): "
+            + ", ".join(
+                f"{stage} {timing['wall']:.3f}s"
+                for stage, timing in result["timings"].items()
+            )
+        )
+        results.append(result)
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Time each stage of scoping on generated tasks"
+    )
+    parser.add_argument(
+        "--families",
+        nargs="+",
+        choices=sorted(task_generators),
+        default=sorted(task_generators),
+    )
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        type=int,
+        default=[1000, 10000],
+        help="approximate number of actions per task (default: %(default)s)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="report the fastest of this many runs"
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="also measure the peak memory allocated by each stage",
+    )
+    parser.add_argument(
+        "--output",
+        default="scoping_benchmark.json",
+        help="path to the JSON results (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--disable-merging", dest="enable_merging", action="store_false"
+    )
+    parser.add_argument(
+        "--disable-causal-links", dest="enable_causal_links", action="store_false"
+    )
+    parser.add_argument(
+        "--variables-only", dest="enable_fact_based", action="store_false"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    scoping_options = ScopingOptions(
+        enable_causal_links=args.enable_causal_links,
+        enable_merging=args.enable_merging,
+        enable_fact_based=args.enable_fact_based,
+    )
+    results = run_benchmarks(
+        args.families,
+        args.sizes,
+        seed=args.seed,
+        scoping_options=scoping_options,
+        repeat=args.repeat,
+        trace_memory=args.trace_memory,
+    )
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
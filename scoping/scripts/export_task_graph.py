@@ -0,0 +1,155 @@
+#!%cd ~/dev/downward/src/translate
+# %%
+import argparse
+from xml.sax.saxutils import escape
+
+from scoping.core import scope
+from scoping.options import ScopingOptions
+from scoping.sas_parser import SasTaskReader
+from scoping.task import ScopingTask
+from scoping.visualization import Node, TaskGraph, compute_layered_layout
+
+
+def render_svg(
+    layers: list[list[Node]],
+    coordinates: dict[Node, tuple[float, float]],
+    node_radius: float = 6,
+    margin: float = 60,
+    labels: bool = True,
+) -> str:
+    """Draw the graph's layers at the given coordinates (e.g. from
+    `compute_layered_layout`) as an SVG document"""
+    if coordinates:
+        xs = [x for x, _ in coordinates.values()]
+        ys = [y for _, y in coordinates.values()]
+        min_x, min_y = min(xs) - margin, min(ys) - margin
+        view_width, view_height = (
+            max(xs) - min(xs) + 2 * margin,
+            max(ys) - min(ys) + 2 * margin,
+        )
+    else:
+        min_x = min_y = 0
+        view_width = view_height = 2 * margin
+    lines = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" '
+        f'viewBox="{min_x} {min_y} {view_width} {view_height}" '
+        f'width="{view_width}" height="{view_height}">',
+        '<g stroke="#999" stroke-width="1.5">',
+    ]
+    for layer in layers:
+        for node in layer:
+            x2, y2 = coordinates[node]
+            for parent in node.parents:
+                if parent in coordinates:
+                    x1, y1 = coordinates[parent]
+                    lines.append(f'<line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}"/>')
+    lines.append("</g>")
+    lines.append('<g fill="#2196f3" stroke="#333" stroke-width="2">')
+    for layer in layers:
+        for node in layer:
+            x, y = coordinates[node]
+            lines.append(f'<circle cx="{x}" cy="{y}" r="{node_radius}"/>')
+    lines.append("</g>")
+    if labels:
+        lines.append(
+            '<g fill="#333" font-family="Arial" font-size="11" text-anchor="middle">'
+        )
+        for layer in layers:
+            for node in layer:
+                x, y = coordinates[node]
+                label_y = y - node_radius - 5
+                lines.append(f'<text x="{x}" y="{label_y}">{escape(node.name)}</text>')
+        lines.append("</g>")
+    lines.append("</svg>")
+    return "\n".join(lines)
+
+
+def export_task_graph(
+    sas_path: str,
+    scoping_options: ScopingOptions,
+    output_path: str,
+    labels: bool = True,
+    collapse: bool = False,
+    match_precondition: bool = False,
+):
+    scoping_task = ScopingTask.from_sas(SasTaskReader.from_path(sas_path))
+    scoped_task, scoping_layers = scope(
+        scoping_task, scoping_options, return_layers=True
+    )
+    graph = TaskGraph(scoping_task, scoping_options, scoping_layers)
+    if collapse:
+        layers = graph.collapse(scoped_task.domains.variables, match_precondition)
+    else:
+        layers = graph.layers
+    layers = [layer for layer in layers if layer]
+    coordinates = compute_layered_layout(layers, scoping_options.enable_forward_pass)
+    with open(output_path, "w") as f:
+        f.write(render_svg(layers, coordinates, labels=labels))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Draw the scoping graph of a sas file with a layered layout, as SVG"
+    )
+    parser.add_argument("sas_file", help="path to sas file")
+    parser.add_argument(
+        "--output",
+        default="task_graph.svg",
+        help="path to the SVG file (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--no-labels",
+        dest="labels",
+        action="store_false",
+        help="leave out the operator names (for very large graphs)",
+    )
+    parser.add_argument(
+        "--collapse",
+        action="store_true",
+        help="draw one node per group of actions with the same effect and cost on "
+        "the variables left after scoping",
+    )
+    parser.add_argument(
+        "--match-precondition",
+        action="store_true",
+        help="with --collapse, only group actions whose preconditions on those "
+        "variables match too",
+    )
+    parser.add_argument(
+        "--disable-merging", dest="enable_merging", action="store_false"
+    )
+    parser.add_argument(
+        "--disable-causal-links", dest="enable_causal_links", action="store_false"
+    )
+    parser.add_argument(
+        "--variables-only", dest="enable_fact_based", action="store_false"
+    )
+    parser.add_argument(
+        "--disable-forward-pass",
+        dest="enable_forward_pass",
+        action="store_false",
+        help="draw the backward (relevance) graph instead of the forward one",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    scoping_options = ScopingOptions(
+        enable_causal_links=args.enable_causal_links,
+        enable_merging=args.enable_merging,
+        enable_fact_based=args.enable_fact_based,
+        enable_forward_pass=args.enable_forward_pass,
+    )
+    export_task_graph(
+        args.sas_file,
+        scoping_options,
+        args.output,
+        labels=args.labels,
+        collapse=args.collapse,
+        match_precondition=args.match_precondition,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,96 @@ from scoping.factset import FactSet, VarValPair
 
 from collections import defaultdict
 
+
+class SasRemapping:
+    """The renumbering between the variables and values of a ScopingTask with the
+    given domains and the SAS indices of its `to_sas` output, where variables, and
+    each variable's values, are numbered in sorted order.
+
+    The renumbering is computed once, as dicts, and then applied to whole lists of
+    facts at a time. Facts outside the domains raise a KeyError.
+    """
+
+    def __init__(self, domains: FactSet):
+        self.variables = sorted(domains.variables)
+        self.values = [sorted(domains[var]) for var in self.variables]
+        self.var_index = {var: i for i, var in enumerate(self.variables)}
+        self.val_index = {
+            var: {val: i for i, val in enumerate(vals)}
+            for var, vals in zip(self.variables, self.values)
+        }
+
+    def map_facts(self, facts) -> list[VarValPair]:
+        var_index, val_index = self.var_index, self.val_index
+        return [(var_index[var], val_index[var][val]) for var, val in facts]
+
+    def map_pre_post(self, pre_post) -> list[tuple]:
+        var_index, val_index = self.var_index, self.val_index
+        return [
+            (
+                var_index[var],
+                -1 if pre == -1 else val_index[var][pre],
+                val_index[var][post],
+                cond,
+            )
+            for var, pre, post, cond in pre_post
+        ]
+
+    def get_sas_operator(self, a: VarValAction) -> fd.SASOperator:
+        return fd.SASOperator(
+            name=a.name,
+            prevail=self.map_facts(a.prevail),
+            pre_post=self.map_pre_post(a.pre_post),
+            cost=a.cost,
+        )
+
+    def to_sas(self, scoping_task: "ScopingTask") -> fd.SASTask:
+        value_names = scoping_task.value_names
+        variables = fd.SASVariables(
+            ranges=[len(vals) for vals in self.values],
+            axiom_layers=[-1 for _ in self.variables],
+            value_names=[
+                [value_names[var][val] for val in vals]
+                for var, vals in zip(self.variables, self.values)
+            ],
+        )
+        mutexes = (
+            []
+            if scoping_task.mutexes is None
+            else [
+                fd.SASMutexGroup(facts=self.map_facts(mutex))
+                for mutex in scoping_task.mutexes
+                if mutex and len(mutex) > 1
+            ]
+        )
+        init = fd.SASInit(
+            values=[val for _, val in self.map_facts(sorted(scoping_task.init))]
+        )
+        goal = fd.SASGoal(self.map_facts(scoping_task.goal))
+        operators = scoping_task.get_sas_operators(self)
+        axioms = (
+            []
+            if scoping_task.axioms is None
+            else [
+                fd.SASAxiom(
+                    condition=self.map_facts(ax.precondition),
+                    effect=self.map_facts(ax.effect[:1])[0],
+                )
+                for ax in scoping_task.axioms
+                if ax.effect
+            ]
+        )
+        return fd.SASTask(
+            variables=variables,
+            mutexes=mutexes,
+            init=init,
+            goal=goal,
+            operators=operators,
+            axioms=axioms,
+            metric=scoping_task.metric,
+        )
+
+
 class ScopingTask:
     def __init__(
         self,
@@ -29,14 +119,17 @@ class ScopingTask:
         self.value_names = value_names if value_names is not None else {}
 
     @staticmethod
-    def from_sas(sas_task):
+    def from_sas(sas_task, include_operators=True):
         domains = FactSet(
             {i: set(range(r)) for i, r in enumerate(sas_task.variables.ranges)}
         )
         value_names = {i: vals for i, vals in enumerate(sas_task.variables.value_names)}
         init = list(enumerate(sas_task.init.values))
         goal = sas_task.goal.pairs
-        actions = [VarValAction.from_sas(op) for op in sas_task.operators]
+        if include_operators:
+            actions = [VarValAction.from_sas(op) for op in sas_task.operators]
+        else:
+            actions = []
         mutexes = [mutex.facts for mutex in sas_task.mutexes]
         axioms = [
             VarValAction(name="", precondition=ax.condition, effect=[ax.effect], cost=0)
@@ -55,80 +148,10 @@ class ScopingTask:
         )
 
     def to_sas(self):
-        sorted_vars = sorted(self.domains.variables)
-        var_index = {var: i for i, var in enumerate(sorted_vars)}
-        sorted_vals = {var: sorted(vals) for var, vals in self.domains}
-        val_index = {
-            var: {val: i for i, val in enumerate(vals)}
-            for var, vals in sorted_vals.items()
-        }
-        [vals.update({-1: -1}) for _, vals in val_index.items()]
-        variables = fd.SASVariables(
-            ranges=[len(self.domains[var]) for var in sorted_vars],
-            axiom_layers=[-1 for _ in sorted_vars],
-            value_names=[
-                [self.value_names[var][val] for val in sorted_vals[var]]
-                for var in sorted_vars
-            ],
-        )
-        mutexes = (
-            []
-            if self.mutexes is None
-            else [
-                fd.SASMutexGroup(
-                    facts=[(var_index[var], val_index[var][val]) for var, val in mutex]
-                )
-                for mutex in self.mutexes
-                if mutex and len(mutex) > 1
-            ]
-        )
-        init = fd.SASInit(
-            values=[val_index[var][val] for var, val in sorted(self.init)]
-        )
-        goal = fd.SASGoal(
-            [(var_index[var], val_index[var][val]) for var, val in self.goal]
-        )
-        operators = [
-            fd.SASOperator(
-                name=a.name,
-                prevail=[
-                    (var_index[var], val_index[var][val]) for var, val in a.prevail
-                ],
-                pre_post=[
-                    (var_index[var], val_index[var][pre], val_index[var][post], cond)
-                    for var, pre, post, cond in a.pre_post
-                ],
-                cost=a.cost,
-            )
-            for a in self.actions
-        ]
-        axioms = (
-            []
-            if self.axioms is None
-            else [
-                fd.SASAxiom(
-                    condition=[
-                        (var_index[var], val_index[var][val])
-                        for var, val in ax.precondition
-                    ],
-                    effect=(
-                        var_index[ax.effect[0][0]],
-                        val_index[ax.effect[0][0]][ax.effect[0][1]],
-                    ),
-                )
-                for ax in self.axioms
-                if ax.effect
-            ]
-        )
-        return fd.SASTask(
-            variables=variables,
-            mutexes=mutexes,
-            init=init,
-            goal=goal,
-            operators=operators,
-            axioms=axioms,
-            metric=self.metric,
-        )
+        return SasRemapping(self.domains).to_sas(self)
+
+    def get_sas_operators(self, remapping):
+        return [remapping.get_sas_operator(a) for a in self.actions]
 
     def __eq__(self, other):
         if not isinstance(other, ScopingTask):
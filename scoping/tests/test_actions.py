@@ -1,6 +1,6 @@
 #!%cd ~/dev/downward/src/translate
 
-from scoping.actions import VarValAction
+from scoping.actions import VarValAction, get_pre_post, get_prevail
 
 a1 = VarValAction(
     "a1",
@@ -35,10 +35,56 @@ def test_wrong_y():
     assert not a1.can_run(state)
 
 
+def test_frozen():
+    a2 = VarValAction("a2", [("y", 0), ("x", 0), ("y", 0)], [("y", 2), ("x", 2)], 1)
+    assert a2.precondition == a1.precondition == (("x", 0), ("y", 0))
+    assert a2.effect == a1.effect
+    try:
+        a2.cost = 2
+    except AttributeError:
+        pass
+    else:
+        assert False, "VarValAction should be immutable"
+
+
+def test_prevail_and_pre_post():
+    a2 = VarValAction("a2", [("x", 0), ("y", 0), ("z", 1)], [("x", 2), ("z", 1)], 1)
+    assert a2.prevail == (("y", 0), ("z", 1))
+    assert a2.pre_post == (("x", 0, 2, ()),)
+    assert a2.prevail is a2.prevail
+
+
+def test_from_pre_post():
+    # z = 1 is both a precondition and an effect, so it counts as prevail
+    a2 = VarValAction.from_pre_post(
+        "a2", [("y", 0)], [("x", 0, 2, []), ("z", 1, 1, []), ("w", -1, 0, [])], 1
+    )
+    assert a2 == VarValAction(
+        "a2", [("x", 0), ("y", 0), ("z", 1)], [("w", 0), ("x", 2), ("z", 1)], 1
+    )
+    assert a2._prevail == get_prevail(a2.precondition, a2.effect)
+    assert a2._pre_post == get_pre_post(a2.precondition, a2.effect, a2.prevail)
+
+    # If a variable appears twice, they are derived as usual
+    a3 = VarValAction.from_pre_post("a3", [("x", 0)], [("x", 0, 2, [])], 1)
+    assert a3._prevail is None
+    assert a3.pre_post == (("x", 0, 2, ()),)
+
+
+def test_effect_hash():
+    a2 = VarValAction("a2", [], [(0, 1), (2, 0), (3, 1)], 1)
+    assert a2.effect_hash({0, 3}) == (((0, 1), (3, 1)), 1)
+    assert a2.effect_hash(0b1001) == a2.effect_hash({0, 3})
+
+
 test_exact_state()
 test_more_specific()
 test_less_specific()
 test_wrong_x()
 test_wrong_y()
+test_frozen()
+test_prevail_and_pre_post()
+test_from_pre_post()
+test_effect_hash()
 
 print("All tests passed.")
@@ -1,7 +1,9 @@
 #!%cd ~/dev/downward/src/translate
 #
+import itertools
+
 from scoping.actions import VarValAction
-from scoping.backward import compute_goal_relevance
+from scoping.backward import compute_goal_relevance, goal_relevance_step
 from scoping.factset import FactSet
 from scoping.task import ScopingTask
 
@@ -62,7 +64,7 @@ def make_merge_task(
 
 def test_vanilla_values_single():
     scoping_task = make_vanilla_task()
-    relevant_facts, relevant_actions = compute_goal_relevance(
+    relevant_facts, relevant_actions, _ = compute_goal_relevance(
         scoping_task,
         enable_merging=False,
         enable_causal_links=False,
@@ -75,7 +77,7 @@ def test_vanilla_values_single():
 
 def test_vanilla_variables_single():
     scoping_task = make_vanilla_task()
-    relevant_facts, relevant_actions = compute_goal_relevance(
+    relevant_facts, relevant_actions, _ = compute_goal_relevance(
         scoping_task,
         enable_merging=False,
         enable_causal_links=False,
@@ -88,7 +90,7 @@ def test_vanilla_variables_single():
 
 def test_vanilla_values_chain():
     scoping_task = make_vanilla_task(goal=[("z", 1)])
-    relevant_facts, relevant_actions = compute_goal_relevance(
+    relevant_facts, relevant_actions, _ = compute_goal_relevance(
         scoping_task,
         enable_merging=False,
         enable_causal_links=False,
@@ -101,7 +103,7 @@ def test_vanilla_values_chain():
 
 def test_vanilla_variables_chain():
     scoping_task = make_vanilla_task(goal=[("z", 1)])
-    relevant_facts, relevant_actions = compute_goal_relevance(
+    relevant_facts, relevant_actions, _ = compute_goal_relevance(
         scoping_task,
         enable_merging=False,
         enable_causal_links=False,
@@ -114,14 +116,14 @@ def test_vanilla_variables_chain():
 
 def test_merge_values():
     scoping_task = make_merge_task()
-    merging_facts, merging_actions = compute_goal_relevance(
+    merging_facts, merging_actions, _ = compute_goal_relevance(
         scoping_task,
         enable_merging=True,
         enable_causal_links=False,
         enable_fact_based=True,
     )
 
-    nonmerging_facts, nonmerging_actions = compute_goal_relevance(
+    nonmerging_facts, nonmerging_actions, _ = compute_goal_relevance(
         scoping_task,
         enable_merging=False,
         enable_causal_links=False,
@@ -161,14 +163,14 @@ def make_merge_multi_task(
 
 def test_merge_multi():
     scoping_task = make_merge_multi_task()
-    merging_facts, merging_actions = compute_goal_relevance(
+    merging_facts, merging_actions, _ = compute_goal_relevance(
         scoping_task,
         enable_merging=True,
         enable_causal_links=False,
         enable_fact_based=True,
     )
 
-    nonmerging_facts, nonmerging_actions = compute_goal_relevance(
+    nonmerging_facts, nonmerging_actions, _ = compute_goal_relevance(
         scoping_task,
         enable_merging=False,
         enable_causal_links=False,
@@ -186,7 +188,7 @@ def test_causal_links_variables():
         init=[("x", 1), ("y", 0), ("z", 0)],
         goal=[("z", 1)],
     )
-    relevant_facts, relevant_actions = compute_goal_relevance(
+    relevant_facts, relevant_actions, _ = compute_goal_relevance(
         scoping_task,
         enable_merging=False,
         enable_causal_links=True,
@@ -202,7 +204,7 @@ def test_causal_links_values():
         init=[("x", 0), ("y", 1), ("z", 0)],
         goal=[("z", 1)],
     )
-    relevant_facts, relevant_actions = compute_goal_relevance(
+    relevant_facts, relevant_actions, _ = compute_goal_relevance(
         scoping_task,
         enable_merging=False,
         enable_causal_links=True,
@@ -213,6 +215,54 @@ def test_causal_links_values():
     assert sorted([a.name for a in relevant_actions]) == ["a3"]
 
 
+def compute_goal_relevance_by_sweeps(
+    scoping_task, enable_merging, enable_causal_links, enable_fact_based
+):
+    """Reference fixpoint that re-runs goal_relevance_step over every action"""
+    relevant_facts = FactSet(scoping_task.goal)
+    if not enable_fact_based:
+        for var, _ in relevant_facts:
+            relevant_facts.union(var, scoping_task.domains[var])
+    relevant_actions = []
+    prev_facts = None
+    prev_actions = []
+    while relevant_facts != prev_facts or len(relevant_actions) != len(prev_actions):
+        prev_facts, prev_actions = relevant_facts, relevant_actions
+        relevant_facts, relevant_actions, _ = goal_relevance_step(
+            scoping_task.domains,
+            relevant_facts,
+            scoping_task.init,
+            scoping_task.actions,
+            relevant_actions,
+            enable_merging,
+            enable_causal_links,
+            enable_fact_based=enable_fact_based,
+        )
+    relevant_facts.add(scoping_task.init)
+    return relevant_facts, relevant_actions
+
+
+def test_worklist_matches_sweeps():
+    scoping_tasks = [
+        make_vanilla_task(),
+        make_vanilla_task(goal=[("z", 1)]),
+        make_vanilla_task(init=[("x", 1), ("y", 0), ("z", 0)], goal=[("z", 1)]),
+        make_vanilla_task(init=[("x", 0), ("y", 1), ("z", 0)], goal=[("z", 1)]),
+        make_merge_task(),
+        make_merge_multi_task(),
+    ]
+    for scoping_task in scoping_tasks:
+        for options in itertools.product([False, True], repeat=3):
+            facts, actions, _ = compute_goal_relevance(scoping_task, *options)
+            expected_facts, expected_actions = compute_goal_relevance_by_sweeps(
+                scoping_task, *options
+            )
+            assert facts == expected_facts
+            assert sorted(a.name for a in actions) == sorted(
+                a.name for a in expected_actions
+            )
+
+
 # %%
 test_vanilla_values_single()
 test_vanilla_variables_single()
@@ -226,4 +276,6 @@ test_merge_values()
 test_causal_links_variables()
 test_causal_links_values()
 
+test_worklist_matches_sweeps()
+
 print("All tests passed.")
@@ -0,0 +1,67 @@
+#!%cd ~/dev/downward/src/translate
+#
+import json
+import os
+import signal
+import tempfile
+
+from scoping.batch import (
+    WorkerCrash,
+    find_sas_files,
+    run_in_fresh_processes,
+    scope_sas_batch,
+)
+from scoping.options import ScopingOptions
+from scoping.tests.test_sas_reader import SAS
+
+
+def test_batch():
+    with tempfile.TemporaryDirectory() as batch_dir:
+        os.makedirs(os.path.join(batch_dir, "sub"))
+        sas_paths = [
+            os.path.join(batch_dir, "a.sas"),
+            os.path.join(batch_dir, "sub", "b.sas"),
+        ]
+        for sas_path in sas_paths:
+            with open(sas_path, "w") as f:
+                # Scoping doesn't support conditional effects
+                f.write(SAS.replace("1 0 0 1 0 1", "0 1 0 1"))
+        with open(os.path.join(batch_dir, "broken.sas"), "w") as f:
+            f.write("begin_version\n")
+        results_path = os.path.join(batch_dir, "results.jsonl")
+
+        scope_sas_batch(ScopingOptions(), batch_dir, results_path, jobs=2)
+
+        with open(results_path) as f:
+            results = {r["sas_file"]: r for r in map(json.loads, f)}
+        assert results[os.path.join(batch_dir, "broken.sas")]["status"] == "error"
+        for sas_path in sas_paths:
+            assert results[sas_path]["status"] == "ok"
+            assert results[sas_path]["info"]["Scoping operators"].startswith("2 -> ")
+            assert "scope" in results[sas_path]["timings"]
+            assert os.path.exists(sas_path[: -len(".sas")] + "_scoped.sas")
+        # Scoped outputs shouldn't be picked up by a second run
+        assert len(find_sas_files(batch_dir)) == 3
+
+
+def square_or_crash(n):
+    if n < 0:
+        # Like the OOM killer, this can't be caught in Python
+        os.kill(os.getpid(), signal.SIGKILL)
+    return n * n
+
+
+def test_crash():
+    args_list = [(1,), (-1,), (2,), (-2,), (3,)]
+    results = dict(run_in_fresh_processes(square_or_crash, args_list, jobs=2))
+    assert results.keys() == set(args_list)
+    assert [results[(n,)] for n in [1, 2, 3]] == [1, 4, 9]
+    assert isinstance(results[(-1,)], WorkerCrash)
+    assert str(results[(-2,)]) == "worker process killed by SIGKILL"
+
+
+# %%
+test_batch()
+test_crash()
+
+print("All tests passed.")
@@ -0,0 +1,39 @@
+#!%cd ~/dev/downward/src/translate
+#
+from scoping.backward import compute_goal_relevance
+from scoping.forward import compute_reachability
+from scoping.scripts.benchmark_scoping import run_benchmarks, task_generators
+
+
+def test_generators():
+    for family, generate_task in task_generators.items():
+        scoping_task = generate_task(200, seed=1)
+        assert 100 <= len(scoping_task.actions) <= 200, family
+        _, _, goal_reachable = compute_reachability(scoping_task)
+        if family != "random":
+            assert goal_reachable, family
+        _, relevant_actions, _ = compute_goal_relevance(scoping_task)
+        assert relevant_actions, family
+        # Generation is seeded
+        assert generate_task(200, seed=1).goal == scoping_task.goal
+
+
+def test_run_benchmarks():
+    results = run_benchmarks(sorted(task_generators), [100])
+    assert len(results) == len(task_generators)
+    for result in results:
+        assert list(result["timings"]) == [
+            "compute_goal_relevance",
+            "compute_reachability",
+            "merge",
+            "prune_task",
+            "to_sas",
+            "scope_sas_task",
+        ]
+
+
+# %%
+test_generators()
+test_run_benchmarks()
+
+print("All tests passed.")
@@ -0,0 +1,104 @@
+#!%cd ~/dev/downward/src/translate
+#
+import io
+import itertools
+
+from scoping.backward import compute_goal_relevance
+from scoping.columnar import ColumnarActions, ColumnarScopingTask
+from scoping.core import prune_unreachable_values, scope, scope_sas_task
+from scoping.forward import compute_reachability
+from scoping.options import ScopingOptions
+from scoping.scripts.benchmark_scoping import task_generators
+from scoping.task import ScopingTask
+from scoping.tests.test_loop import make_task
+
+
+def sas_output(scoping_task):
+    f = io.StringIO()
+    scoping_task.to_sas().output(f)
+    return f.getvalue()
+
+
+def test_columnar_actions():
+    scoping_task = make_task()
+    actions = ColumnarScopingTask.from_scoping_task(scoping_task).actions
+    assert len(actions) == len(scoping_task.actions)
+    assert list(actions) == scoping_task.actions
+    assert actions.get_name(2) == "c"
+    assert sorted(actions.get_precondition(2)) == [("x", 1), ("y", 1)]
+    selected = actions.select([4, 0])
+    assert list(selected) == [scoping_task.actions[4], scoping_task.actions[0]]
+    assert selected.fact_index is actions.fact_index
+    assert actions.index_by_fact()[("z", 2)] == [2, 4, 5]
+
+    duplicated = ColumnarActions.from_actions(
+        scoping_task.actions * 2, actions.fact_index
+    )
+    assert duplicated.get_unique_ids() == list(range(len(scoping_task.actions)))
+    assert duplicated.nbytes < 2 * actions.nbytes + 100
+
+
+def test_from_sas():
+    for family, generate_task in task_generators.items():
+        sas_task = generate_task(300, seed=2).to_sas()
+        scoping_task = ScopingTask.from_sas(sas_task)
+        columnar_task = ColumnarScopingTask.from_sas(sas_task)
+        assert columnar_task.to_scoping_task() == scoping_task, family
+        assert columnar_task == ColumnarScopingTask.from_scoping_task(scoping_task)
+        assert sas_output(columnar_task) == sas_output(scoping_task), family
+
+
+def test_passes_match():
+    tasks = [make_task()] + [
+        ScopingTask.from_sas(generate_task(300, seed=3).to_sas())
+        for generate_task in task_generators.values()
+    ]
+    for scoping_task in tasks:
+        columnar_task = ColumnarScopingTask.from_scoping_task(scoping_task)
+
+        facts, actions, goal_reachable = compute_reachability(scoping_task)
+        columnar_facts, columnar_actions, columnar_goal_reachable = (
+            compute_reachability(columnar_task)
+        )
+        assert columnar_facts == facts
+        assert list(columnar_actions) == actions
+        assert columnar_goal_reachable == goal_reachable
+
+        for options in itertools.product([False, True], repeat=3):
+            facts, actions, _ = compute_goal_relevance(scoping_task, *options)
+            columnar_facts, columnar_actions, _ = compute_goal_relevance(
+                columnar_task, *options
+            )
+            assert columnar_facts == facts
+            assert list(columnar_actions) == actions
+
+        for options in itertools.product([False, True], repeat=5):
+            scoping_options = ScopingOptions(*options)
+            scoped_task = scope(scoping_task, scoping_options)
+            columnar_scoped_task = scope(columnar_task, scoping_options)
+            assert isinstance(columnar_scoped_task, ColumnarScopingTask)
+            assert columnar_scoped_task.to_scoping_task() == scoped_task
+
+
+def test_scope_sas_task():
+    for generate_task in task_generators.values():
+        sas_task = generate_task(300, seed=5).to_sas()
+        columnar_task = ColumnarScopingTask.from_sas(sas_task)
+        assert isinstance(prune_unreachable_values(columnar_task), ColumnarScopingTask)
+        for options in itertools.product([False, True], repeat=5):
+            scoping_options = ScopingOptions(*options, write_output_file=False)
+            scoped_sas, info = scope_sas_task(sas_task, scoping_options)
+            columnar_scoped_sas, columnar_info = scope_sas_task(
+                sas_task, scoping_options, columnar=True
+            )
+            assert columnar_scoped_sas == scoped_sas
+            assert columnar_info["Scoping operators"] == info["Scoping operators"]
+
+
+# %%
+test_columnar_actions()
+test_from_sas()
+test_passes_match()
+test_scope_sas_task()
+
+print("All tests passed.")
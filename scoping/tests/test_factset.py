@@ -0,0 +1,151 @@
+#!%cd ~/dev/downward/src/translate
+#
+import itertools
+import time
+from unittest import mock
+
+from scoping.backward import compute_goal_relevance
+from scoping.factset import BitFactSet, FactIndex, FactSet
+from scoping.forward import compute_reachability
+from scoping.tests.test_backward import (
+    make_merge_multi_task,
+    make_merge_task,
+    make_vanilla_task,
+)
+
+
+def test_add_and_contains():
+    facts = BitFactSet([("x", 0), ("y", 1)], index=FactIndex())
+    facts.add("x", 2)
+
+    assert ("x", 0) in facts
+    assert ("x", 2) in facts
+    assert ("x", 1) not in facts
+    assert ("z", 0) not in facts
+    assert facts == FactSet({"x": {0, 2}, "y": {1}})
+    assert sorted(facts.variables) == ["x", "y"]
+    assert len(facts) == 2
+    assert facts.n_facts == 3
+    assert facts["x"] == {0, 2}
+    assert facts["z"] == set()
+
+
+def test_index_is_required():
+    try:
+        BitFactSet([("x", 0)])
+    except TypeError:
+        pass
+    else:
+        assert False, "BitFactSet without an index"
+    index = FactIndex(FactSet({"x": {0, 1}}))
+    TaskFactSet = BitFactSet.with_index(index)
+    assert TaskFactSet([("x", 1)]).index is index
+    assert BitFactSet([("x", 1)], index=index).index is index
+
+
+def test_values_are_mutable():
+    facts = BitFactSet({"x": {0}}, index=FactIndex(FactSet({"x": {0, 1, 2}})))
+    facts["x"].add(1)
+    facts["y"].add(0)
+    assert facts == FactSet({"x": {0, 1}, "y": {0}})
+    facts["x"].discard(0)
+    assert facts["x"] == {1}
+    assert facts["x"].union({2}) == {1, 2}
+    assert facts == FactSet({"x": {1}, "y": {0}})
+
+
+def test_comparisons_do_not_intern():
+    index = FactIndex(FactSet({"x": {0, 1}}))
+    facts = BitFactSet({"x": {0}}, index=index)
+    assert facts != FactSet({"x": {0}, "z": {5}})
+    assert FactSet({"z": {5}}) not in facts
+    assert BitFactSet({"w": {3}}, index=FactIndex()) not in facts
+    assert len(index) == 2
+
+
+def test_union_and_subset():
+    index = FactIndex(FactSet({"x": {0, 1, 2}, "y": {0, 1}}))
+    facts = BitFactSet({"x": {0}}, index=index)
+    other = BitFactSet({"x": {1}, "y": {1}}, index=index)
+
+    assert other not in facts
+    facts.union(other)
+    assert other in facts
+    assert FactSet({"y": {1}}) in facts
+    facts.union("y", {0})
+    assert dict(facts) == {"x": {0, 1}, "y": {0, 1}}
+    assert BitFactSet(facts) == facts
+    assert BitFactSet(facts).index is index
+
+
+def test_mixed_indices():
+    facts = BitFactSet({"x": {0, 1}}, index=FactIndex())
+    other = BitFactSet({"x": {1}}, index=FactIndex())
+
+    assert other in facts
+    assert facts != other
+    other.add("x", 0)
+    assert facts == other
+    assert FactSet(facts) == FactSet({"x": {0, 1}})
+
+
+def test_reads_scale_linearly():
+    def time_reads(n_vars):
+        domains = FactSet({var: set(range(10)) for var in range(n_vars)})
+        facts = BitFactSet(domains, index=FactIndex(domains))
+        best_time = float("inf")
+        for _ in range(3):
+            start_time = time.perf_counter()
+            assert dict(facts) == domains.facts
+            assert len(facts.variables) == len(facts) == n_vars
+            assert all([(var, 9) in facts for var in range(n_vars)])
+            assert sum([len(facts[var]) for var in range(n_vars)]) == 10 * n_vars
+            best_time = min(best_time, time.perf_counter() - start_time)
+        return best_time
+
+    # Quadratic reads would take 16 times as long for 4 times the facts
+    assert time_reads(8000) < 8 * time_reads(2000)
+
+
+def test_bitsets_match_factsets():
+    scoping_tasks = [
+        make_vanilla_task(),
+        make_vanilla_task(goal=[("z", 1)]),
+        make_merge_task(),
+        make_merge_multi_task(),
+    ]
+    for scoping_task in scoping_tasks:
+        for options in itertools.product([False, True], repeat=3):
+            facts, actions, _ = compute_goal_relevance(scoping_task, *options)
+            TaskFactSet = BitFactSet.with_index(FactIndex(scoping_task.domains))
+            with mock.patch("scoping.backward.FactSet", TaskFactSet), mock.patch(
+                "scoping.merging.FactSet", TaskFactSet
+            ):
+                bit_facts, bit_actions, _ = compute_goal_relevance(
+                    scoping_task, *options
+                )
+            assert bit_facts == facts
+            assert bit_actions == actions
+
+        facts, actions, goal_reachable = compute_reachability(scoping_task)
+        TaskFactSet = BitFactSet.with_index(FactIndex(scoping_task.domains))
+        with mock.patch("scoping.forward.FactSet", TaskFactSet):
+            bit_facts, bit_actions, bit_goal_reachable = compute_reachability(
+                scoping_task
+            )
+        assert bit_facts == facts
+        assert bit_actions == actions
+        assert bit_goal_reachable == goal_reachable
+
+
+# %%
+test_add_and_contains()
+test_index_is_required()
+test_values_are_mutable()
+test_comparisons_do_not_intern()
+test_reads_scale_linearly()
+test_union_and_subset()
+test_mixed_indices()
+test_bitsets_match_factsets()
+
+print("All tests passed.")
@@ -1,9 +1,18 @@
 #!%cd ~/dev/downward/src/translate
 #
+import copy
+
 from scoping.actions import VarValAction
-from scoping.forward import compute_reachability
+from scoping.columnar import ColumnarScopingTask
+from scoping.core import prune_unreachable_values
+from scoping.forward import (
+    compute_dtg_reachability,
+    compute_reachability,
+    reachability_step,
+)
 from scoping.factset import FactSet
 from scoping.task import ScopingTask
+from translate import simplify
 
 
 def make_task(
@@ -60,9 +69,86 @@ def test_last_unreachable():
     assert not goal_reachable
 
 
+def compute_reachability_by_sweeps(scoping_task):
+    """Reference fixpoint that re-runs reachability_step over every action"""
+    reachable_facts = FactSet(scoping_task.init)
+    reachable_actions = []
+    prev_facts = None
+    prev_actions = []
+    while reachable_facts != prev_facts or len(reachable_actions) != len(prev_actions):
+        prev_facts, prev_actions = reachable_facts, reachable_actions
+        reachable_facts, reachable_actions = reachability_step(
+            reachable_facts, scoping_task.actions
+        )
+    return reachable_facts, reachable_actions
+
+
+def test_counters_match_sweeps():
+    scoping_tasks = [
+        make_task(),
+        make_task(init=[("x", 1), ("y", 1), ("z", 1)], goal=[("x", 0)]),
+        make_task(init=[("x", 2), ("y", 1), ("z", 2)], goal=[("y", 0)]),
+        make_task(
+            actions=[
+                VarValAction("a", [], [("y", 1)], 1),
+                VarValAction("b", [("x", 0), ("y", 1)], [("x", 1)], 1),
+                VarValAction("c", [("x", 1), ("x", 1)], [("z", 2)], 1),
+                VarValAction("d", [("z", 1)], [("x", 2)], 1),
+            ]
+        ),
+    ]
+    for scoping_task in scoping_tasks:
+        facts, actions, _ = compute_reachability(scoping_task)
+        expected_facts, expected_actions = compute_reachability_by_sweeps(scoping_task)
+        assert facts == expected_facts
+        assert [a.name for a in actions] == [a.name for a in expected_actions]
+
+
+def test_dtg_reachability():
+    scoping_task = make_task()
+    reachable_facts = compute_dtg_reachability(scoping_task)
+    assert reachable_facts == FactSet({"x": {0, 1, 2}, "y": {0, 1}, "z": {0, 1, 2}})
+
+    scoping_task = make_task(init=[("x", 1), ("y", 1), ("z", 1)])
+    reachable_facts = compute_dtg_reachability(scoping_task)
+    assert reachable_facts == FactSet({"x": {1, 2}, "y": {1}, "z": {1, 2}})
+
+
+def test_prune_matches_simplify():
+    scoping_tasks = [
+        make_task(),
+        make_task(init=[("x", 1), ("y", 1), ("z", 1)], goal=[("x", 2), ("z", 2)]),
+        make_task(
+            actions=[
+                VarValAction("a", [], [("y", 1)], 1),
+                VarValAction("b", [("x", 0), ("y", 1)], [("x", 1), ("y", 1)], 1),
+                VarValAction("c", [("x", 1), ("z", 0)], [("z", 2)], 1),
+                VarValAction("d", [("z", 1)], [("x", 2)], 1),
+            ],
+            goal=[("x", 1), ("z", 2)],
+        ),
+    ]
+    for scoping_task in scoping_tasks:
+        scoping_task.value_names = {
+            var: {val: f"{var}={val}" for val in values}
+            for var, values in scoping_task.domains
+        }
+        sas_task = scoping_task.to_sas()
+        expected_sas = copy.deepcopy(sas_task)
+        simplify.filter_unreachable_propositions(expected_sas, quiet=True)
+        expected_sas._sort_all()
+        for from_sas in [ScopingTask.from_sas, ColumnarScopingTask.from_sas]:
+            pruned_sas = prune_unreachable_values(from_sas(sas_task)).to_sas()
+            pruned_sas._sort_all()
+            assert pruned_sas == expected_sas
+
+
 # %%
 test_all_reachable()
 test_mid_unreachable()
 test_last_unreachable()
+test_counters_match_sweeps()
+test_dtg_reachability()
+test_prune_matches_simplify()
 
 print("All tests passed.")
@@ -2,8 +2,14 @@
 # %%
 
 from scoping.actions import VarValAction
-from scoping.core import scope
-from scoping.factset import FactSet
+from scoping.columnar import ColumnarActions, ColumnarScopingTask
+from scoping.core import (
+    prune_mutexes,
+    prune_task,
+    remove_redundant_actions,
+    scope,
+)
+from scoping.factset import FactIndex, FactSet
 from scoping.options import ScopingOptions
 from scoping.task import ScopingTask
 from scoping.visualization import TaskGraph
@@ -146,6 +152,62 @@ def test_loop():
     assert sorted(a.name for a in scoped_task.actions) == list("f")
 
 
+def test_prune_task():
+    actions = list(make_task().actions)
+    # Without y, e is c, but cheaper
+    actions[4] = VarValAction("e", [("x", 1), ("y", 0)], [("z", 2)], 0)
+    scoping_task = make_task(actions=actions)
+    facts = FactSet({"w": {0, 1}, "x": {0, 1}, "z": {0, 1, 2}})
+
+    pruned_task = prune_task(scoping_task, facts, scoping_task.actions)
+    assert [a.name for a in pruned_task.actions] == list("abcdefghi")
+    assert pruned_task.actions[0] is scoping_task.actions[0]
+    assert pruned_task.actions[2].precondition == (("x", 1),)
+
+    # g and h are left without effects, and c and e with the same precondition
+    # and effect, so only the cheaper e is kept
+    pruned_task = prune_task(
+        scoping_task, facts, scoping_task.actions, remove_redundant=True
+    )
+    assert [a.name for a in pruned_task.actions] == list("abedfi")
+
+    columnar_task = ColumnarScopingTask.from_scoping_task(scoping_task)
+    pruned_columnar_task = prune_task(
+        columnar_task, facts, columnar_task.actions, remove_redundant=True
+    )
+    assert pruned_columnar_task.to_scoping_task() == pruned_task
+
+
+def test_remove_redundant_actions():
+    actions = [
+        # The effect only restates the precondition
+        VarValAction("noop", [("x", 1)], [("x", 1)], 1),
+        VarValAction("set_y", [("x", 1), ("y", 0)], [("x", 1), ("y", 1)], 1),
+        VarValAction("no_effect", [("x", 0)], [], 1),
+        VarValAction("set_y_again", [("x", 1), ("y", 0)], [("y", 1), ("x", 1)], 1),
+    ]
+    assert remove_redundant_actions(actions) == [actions[1]]
+    columnar_actions = ColumnarActions.from_actions(actions, FactIndex())
+    assert list(remove_redundant_actions(columnar_actions)) == [actions[1]]
+
+
+def test_prune_mutexes():
+    facts = FactSet({"x": {0, 1}, "y": {0, 1}, "z": {0, 2}})
+    mutexes = [
+        [("x", 0), ("y", 0), ("z", 1)],  # kept without z = 1
+        [("x", 0), ("x", 1), ("z", 1)],  # only one variable left
+        [("x", 1), ("w", 0), ("x", 1), ("z", 2)],  # kept without w = 0 and x = 1 again
+        [("x", 0), ("y", 0)],  # same as the first group
+        [("y", 0), ("x", 0)],  # same facts as the first group, but in another order
+        [("z", 0)],
+    ]
+    assert prune_mutexes(mutexes, facts) == [
+        [("x", 0), ("y", 0)],
+        [("x", 1), ("z", 2)],
+        [("y", 0), ("x", 0)],
+    ]
+
+
 # %%
 test_none()  # abcdefghi
 test_values()  # abcdefgh
@@ -159,6 +221,9 @@ test_cl_merge_values()  # bcdef
 test_forward_none()  # abdefghi
 test_forward_cl_merge_values()  # def
 test_loop()  # f
+test_prune_task()
+test_remove_redundant_actions()
+test_prune_mutexes()
 
 print("All tests passed.")
 
@@ -0,0 +1,122 @@
+#!%cd ~/dev/downward/src/translate
+#
+from scoping.actions import VarValAction
+from scoping.factset import FactSet
+from scoping.merging import (
+    MergeCache,
+    index_actions_by_precond,
+    index_actions_by_var,
+    merge,
+    merge_uncached,
+)
+
+actions = [
+    VarValAction("a0", [("x", 0), ("y", 0)], [("z", 1)], 1),
+    VarValAction("a1", [("x", 1), ("y", 0)], [("z", 1)], 1),
+    VarValAction("a2", [("x", 2), ("y", 0)], [("z", 1)], 1),
+    VarValAction("a3", [("x", 0), ("y", 1)], [("z", 1)], 1),
+]
+variable_domains = FactSet({"x": {0, 1, 2}, "y": {0, 1}, "z": {0, 1}})
+
+
+def test_cache_hits():
+    cache = MergeCache()
+    expected_facts, expected_info = merge_uncached(actions, ["z"], variable_domains)
+
+    facts, info = merge(actions, ["z"], variable_domains, cache=cache)
+    assert facts == expected_facts
+    assert info["Scoping merge attempts"] == expected_info["Scoping merge attempts"]
+    assert info["Scoping merge cache misses"] == 1
+
+    # Same preconditions in a different order, with different relevant variables
+    facts.add("w", 0)
+    facts, info = merge(actions[::-1], ["x", "z"], variable_domains, cache=cache)
+    assert facts == expected_facts
+    assert info["Scoping merge cache hits"] == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # An action that shares another's precondition doesn't change the result
+    facts, info = merge(actions + actions[:1], ["z"], variable_domains, cache=cache)
+    assert facts == expected_facts
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_cache_domains():
+    cache = MergeCache()
+    merge(actions, ["z"], variable_domains, cache=cache)
+    smaller_domains = FactSet({"x": {0, 1}, "y": {0, 1}, "z": {0, 1}})
+    facts, info = merge(actions, ["z"], smaller_domains, cache=cache)
+    assert info["Scoping merge cache misses"] == 1
+    assert facts == merge_uncached(actions, ["z"], smaller_domains)[0]
+    assert facts != merge_uncached(actions, ["z"], variable_domains)[0]
+
+
+def test_cache_eviction():
+    cache = MergeCache(maxsize=1)
+    merge(actions, ["z"], variable_domains, cache=cache)
+    merge(actions[:2], ["z"], variable_domains, cache=cache)
+    merge(actions, ["z"], variable_domains, cache=cache)
+    assert (cache.hits, cache.misses) == (0, 3)
+    assert len(cache.results) == 1
+
+
+def test_repeated_names():
+    # Named like axioms, so the names don't tell the actions apart
+    unnamed_actions = [
+        VarValAction("", [("x", 0)], [("z", 1)], 1),
+        VarValAction("", [("x", 1)], [("z", 1)], 1),
+        VarValAction("", [("y", 0)], [("z", 1)], 1),
+    ]
+    named_actions = [
+        VarValAction(f"b{i}", a.precondition, a.effect, a.cost)
+        for i, a in enumerate(unnamed_actions)
+    ]
+    domains = FactSet({"x": {0, 1}, "y": {0, 1}, "z": {0, 1}})
+    expected_facts = FactSet({"y": {0}})
+    assert merge_uncached(unnamed_actions, ["z"], domains)[0] == expected_facts
+    assert merge_uncached(named_actions, ["z"], domains)[0] == expected_facts
+
+    cache = MergeCache()
+    merge(named_actions, ["z"], domains, cache=cache)
+    facts, info = merge(unnamed_actions, ["z"], domains, cache=cache)
+    assert info["Scoping merge cache hits"] == 1
+    assert facts == expected_facts
+
+
+def test_indexes():
+    actions_by_var = index_actions_by_var(actions)
+    assert actions_by_var == {"x": actions, "y": actions}
+
+    assert index_actions_by_precond(actions, "x") == {
+        (("y", 0),): actions[:3],
+        (("y", 1),): actions[3:],
+    }
+    assert index_actions_by_precond(actions[:2], "y") == {
+        (("x", 0),): actions[:1],
+        (("x", 1),): actions[1:2],
+    }
+
+
+def test_free_variable():
+    # The action without x leaves it free, which covers the values of x that are
+    # missing for y=0
+    free_actions = [
+        VarValAction("c0", [("x", 0), ("y", 0)], [("z", 1)], 1),
+        VarValAction("c1", [("x", 1), ("y", 0)], [("z", 1)], 1),
+        VarValAction("c2", [("y", 0)], [("z", 1)], 1),
+        VarValAction("c3", [("x", 2), ("y", 1)], [("z", 1)], 1),
+    ]
+    domains = FactSet({"x": {0, 1, 2}, "y": {0, 1, 2}, "z": {0, 1}})
+    facts, _ = merge_uncached(free_actions, ["z"], domains)
+    assert facts == FactSet({"x": {2}, "y": {0, 1}})
+
+
+# %%
+test_cache_hits()
+test_cache_domains()
+test_cache_eviction()
+test_repeated_names()
+test_indexes()
+test_free_variable()
+
+print("All tests passed.")
@@ -0,0 +1,89 @@
+#!%cd ~/dev/downward/src/translate
+#
+import json
+import os
+import tempfile
+
+from scoping.core import scope_sas_task
+from scoping.options import ScopingOptions
+from scoping.profiler import ScopingProfiler
+from scoping.sas_parser import SasTaskReader
+from scoping.tests.test_sas_reader import SAS
+
+
+def make_sas_task():
+    # Scoping doesn't support conditional effects
+    return SasTaskReader.from_str(SAS.replace("1 0 0 1 0 1", "0 1 0 1"))
+
+
+def test_phases():
+    profiler = ScopingProfiler()
+    with profiler.phase("outer"):
+        with profiler.phase("inner", round=1):
+            pass
+        with profiler.phase("inner", round=2):
+            pass
+    totals = profiler.get_phase_totals()
+    assert totals["outer"]["calls"] == 1
+    assert totals["inner"]["calls"] == 2
+    assert totals["outer"]["wall"] >= totals["inner"]["wall"]
+    depths = {event["name"]: event["depth"] for event in profiler.events}
+    assert depths == {"outer": 0, "inner": 1}
+
+
+def test_disabled():
+    profiler = ScopingProfiler(enabled=False)
+    with profiler.phase("outer"):
+        profiler.count("facts")
+        profiler.record_iterations("loop", 3)
+    assert not profiler.events
+    assert not profiler.counters
+    assert not profiler.iterations
+
+
+def test_scope_sas_task():
+    sas_task = make_sas_task()
+    expected_sas, expected_info = scope_sas_task(sas_task, ScopingOptions())
+    profiler = ScopingProfiler()
+    scoped_sas, info = scope_sas_task(sas_task, ScopingOptions(), profiler=profiler)
+    assert scoped_sas == expected_sas
+    assert info == expected_info
+
+    summary = profiler.summary()
+    for phase in ["from_sas", "backward relevance", "prune task", "to_sas"]:
+        assert phase in summary["phases"]
+    assert summary["iterations"]["scoping loop"][0] >= 1
+    assert len(summary["iterations"]["backward relevance"]) == sum(
+        summary["iterations"]["scoping loop"]
+    )
+    counters = summary["counters"]
+    assert counters["Scoping merge attempts"] == info["Scoping merge attempts"]
+    assert counters["Scoping backward actions touched"] > 0
+
+
+def test_dump():
+    profiler = ScopingProfiler()
+    scope_sas_task(make_sas_task(), ScopingOptions(), profiler=profiler)
+    with tempfile.TemporaryDirectory() as profile_dir:
+        profile_path = os.path.join(profile_dir, "profile.json")
+        profiler.dump(profile_path)
+        with open(profile_path) as f:
+            profile = json.load(f)
+        assert len(profile["events"]) == len(profiler.events)
+
+        trace_path = os.path.join(profile_dir, "trace.json")
+        profiler.dump(trace_path, format="chrome")
+        with open(trace_path) as f:
+            trace = json.load(f)
+        phases = [e for e in trace["traceEvents"] if e["ph"] == "X"]
+        assert len(phases) == len(profiler.events)
+        assert all(e["dur"] >= 0 for e in phases)
+
+
+# %%
+test_phases()
+test_disabled()
+test_scope_sas_task()
+test_dump()
+
+print("All tests passed.")
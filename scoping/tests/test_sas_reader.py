@@ -0,0 +1,114 @@
+#!%cd ~/dev/downward/src/translate
+#
+import io
+
+from scoping.sas_parser import SasParser, SasTaskReader
+
+SAS = """begin_version
+3
+end_version
+begin_metric
+1
+end_metric
+3
+begin_variable
+var0
+-1
+2
+Atom at(ball, rooma)
+Atom at(ball, roomb)
+end_variable
+begin_variable
+var1
+-1
+2
+Atom free(left)
+NegatedAtom free(left)
+end_variable
+begin_variable
+var2
+0
+2
+Atom new-axiom@0()
+NegatedAtom new-axiom@0()
+end_variable
+1
+begin_mutex_group
+2
+0 0
+0 1
+end_mutex_group
+begin_state
+0
+0
+1
+end_state
+begin_goal
+1
+0 1
+end_goal
+2
+begin_operator
+move ball rooma roomb
+1
+1 0
+1
+0 0 0 1
+3
+end_operator
+begin_operator
+drop ball
+0
+2
+0 0 -1 1
+1 0 0 1 0 1
+1
+end_operator
+1
+begin_rule
+1
+1 0
+2 1 0
+end_rule
+"""
+
+
+def output(sas_task):
+    f = io.StringIO()
+    sas_task.output(f)
+    return f.getvalue()
+
+
+def test_round_trip():
+    sas_task = SasTaskReader.from_str(SAS)
+    assert output(sas_task) == SAS
+    assert SasTaskReader(io.StringIO(SAS)).read().operators[1].pre_post == [
+        (0, -1, 1, []),
+        (1, 0, 1, [(0, 0)]),
+    ]
+
+
+def test_matches_sas_parser():
+    # SasParser can't handle axioms or conditional effects, so leave them out
+    sas = SAS[: SAS.index("1\nbegin_rule")] + "0\n"
+    sas = sas.replace("1 0 0 1 0 1", "0 1 0 1")
+    parser = SasParser(s_sas=sas)
+    parser.parse()
+    assert output(SasTaskReader.from_str(sas)) == output(parser.to_fd())
+
+
+def test_malformed():
+    try:
+        SasTaskReader.from_str(SAS.replace("end_mutex_group", "end_mutex"))
+    except ValueError as e:
+        assert "end_mutex_group" in str(e)
+    else:
+        assert False, "Expected a ValueError"
+
+
+# %%
+test_round_trip()
+test_matches_sas_parser()
+test_malformed()
+
+print("All tests passed.")
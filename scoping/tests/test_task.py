@@ -0,0 +1,63 @@
+#!%cd ~/dev/downward/src/translate
+#
+import io
+
+from scoping.core import scope
+from scoping.factset import FactSet
+from scoping.options import ScopingOptions
+from scoping.scripts.benchmark_scoping import task_generators
+from scoping.task import SasRemapping, ScopingTask
+from scoping.tests.test_loop import make_task
+
+
+def sas_output(sas_task):
+    f = io.StringIO()
+    sas_task.output(f)
+    return f.getvalue()
+
+
+def test_sas_remapping():
+    scoping_task = make_task()
+    scoping_task.value_names = {
+        var: {val: f"{var}={val}" for val in values}
+        for var, values in scoping_task.domains
+    }
+    scoped_task = scope(scoping_task, ScopingOptions(1, 0, 1, 0, 0))
+    remapping = SasRemapping(scoped_task.domains)
+    assert remapping.variables == ["w", "x", "y", "z"]
+    assert remapping.values[3] == [0, 2]
+    assert remapping.map_facts([("z", 2), ("w", 1)]) == [(3, 1), (0, 1)]
+
+    sas_task = remapping.to_sas(scoped_task)
+    assert sas_output(sas_task) == sas_output(scoped_task.to_sas())
+    assert sas_task.variables.value_names[3] == ["z=0", "z=2"]
+
+
+def test_unknown_facts():
+    remapping = SasRemapping(FactSet({0: {0, 2}}))
+    assert remapping.map_facts([(0, 2)]) == [(0, 1)]
+    for fact in [(0, 1), (0, -1), (0, 3), (1, 0)]:
+        try:
+            remapping.map_facts([fact])
+        except KeyError:
+            pass
+        else:
+            assert False, fact
+
+
+def test_integer_remapping():
+    for generate_task in task_generators.values():
+        scoping_task = ScopingTask.from_sas(generate_task(300, seed=6).to_sas())
+        scoped_task = scope(scoping_task, ScopingOptions(1, 0, 1, 1, 0))
+        sas_task = SasRemapping(scoped_task.domains).to_sas(scoped_task)
+        assert sas_output(sas_task) == sas_output(scoped_task.to_sas())
+        round_trip = ScopingTask.from_sas(sas_task).to_sas()
+        assert sas_output(round_trip) == sas_output(sas_task)
+
+
+# %%
+test_sas_remapping()
+test_unknown_facts()
+test_integer_remapping()
+
+print("All tests passed.")
@@ -0,0 +1,81 @@
+#!%cd ~/dev/downward/src/translate
+#
+import itertools
+
+from scoping.actions import VarValAction
+from scoping.backward import compute_goal_relevance
+from scoping.columnar import ColumnarActions, ColumnarScopingTask
+from scoping.factset import FactIndex
+from scoping.scripts.benchmark_scoping import task_generators
+from scoping.task import ScopingTask
+from scoping.tests.test_loop import make_task
+from scoping.vectorized import get_unique_action_ids, np, select_actions
+
+
+def test_select_actions():
+    if np is None:
+        return
+    scoping_task = make_task()
+    actions = ColumnarActions.from_actions(
+        scoping_task.actions * 2,
+        ColumnarScopingTask.from_scoping_task(scoping_task).actions.fact_index,
+    )
+    for action_ids in [[], [4, 0, 13], list(range(len(actions)))[::-1]]:
+        assert select_actions(actions, action_ids) == actions.select(action_ids)
+    assert get_unique_action_ids(actions) == actions.get_unique_ids()
+    assert get_unique_action_ids(actions.select([])) == []
+
+
+def test_vectorized_goal_relevance():
+    # Duplicate actions, an action with no precondition (g) and a precondition
+    # that stands for the whole domain of a variable (j)
+    wildcard_task = make_task()
+    wildcard_task.actions = wildcard_task.actions * 2 + [
+        VarValAction("j", [("v", -1)], [("y", 1)], 1)
+    ]
+    tasks = [make_task(), wildcard_task] + [
+        ScopingTask.from_sas(generate_task(300, seed=4).to_sas())
+        for generate_task in task_generators.values()
+    ]
+    for scoping_task in tasks:
+        columnar_task = ColumnarScopingTask.from_scoping_task(scoping_task)
+        for enable_causal_links, enable_fact_based in itertools.product(
+            [False, True], repeat=2
+        ):
+            options = (False, enable_causal_links, enable_fact_based)
+            facts, actions, _ = compute_goal_relevance(
+                columnar_task, *options, vectorize=False
+            )
+            vectorized_facts, vectorized_actions, _ = compute_goal_relevance(
+                columnar_task, *options
+            )
+            assert vectorized_facts == facts
+            assert vectorized_actions == actions
+            list_facts, list_actions, _ = compute_goal_relevance(scoping_task, *options)
+            assert vectorized_facts == list_facts
+            assert list(vectorized_actions) == list_actions
+
+
+def test_fact_index_is_unchanged():
+    if np is None:
+        return
+    scoping_task = make_task()
+    # Only the facts that the actions mention are in the index
+    actions = ColumnarActions.from_actions(scoping_task.actions, FactIndex())
+    columnar_task = ColumnarScopingTask.from_scoping_task(scoping_task, actions)
+    n_facts = len(actions.fact_index)
+    for enable_causal_links, enable_fact_based in itertools.product(
+        [False, True], repeat=2
+    ):
+        options = (False, enable_causal_links, enable_fact_based)
+        facts, _, _ = compute_goal_relevance(columnar_task, *options)
+        assert len(actions.fact_index) == n_facts
+        assert facts == compute_goal_relevance(scoping_task, *options)[0]
+
+
+# %%
+test_select_actions()
+test_vectorized_goal_relevance()
+test_fact_index_is_unchanged()
+
+print("All tests passed.")
@@ -0,0 +1,234 @@
+#!%cd ~/dev/downward/src/translate
+#
+import itertools
+import random
+
+from scoping.core import scope
+from scoping.options import ScopingOptions
+from scoping.profiler import ScopingProfiler
+from scoping.tests.test_loop import make_task
+from scoping.visualization import (
+    TaskGraph,
+    compute_backward_scoping_layer,
+    compute_forward_scoping_layer,
+    compute_layered_layout,
+    count_crossings,
+    get_layer_links,
+    get_scoping_layers,
+    iter_scoping_layers,
+    minimize_crossings,
+)
+
+
+def test_layers_match_per_layer_fixpoints():
+    scoping_task = make_task()
+    for options in itertools.product([False, True], repeat=4):
+        scoping_options = ScopingOptions(*options)
+        compute_scoping_layer = (
+            compute_forward_scoping_layer
+            if scoping_options.enable_forward_pass
+            else compute_backward_scoping_layer
+        )
+        layers = get_scoping_layers(scoping_task, scoping_options)
+        for layer, (facts_layer, actions_layer) in enumerate(layers, 1):
+            facts, actions, stopped_early = compute_scoping_layer(
+                layer, scoping_task, scoping_options
+            )
+            assert facts == facts_layer
+            assert sorted(a.name for a in actions) == sorted(
+                a.name for a in actions_layer
+            )
+            assert stopped_early == (layer < len(layers))
+
+
+def test_layers_are_lazy():
+    scoping_options = ScopingOptions(0, 0, 1, 0, 0)
+    layers = iter_scoping_layers(make_task(), scoping_options)
+    facts_layer, actions_layer = next(layers)
+    assert sorted(a.name for a in actions_layer) == ["c", "e", "f"]
+
+
+def find_successors_by_scan(action, fact_filter, prev_layer, forward, variables):
+    """Reference that scans every node of `prev_layer` for every source fact"""
+    source = action.precondition if forward else action.effect
+    action_parents = []
+    for fact in source:
+        if fact in fact_filter:
+            for node in prev_layer:
+                dest = node.effect if forward else node.precondition
+                fact_match = fact in dest
+                var_match = fact[0] in [var for var, val in dest]
+                if (
+                    fact_match or (variables and var_match)
+                ) and node not in action_parents:
+                    action_parents.append(node)
+    return action_parents
+
+
+def test_task_graph_parents():
+    scoping_task = make_task()
+    actions = {a.name: a for a in scoping_task.actions}
+    for options in itertools.product([False, True], repeat=4):
+        scoping_options = ScopingOptions(*options)
+        forward = scoping_options.enable_forward_pass
+        variables = not scoping_options.enable_fact_based
+        graph = TaskGraph(scoping_task, scoping_options)
+        layers = get_scoping_layers(scoping_task, scoping_options)
+        for prev_layer, layer, (fact_layer, _) in zip(
+            graph.layers, graph.layers[1:], layers
+        ):
+            for node in layer:
+                expected_parents = find_successors_by_scan(
+                    actions[node.name], fact_layer, prev_layer, forward, variables
+                ) or ([graph.roots[-1]] if forward else [])
+                assert node.parents == expected_parents
+                for parent in node.parents:
+                    assert parent.children.count(node) == 1
+
+
+def test_scope_returns_layers():
+    scoping_task = make_task()
+    for options in itertools.product([False, True], repeat=5):
+        scoping_options = ScopingOptions(*options)
+        profiler = ScopingProfiler()
+        scoped_task, layers = scope(
+            scoping_task, scoping_options, profiler=profiler, return_layers=True
+        )
+        expected_profiler = ScopingProfiler()
+        expected_task = scope(scoping_task, scoping_options, profiler=expected_profiler)
+        # Including the merge info of the first round, even if it reuses the layers
+        for key in [
+            "Scoping merge attempts",
+            "Scoping merge cache hits",
+            "Scoping merge cache misses",
+        ]:
+            assert profiler.counters[key] == expected_profiler.counters[key]
+        assert scoped_task.domains == expected_task.domains
+        assert scoped_task.actions == expected_task.actions
+        expected_layers = get_scoping_layers(scoping_task, scoping_options)
+        assert [facts for facts, _ in layers] == [facts for facts, _ in expected_layers]
+        assert [actions for _, actions in layers] == [
+            actions for _, actions in expected_layers
+        ]
+
+
+def test_count_crossings():
+    rng = random.Random(0)
+    for _ in range(200):
+        n_prev, n = rng.randint(1, 6), rng.randint(1, 6)
+        parents = [rng.sample(range(n_prev), rng.randint(0, n_prev)) for _ in range(n)]
+        prev_positions = rng.sample(range(n_prev), n_prev)
+        positions = rng.sample(range(n), n)
+        links = [
+            (prev_positions[u], positions[v]) for v in range(n) for u in parents[v]
+        ]
+        expected = sum(
+            (u1 - u2) * (v1 - v2) < 0
+            for (u1, v1), (u2, v2) in itertools.combinations(links, 2)
+        )
+        assert count_crossings(parents, prev_positions, positions) == expected
+
+
+def test_layered_layout():
+    scoping_task = make_task()
+    for options in itertools.product([False, True], repeat=4):
+        scoping_options = ScopingOptions(*options)
+        forward = scoping_options.enable_forward_pass
+        graph = TaskGraph(scoping_task, scoping_options)
+        layers = [layer for layer in graph.layers if layer]
+        coordinates = compute_layered_layout(layers, forward, node_spacing=30)
+        assert len(coordinates) == sum(len(layer) for layer in layers)
+        prev_x = None
+        for layer in layers:
+            xs = {coordinates[node][0] for node in layer}
+            assert len(xs) == 1
+            if prev_x is not None:
+                assert (xs.pop() > prev_x) == forward
+            prev_x = coordinates[layer[0]][0]
+            ys = sorted(coordinates[node][1] for node in layer)
+            assert all(y2 - y1 >= 30 - 1e-9 for y1, y2 in zip(ys, ys[1:]))
+
+        layer_links = get_layer_links(layers)
+        positions = minimize_crossings(layer_links)
+        initial_positions = [list(range(len(layer))) for layer in layers]
+        for i in range(1, len(layers)):
+            assert sorted(positions[i]) == initial_positions[i]
+        assert sum(
+            count_crossings(layer_links[i], positions[i - 1], positions[i])
+            for i in range(1, len(layers))
+        ) <= sum(
+            count_crossings(
+                layer_links[i], initial_positions[i - 1], initial_positions[i]
+            )
+            for i in range(1, len(layers))
+        )
+
+
+def test_collapse_task_graph():
+    scoping_task = make_task()
+    relevant_variables = {"y", "z"}
+    for options in itertools.product([False, True], repeat=4):
+        scoping_options = ScopingOptions(*options)
+        graph = TaskGraph(scoping_task, scoping_options)
+        for match_precondition in [False, True]:
+            layers = graph.collapse(relevant_variables, match_precondition)
+            assert len(layers) == len(graph.layers)
+            collapsed_nodes = {}
+            for layer, collapsed_layer in zip(graph.layers, layers):
+                members = [
+                    name
+                    for node in collapsed_layer
+                    for name in node.members or [node.name]
+                ]
+                assert sorted(members) == sorted(node.name for node in layer)
+                for collapsed_node in collapsed_layer:
+                    for name in collapsed_node.members or [collapsed_node.name]:
+                        collapsed_nodes[name] = collapsed_node
+                    if collapsed_node.members:
+                        assert len(collapsed_node.members) > 1
+                        group = [n for n in layer if n.name in collapsed_node.members]
+                        keys = {
+                            (
+                                tuple(
+                                    f for f in n.effect if f[0] in relevant_variables
+                                ),
+                                n.cost,
+                            )
+                            + (
+                                (
+                                    tuple(
+                                        f
+                                        for f in n.precondition
+                                        if f[0] in relevant_variables
+                                    ),
+                                )
+                                if match_precondition
+                                else ()
+                            )
+                            for n in group
+                        }
+                        assert len(keys) == 1
+                for node in layer:
+                    expected_parents = {
+                        collapsed_nodes[parent.name] for parent in node.parents
+                    }
+                    assert expected_parents <= set(collapsed_nodes[node.name].parents)
+            for root in graph.roots:
+                assert collapsed_nodes[root.name].members is None
+
+    # c, e and f all set z to 2 at cost 1, and none of them affects y
+    graph = TaskGraph(scoping_task, ScopingOptions(0, 0, 1, 0, 0))
+    layers = graph.collapse({"y"})
+    assert [sorted(node.members or []) for node in layers[1]] == [["c", "e", "f"]]
+
+
+# %%
+test_layers_match_per_layer_fixpoints()
+test_layers_are_lazy()
+test_task_graph_parents()
+test_scope_returns_layers()
+test_count_crossings()
+test_layered_layout()
+test_collapse_task_graph()
+
+print("All tests passed.")
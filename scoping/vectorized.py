@@ -0,0 +1,257 @@
+from array import array
+from typing import Tuple
+
+from scoping.columnar import ColumnarActions, ColumnarScopingTask
+from scoping.factset import FactSet
+from scoping.profiler import ScopingProfiler, disabled_profiler
+
+# NumPy is optional: without it, `compute_goal_relevance` uses its pure-Python loop
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def can_vectorize(scoping_task, enable_merging: bool) -> bool:
+    """Check whether `compute_vectorized_goal_relevance` applies to the task"""
+    return (
+        np is not None
+        and not enable_merging
+        and isinstance(scoping_task.actions, ColumnarActions)
+    )
+
+
+class IncidenceMatrix:
+    """A sparse action × fact incidence matrix, from the CSR columns of
+    ColumnarActions, with the products that backward relevance needs"""
+
+    def __init__(self, offsets, fact_ids, n_actions: int, n_facts: int):
+        self.fact_ids = np.frombuffer(fact_ids, dtype=np.int32)
+        offsets = np.frombuffer(offsets, dtype=np.uint32)
+        # The action (row) of each nonzero entry
+        self.action_ids = np.repeat(np.arange(n_actions), np.diff(offsets))
+        self.n_actions = n_actions
+        self.n_facts = n_facts
+
+    def get_actions_with_any(self, facts):
+        """Get the mask of actions with at least one of the facts in the mask `facts`"""
+        hits = self.action_ids[facts[self.fact_ids]]
+        actions = np.zeros(self.n_actions, dtype=bool)
+        actions[hits] = True
+        return actions
+
+    def get_facts_of(self, actions):
+        """Get the mask of facts of any of the actions in the mask `actions`"""
+        facts = np.zeros(self.n_facts, dtype=bool)
+        facts[self.fact_ids[actions[self.action_ids]]] = True
+        return facts
+
+
+def gather_rows(offsets, values, row_ids, value_type: str) -> Tuple[array, array]:
+    """Get the CSR offsets and values of the given rows (in that order) of the CSR
+    columns `offsets` and `values`, as arrays of the types that ColumnarActions uses"""
+    offsets = np.frombuffer(offsets, dtype=np.uint32).astype(np.int64)
+    values = np.frombuffer(values, dtype=np.dtype(value_type))
+    starts = offsets[row_ids]
+    lengths = offsets[row_ids + 1] - starts
+    new_offsets = np.zeros(len(row_ids) + 1, dtype=np.uint32)
+    np.cumsum(lengths, out=new_offsets[1:])
+    positions = np.repeat(starts - new_offsets[:-1], lengths) + np.arange(
+        new_offsets[-1]
+    )
+    new_values = array(value_type, values[positions].tobytes())
+    return array("I", new_offsets.tobytes()), new_values
+
+
+def select_actions(actions: ColumnarActions, action_ids) -> ColumnarActions:
+    """Do `actions.select(action_ids)` with NumPy gathers instead of a Python loop"""
+    action_ids = np.asarray(action_ids, dtype=np.int64)
+    selected = ColumnarActions(actions.fact_index)
+    selected.name_offsets, names = gather_rows(
+        actions.name_offsets, actions.names, action_ids, "B"
+    )
+    selected.names = bytearray(names.tobytes())
+    selected.pre_offsets, selected.pre_facts = gather_rows(
+        actions.pre_offsets, actions.pre_facts, action_ids, "i"
+    )
+    selected.eff_offsets, selected.eff_facts = gather_rows(
+        actions.eff_offsets, actions.eff_facts, action_ids, "i"
+    )
+    selected.costs = array(
+        "q", np.frombuffer(actions.costs, dtype=np.int64)[action_ids].tobytes()
+    )
+    return selected
+
+
+def hash_rows(offsets, values, value_type: str):
+    """Hash each row of the CSR columns `offsets` and `values` (as a polynomial in
+    its values, modulo 2**64)"""
+    offsets = np.frombuffer(offsets, dtype=np.uint32).astype(np.int64)
+    values = np.frombuffer(values, dtype=np.dtype(value_type)).astype(np.uint64)
+    lengths = np.diff(offsets)
+    hashes = np.zeros(len(lengths), dtype=np.uint64)
+    if len(values) == 0:
+        return hashes
+    positions = np.arange(len(values)) - np.repeat(offsets[:-1], lengths)
+    base = np.uint64(0x9E3779B97F4A7C15)
+    terms = (values + np.uint64(1)) * base ** positions.astype(np.uint64)
+    nonempty = lengths > 0
+    hashes[nonempty] = np.add.reduceat(terms, offsets[:-1][nonempty])
+    return hashes
+
+
+def get_unique_action_ids(actions: ColumnarActions) -> list[int]:
+    """Do `actions.get_unique_ids()`, but only compare the actions in Python if their
+    hashes collide"""
+    hashes = np.frombuffer(actions.costs, dtype=np.int64).astype(np.uint64)
+    for offsets, values, value_type in [
+        (actions.name_offsets, actions.names, "B"),
+        (actions.pre_offsets, actions.pre_facts, "i"),
+        (actions.eff_offsets, actions.eff_facts, "i"),
+    ]:
+        hashes = hashes * np.uint64(1000003) ^ hash_rows(offsets, values, value_type)
+    _, inverse, counts = np.unique(hashes, return_inverse=True, return_counts=True)
+    colliding = np.flatnonzero(counts[inverse] > 1)
+    if len(colliding) == 0:
+        return list(range(len(actions)))
+    is_unique = np.ones(len(actions), dtype=bool)
+    is_unique[colliding] = False
+    candidates = select_actions(actions, colliding)
+    is_unique[colliding[candidates.get_unique_ids()]] = True
+    return np.flatnonzero(is_unique).tolist()
+
+
+def compute_vectorized_goal_relevance(
+    scoping_task: ColumnarScopingTask,
+    enable_causal_links: bool = False,
+    enable_fact_based: bool = False,
+    profiler: ScopingProfiler = disabled_profiler,
+) -> Tuple[FactSet, ColumnarActions, dict]:
+    """Compute the goal-relevant facts and actions of a task with columnar actions,
+    without merging, as `compute_goal_relevance` does.
+
+    Facts are boolean vectors over the fact ids, and each iteration is two sparse
+    products with the action × fact incidence matrices: one finds the actions whose
+    effects hit the filtered facts, and the other collects those actions'
+    precondition facts. The causal-link filter counts the affected values of each
+    variable with `np.bincount`.
+    """
+    actions = scoping_task.actions
+    domains = scoping_task.domains
+    init = scoping_task.init
+    # Give ids to any facts that no action mentions, after those of the actions'
+    # fact index, without adding them to it (it's shared with the task)
+    action_fact_ids = actions.fact_index.ids
+    fact_list = list(actions.fact_index.facts)
+    extra_fact_ids = {}
+
+    def get_fact_id(fact):
+        fact_id = action_fact_ids.get(fact)
+        if fact_id is None:
+            fact_id = extra_fact_ids.get(fact)
+            if fact_id is None:
+                fact_id = extra_fact_ids[fact] = len(fact_list)
+                fact_list.append(fact)
+        return fact_id
+
+    goal_ids = [get_fact_id(fact) for fact in scoping_task.goal]
+    init_ids = np.array([get_fact_id(fact) for fact in init], dtype=np.int64)
+    domain_ids = [get_fact_id((var, val)) for var, values in domains for val in values]
+    n_facts = len(fact_list)
+    n_actions = len(actions)
+
+    var_ids = {}
+    fact_vars = np.array(
+        [var_ids.setdefault(var, len(var_ids)) for var, _ in fact_list],
+        dtype=np.int64,
+    )
+    n_vars = len(var_ids)
+    in_domains = np.zeros(n_facts, dtype=bool)
+    in_domains[domain_ids] = True
+    # A precondition of (var, -1) stands for every value in the domain of var
+    wildcards = [
+        (fact_id, [get_fact_id((var, val)) for val in domains[var]])
+        for fact_id, (var, val) in enumerate(fact_list)
+        if val == -1
+    ]
+
+    effects = IncidenceMatrix(
+        actions.eff_offsets, actions.eff_facts, n_actions, n_facts
+    )
+    preconditions = IncidenceMatrix(
+        actions.pre_offsets, actions.pre_facts, n_actions, n_facts
+    )
+    init_facts = np.zeros(n_facts, dtype=bool)
+    init_facts[init_ids] = True
+    init_vars = fact_vars[init_ids]
+
+    def coarsen_to_variables(facts):
+        has_var = np.zeros(n_vars, dtype=bool)
+        has_var[fact_vars[facts]] = True
+        return facts | (in_domains & has_var[fact_vars])
+
+    relevant_facts = np.zeros(n_facts, dtype=bool)
+    relevant_facts[goal_ids] = True
+    if not enable_fact_based:
+        relevant_facts = coarsen_to_variables(relevant_facts)
+    relevant_actions = np.zeros(n_actions, dtype=bool)
+    prev_filtered_facts = np.zeros(n_facts, dtype=bool)
+    info = {
+        "Scoping merge attempts": 0,
+        "Scoping merge cache hits": 0,
+        "Scoping merge cache misses": 0,
+    }
+    prev_facts = None
+    n_prev_actions = -1
+    n_iterations = 0
+    n_actions_found = 0
+    while (
+        prev_facts is None
+        or not np.array_equal(relevant_facts, prev_facts)
+        or n_actions_found != n_prev_actions
+    ):
+        prev_facts, n_prev_actions = relevant_facts, n_actions_found
+        n_iterations += 1
+        filtered_facts = relevant_facts
+        if enable_causal_links:
+            affected_facts = effects.get_facts_of(relevant_actions)
+            n_affected_values = np.bincount(
+                fact_vars[affected_facts], minlength=n_vars
+            )[init_vars]
+            unthreatened = n_affected_values == 0
+            if enable_fact_based:
+                unthreatened |= (n_affected_values == 1) & affected_facts[init_ids]
+            unthreatened_init_facts = np.zeros(n_facts, dtype=bool)
+            unthreatened_init_facts[init_ids[unthreatened]] = True
+            filtered_facts = relevant_facts & ~unthreatened_init_facts
+        if not enable_fact_based:
+            filtered_facts = coarsen_to_variables(filtered_facts)
+
+        new_facts = filtered_facts & ~prev_filtered_facts
+        new_actions = effects.get_actions_with_any(new_facts) & ~relevant_actions
+        profiler.count("Scoping backward facts touched", int(new_facts.sum()))
+        profiler.count("Scoping backward actions touched", int(new_actions.sum()))
+        relevant_actions |= new_actions
+        n_actions_found = int(relevant_actions.sum())
+        prev_filtered_facts = filtered_facts
+
+        precond_facts = preconditions.get_facts_of(relevant_actions)
+        for fact_id, domain_ids in wildcards:
+            if precond_facts[fact_id]:
+                precond_facts[fact_id] = False
+                precond_facts[domain_ids] = True
+        relevant_facts = precond_facts | filtered_facts
+
+    profiler.record_iterations("backward relevance", n_iterations)
+    relevant_facts |= init_facts
+    facts = FactSet()
+    for fact_id in np.flatnonzero(relevant_facts):
+        facts.add(*fact_list[fact_id])
+    relevant_actions = select_actions(actions, np.flatnonzero(relevant_actions))
+    # The same action may appear more than once. Copies have the same effect, so
+    # they become relevant together, and are only de-duplicated here (which makes
+    # the profiler count them separately).
+    unique_ids = get_unique_action_ids(relevant_actions)
+    if len(unique_ids) < len(relevant_actions):
+        relevant_actions = select_actions(relevant_actions, unique_ids)
+    return facts, relevant_actions, info
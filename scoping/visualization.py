@@ -1,64 +1,83 @@
+from collections import defaultdict
 import math
+from typing import Any, Callable, Iterator
 
 from scoping.task import ScopingTask, VarValPair, VarValAction
 from scoping.options import ScopingOptions
 from scoping.backward import goal_relevance_step, coarsen_facts_to_variables
 from scoping.forward import reachability_step
 from scoping.factset import FactSet
+from scoping.merging import MergeCache
 
 
-def compute_forward_scoping_layer(
-    layer: int,
+class FixpointLayers:
+    """Run the fixpoint of `step`, starting from `facts`, and iterate over the new
+    facts and actions of each layer as it goes, along with whether the fixpoint is
+    still going (i.e. whether more layers might follow). The last layer adds `init`.
+
+    Once the iteration is over, `facts` and `actions` hold the result of the
+    fixpoint, and `info` any info that the steps report about it."""
+
+    def __init__(
+        self,
+        facts: FactSet,
+        step: Callable[
+            [FactSet, list[VarValAction]], tuple[FactSet, list[VarValAction]]
+        ],
+        init: list[VarValPair],
+    ):
+        self.facts = facts
+        self.actions = []
+        self.step = step
+        self.init = init
+        self.info = {}
+
+    def __iter__(self) -> Iterator[tuple[FactSet, list[VarValAction], bool]]:
+        facts = self.facts
+        actions = self.actions
+        prev_facts = None
+        prev_actions = []
+
+        def get_new_facts_and_actions():
+            new_facts = FactSet(
+                {var: val for (var, val) in facts if (var, val) not in prev_facts}
+            )
+            prev_action_set = set(prev_actions)
+            new_actions = [a for a in actions if a not in prev_action_set]
+            return new_facts, new_actions
+
+        while facts != prev_facts or len(actions) != len(prev_actions):
+            prev_facts, prev_actions = facts, actions
+            facts, actions = self.step(facts, actions)
+            self.facts, self.actions = facts, actions
+            new_facts, new_actions = get_new_facts_and_actions()
+            yield new_facts, new_actions, True
+        facts.add(self.init)
+        new_facts, new_actions = get_new_facts_and_actions()
+        yield new_facts, new_actions, False
+
+
+def iter_forward_scoping_layers(
     task: ScopingTask,
     _: ScopingOptions,
-) -> tuple[FactSet, list[VarValAction], bool]:
-    reachable_facts = FactSet(task.init)
-    reachable_actions = []
-    prev_facts = None
-    prev_actions = []
-    n_levels = 0
-    stopped_early = False
-    while reachable_facts != prev_facts or len(reachable_actions) != len(prev_actions):
-        prev_facts, prev_actions = reachable_facts, reachable_actions
-        reachable_facts, reachable_actions = reachability_step(
-            reachable_facts,
-            actions=task.actions,
-        )
-        n_levels += 1
-        if n_levels >= layer:
-            stopped_early = True
-            break
-    if not stopped_early:
-        reachable_facts.add(task.init)
-    new_facts = FactSet(
-        {var: val for (var, val) in reachable_facts if (var, val) not in prev_facts}
-    )
-    new_actions = [a for a in reachable_actions if a not in prev_actions]
-    return new_facts, new_actions, stopped_early
+) -> FixpointLayers:
+    def step(reachable_facts, _):
+        return reachability_step(reachable_facts, actions=task.actions)
 
+    return FixpointLayers(FactSet(task.init), step, task.init)
 
-def compute_backward_scoping_layer(
-    layer: int,
+
+def iter_backward_scoping_layers(
     task: ScopingTask,
     options: ScopingOptions,
-) -> tuple[FactSet, list[VarValAction], bool]:
-    if layer is None:
-        layer = math.inf
+    merge_cache: MergeCache = None,
+) -> FixpointLayers:
     enable_merging: bool = options.enable_merging
     enable_causal_links: bool = options.enable_causal_links
     enable_fact_based: bool = options.enable_fact_based
 
-    relevant_facts = FactSet(task.goal)
-    if not enable_fact_based:
-        coarsen_facts_to_variables(relevant_facts, task.domains)
-    relevant_actions = []
-    prev_facts = None
-    prev_actions = []
-    n_levels = 0
-    stopped_early = False
-    while relevant_facts != prev_facts or len(relevant_actions) != len(prev_actions):
-        prev_facts, prev_actions = relevant_facts, relevant_actions
-        relevant_facts, relevant_actions, _ = goal_relevance_step(
+    def step(relevant_facts, relevant_actions):
+        relevant_facts, relevant_actions, info = goal_relevance_step(
             task.domains,
             relevant_facts,
             task.init,
@@ -67,18 +86,52 @@ def compute_backward_scoping_layer(
             enable_merging,
             enable_causal_links,
             enable_fact_based=enable_fact_based,
+            merge_cache=merge_cache,
         )
-        n_levels += 1
-        if n_levels >= layer:
-            stopped_early = True
-            break
-    if not stopped_early:
-        relevant_facts.add(task.init)
-    new_facts = FactSet(
-        {var: val for (var, val) in relevant_facts if (var, val) not in prev_facts}
-    )
-    new_actions = [a for a in relevant_actions if a not in prev_actions]
-    return new_facts, new_actions, stopped_early
+        # As in compute_goal_relevance, the info is that of the last merge
+        if enable_merging:
+            layers.info = info
+        return relevant_facts, relevant_actions
+
+    relevant_facts = FactSet(task.goal)
+    if not enable_fact_based:
+        coarsen_facts_to_variables(relevant_facts, task.domains)
+    layers = FixpointLayers(relevant_facts, step, task.init)
+    layers.info = {
+        "Scoping merge attempts": 0,
+        "Scoping merge cache hits": 0,
+        "Scoping merge cache misses": 0,
+    }
+    return layers
+
+
+def get_scoping_layer(
+    layers: FixpointLayers,
+    layer: int = None,
+) -> tuple[FactSet, list[VarValAction], bool]:
+    """Get the given (1-based) layer, or the last one if the fixpoint finishes first
+    or `layer` is None"""
+    if layer is None:
+        layer = math.inf
+    for n_levels, (new_facts, new_actions, stopped_early) in enumerate(layers, 1):
+        if n_levels >= layer or not stopped_early:
+            return new_facts, new_actions, stopped_early
+
+
+def compute_forward_scoping_layer(
+    layer: int,
+    task: ScopingTask,
+    options: ScopingOptions,
+) -> tuple[FactSet, list[VarValAction], bool]:
+    return get_scoping_layer(iter_forward_scoping_layers(task, options), layer)
+
+
+def compute_backward_scoping_layer(
+    layer: int,
+    task: ScopingTask,
+    options: ScopingOptions,
+) -> tuple[FactSet, list[VarValAction], bool]:
+    return get_scoping_layer(iter_backward_scoping_layers(task, options), layer)
 
 
 class Node:
@@ -88,12 +141,18 @@ class Node:
         precondition: list[VarValPair],
         effect: list[VarValPair],
         parents: list["Node"] = None,
+        cost: int = 0,
+        members: list[str] = None,
     ) -> None:
         self.name = name
         self.precondition = precondition
         self.effect = effect
         self.parents = parents or []
         self.children = []
+        self.cost = cost
+        # Names of the actions that a collapsed node stands for (see
+        # `TaskGraph.collapse`)
+        self.members = members
 
         self.is_goal = self.name == "goal"
         self.is_init = self.name == "init"
@@ -105,25 +164,39 @@ class Node:
         )
 
 
+def get_scoping_fixpoint(
+    task: ScopingTask, options: ScopingOptions, merge_cache: MergeCache = None
+) -> FixpointLayers:
+    """Get the layers of the forward fixpoint if the forward pass is enabled, or
+    else the backward fixpoint"""
+    if options.enable_forward_pass:
+        return iter_forward_scoping_layers(task, options)
+    return iter_backward_scoping_layers(task, options, merge_cache)
+
+
+def iter_scoping_layers(
+    task: ScopingTask, options: ScopingOptions
+) -> Iterator[tuple[FactSet, list[VarValAction]]]:
+    """Yield the new facts and actions of each scoping layer, from a single run of
+    the forward or backward fixpoint"""
+    for facts_layer, actions_layer, _ in get_scoping_fixpoint(task, options):
+        yield facts_layer, actions_layer
+
+
 def get_scoping_layers(task: ScopingTask, options: ScopingOptions):
-    fact_layers: list[FactSet] = []
-    actions_layers: list[list[VarValAction]] = []
-    layer = 1
-    compute_next_scoping_layer = (
-        compute_forward_scoping_layer
-        if options.enable_forward_pass
-        else compute_backward_scoping_layer
-    )
-    while True:
-        facts_layer, actions_layer, stopped_early = compute_next_scoping_layer(
-            layer, task, options
-        )
-        layer += 1
-        fact_layers.append(facts_layer)
-        actions_layers.append(actions_layer)
-        if not stopped_early:
-            break
-    return list(zip(fact_layers, actions_layers))
+    return list(iter_scoping_layers(task, options))
+
+
+def trace_scoping_layers(
+    task: ScopingTask, options: ScopingOptions, merge_cache: MergeCache = None
+) -> tuple[list[tuple[FactSet, list[VarValAction]]], FactSet, list[VarValAction], dict]:
+    """Get the scoping layers, along with the facts and actions that the forward
+    (reachable) or backward (goal-relevant) fixpoint ends up with, and the info
+    (e.g. merge counts) that the fixpoint reports, as `compute_goal_relevance` does.
+    Merge results are cached in `merge_cache`, if given."""
+    fixpoint = get_scoping_fixpoint(task, options, merge_cache)
+    layers = [(facts, actions) for facts, actions, _ in fixpoint]
+    return layers, fixpoint.facts, fixpoint.actions, fixpoint.info
 
 
 def effect(x):
@@ -134,31 +207,52 @@ def precondition(x):
     return x.precondition
 
 
+def build_layer_index(
+    layer: list[Node], forward: bool = False
+) -> tuple[dict[VarValPair, list[Node]], dict[Any, list[Node]]]:
+    """Map each fact, and each variable, to the nodes of `layer` (in order) that have
+    it in their effect (forward) or precondition (backward)."""
+    dest_fn = effect if forward else precondition
+    fact_nodes = defaultdict(list)
+    var_nodes = defaultdict(list)
+    for node in layer:
+        for fact in dest_fn(node):
+            for index, key in [(fact_nodes, fact), (var_nodes, fact[0])]:
+                matching_nodes = index[key]
+                if not matching_nodes or matching_nodes[-1] is not node:
+                    matching_nodes.append(node)
+    return fact_nodes, var_nodes
+
+
 def find_successors(
     action: VarValAction,
     fact_filter: FactSet,
     prev_layer: list[Node],
     forward: bool = False,
     variables: bool = False,
+    layer_index: tuple[dict, dict] = None,
 ):
-    if forward:
-        source_fn, dest_fn = precondition, effect
-    else:
-        source_fn, dest_fn = effect, precondition
+    """Find the nodes of `prev_layer` that the action's newly relevant (or reachable)
+    facts come from. Pass the `build_layer_index` of `prev_layer` as `layer_index`
+    to avoid rebuilding it for every action."""
+    source_fn = precondition if forward else effect
+    if layer_index is None:
+        layer_index = build_layer_index(prev_layer, forward)
+    fact_nodes, var_nodes = layer_index
     action_parents = []
+    seen_parents = set()
     for fact in source_fn(action):
         if fact in fact_filter:
             # fact just became relevant
             # find first matching node in prev_layer
             # TODO: technically this might be wrong for merging
-            for node in prev_layer:
-                fact_match = fact in dest_fn(node)
-                var_match = fact[0] in [var for var, val in dest_fn(node)]
-                if (
-                    fact_match or (variables and var_match)
-                ) and node not in action_parents:
+            # A node with a matching fact always has a matching variable, so the
+            # variable matches are already in prev_layer order
+            matching_nodes = var_nodes if variables else fact_nodes
+            for node in matching_nodes.get(fact[0] if variables else fact, ()):
+                if node not in seen_parents:
+                    seen_parents.add(node)
                     action_parents.append(node)
-                    # break
     return action_parents
 
 
@@ -168,17 +262,27 @@ def build_action_node(
     prev_layer: list[Node],
     forward=False,
     variables=False,
+    layer_index: tuple[dict, dict] = None,
 ):
-    successors = find_successors(action, fact_filter, prev_layer, forward, variables)
-    return Node(action.name, action.precondition, action.effect, successors)
+    successors = find_successors(
+        action, fact_filter, prev_layer, forward, variables, layer_index
+    )
+    return Node(
+        action.name, action.precondition, action.effect, successors, action.cost
+    )
 
 
 class TaskGraph():
     def __init__(
         self,
         task: ScopingTask,
-        options: ScopingOptions
+        options: ScopingOptions,
+        scoping_layers: list[tuple[FactSet, list[VarValAction]]] = None,
     ):
+        # The scoping layers can be passed in if they were already computed, e.g. by
+        # `scope(..., return_layers=True)`
+        if scoping_layers is None:
+            scoping_layers = iter_scoping_layers(task, options)
         self.layers = []
         forward = options.enable_forward_pass
         variables = not options.enable_fact_based
@@ -196,11 +300,12 @@ class TaskGraph():
             prev_layer.append(star_node)
             nodes.append(star_node)
         self.layers.append(prev_layer)
-        for fact_layer, action_layer in get_scoping_layers(task, options):
+        for fact_layer, action_layer in scoping_layers:
             child_layer = []
+            layer_index = build_layer_index(prev_layer, forward)
             for action in action_layer:
                 action_node = build_action_node(
-                    action, fact_layer, prev_layer, forward, variables
+                    action, fact_layer, prev_layer, forward, variables, layer_index
                 )
                 if forward and not action_node.parents:
                     action_node.parents.append(star_node)
@@ -210,19 +315,25 @@ class TaskGraph():
             prev_layer = child_layer
 
         nodes.append(final_node)
+        child_sets = defaultdict(set)
         for node in nodes:
             if node.parents:
                 for parent in node.parents:
-                    if node not in parent.children:
+                    if node not in child_sets[parent]:
+                        child_sets[parent].add(node)
                         parent.children.append(node)
 
+        if forward:
+            final_facts = FactSet(final_node.precondition)
+        else:
+            final_facts = FactSet(final_node.effect)
         for node in nodes:
             if node is not final_node and node.name != "*":
                 if forward:
-                    if FactSet(final_node.precondition) in FactSet(node.effect):
+                    if final_facts in FactSet(node.effect):
                         node.children.append(final_node)
                 else:
-                    if FactSet(node.precondition) in FactSet(final_node.effect):
+                    if FactSet(node.precondition) in final_facts:
                         node.children.append(final_node)
 
         self.roots = [root_node]
@@ -231,9 +342,243 @@ class TaskGraph():
         self.final = final_node
 
         def to_node(action):
-            return Node(action.name, action.precondition, action.effect, [])
+            return Node(
+                action.name, action.precondition, action.effect, [], action.cost
+            )
 
-        node_names = [a.name for a in nodes]
+        node_names = set(a.name for a in nodes)
         self.other_nodes = [
             to_node(a) for a in task.actions if a.name not in node_names
         ]
+
+    def collapse(
+        self, relevant_variables: set[Any], match_precondition: bool = False
+    ) -> list[list[Node]]:
+        """Get the layers with the action nodes of each layer collapsed into one node
+        per (effect, cost) on the relevant variables, i.e. per partition that merging
+        works with, or with `match_precondition`, per (precondition, effect, cost) on
+        the relevant variables.
+
+        A collapsed node of several actions lists their names in `members`, and has
+        the facts on relevant variables that all of their preconditions share as its
+        precondition. Its parents are the collapsed nodes of its members' parents.
+        The root nodes are never collapsed."""
+        relevant_variables = set(relevant_variables)
+
+        def get_relevant_facts(facts):
+            return tuple(fact for fact in facts if fact[0] in relevant_variables)
+
+        def get_key(node):
+            if node in self.roots:
+                return node
+            key = (get_relevant_facts(node.effect), node.cost)
+            if match_precondition:
+                key += (get_relevant_facts(node.precondition),)
+            return key
+
+        collapsed_nodes = {}  # node -> the collapsed node that stands for it
+        layers = []
+        for layer in self.layers:
+            groups = defaultdict(list)
+            for node in layer:
+                groups[get_key(node)].append(node)
+            collapsed_layer = []
+            for group in groups.values():
+                if len(group) == 1:
+                    node = group[0]
+                    collapsed_node = Node(
+                        node.name, node.precondition, node.effect, [], node.cost
+                    )
+                else:
+                    shared_precondition = set(group[0].precondition).intersection(
+                        *(node.precondition for node in group[1:])
+                    )
+                    collapsed_node = Node(
+                        f"{group[0].name} (+{len(group) - 1} more)",
+                        [
+                            fact
+                            for fact in get_relevant_facts(group[0].precondition)
+                            if fact in shared_precondition
+                        ],
+                        list(get_relevant_facts(group[0].effect)),
+                        [],
+                        group[0].cost,
+                        members=[node.name for node in group],
+                    )
+                seen_parents = set()
+                for node in group:
+                    collapsed_nodes[node] = collapsed_node
+                    for parent in node.parents:
+                        collapsed_parent = collapsed_nodes[parent]
+                        if collapsed_parent not in seen_parents:
+                            seen_parents.add(collapsed_parent)
+                            collapsed_node.parents.append(collapsed_parent)
+                collapsed_layer.append(collapsed_node)
+            for collapsed_node in collapsed_layer:
+                for parent in collapsed_node.parents:
+                    parent.children.append(collapsed_node)
+            layers.append(collapsed_layer)
+        return layers
+
+
+def get_layer_links(layers: list[list[Node]]) -> list[list[list[int]]]:
+    """For each layer, the parents of each of its nodes in the previous layer, as
+    indices into that layer (the first layer has no parents)"""
+    layer_links = [[[] for _ in layers[0]]] if layers else []
+    for prev_layer, layer in zip(layers, layers[1:]):
+        prev_indices = {node: i for i, node in enumerate(prev_layer)}
+        layer_links.append(
+            [
+                [prev_indices[p] for p in node.parents if p in prev_indices]
+                for node in layer
+            ]
+        )
+    return layer_links
+
+
+def count_crossings(
+    parents: list[list[int]], prev_positions: list[int], positions: list[int]
+) -> int:
+    """Count the crossings between the links from one layer to the next, given the
+    positions of the nodes of both layers. Counts the inversions of the links' lower
+    ends when sorted by their upper ends, using a Fenwick tree (Barth et al., 2002)"""
+    links = sorted(
+        (prev_positions[u], positions[v])
+        for v, node_parents in enumerate(parents)
+        for u in node_parents
+    )
+    tree = [0] * (len(positions) + 1)
+    crossings = 0
+    for n_seen, (_, position) in enumerate(links):
+        # Links seen so far that end below `position` cross this one
+        i = position + 1
+        n_above = 0
+        while i > 0:
+            n_above += tree[i]
+            i -= i & -i
+        crossings += n_seen - n_above
+        i = position + 1
+        while i < len(tree):
+            tree[i] += 1
+            i += i & -i
+    return crossings
+
+
+def order_by_barycenter(
+    neighbors: list[list[int]], neighbor_positions: list[int], positions: list[int]
+) -> list[int]:
+    """Reorder a layer by the mean position of each node's neighbors in the adjacent
+    layer. Nodes without neighbors keep their current position."""
+
+    def barycenter(v):
+        if not neighbors[v]:
+            return positions[v]
+        return sum(neighbor_positions[u] for u in neighbors[v]) / len(neighbors[v])
+
+    order = sorted(range(len(positions)), key=lambda v: (barycenter(v), positions[v]))
+    new_positions = [0] * len(positions)
+    for position, v in enumerate(order):
+        new_positions[v] = position
+    return new_positions
+
+
+def minimize_crossings(
+    layer_links: list[list[list[int]]], n_sweeps: int = 4
+) -> list[list[int]]:
+    """Order the nodes within each layer to reduce the number of crossing links,
+    with alternating downward and upward barycenter sweeps. Returns the position of
+    each node in its layer, for the best ordering found."""
+    positions = [list(range(len(parents))) for parents in layer_links]
+    layer_children = [[[] for _ in parents] for parents in layer_links]
+    for i, parents in enumerate(layer_links[1:], 1):
+        for v, node_parents in enumerate(parents):
+            for u in node_parents:
+                layer_children[i - 1][u].append(v)
+
+    def get_n_crossings():
+        return sum(
+            count_crossings(layer_links[i], positions[i - 1], positions[i])
+            for i in range(1, len(positions))
+        )
+
+    best_crossings = get_n_crossings()
+    best_positions = [list(p) for p in positions]
+    for _ in range(n_sweeps):
+        if not best_crossings:
+            break
+        for i in range(1, len(positions)):
+            positions[i] = order_by_barycenter(
+                layer_links[i], positions[i - 1], positions[i]
+            )
+        for i in range(len(positions) - 2, -1, -1):
+            positions[i] = order_by_barycenter(
+                layer_children[i], positions[i + 1], positions[i]
+            )
+        n_crossings = get_n_crossings()
+        if n_crossings >= best_crossings:
+            break
+        best_crossings = n_crossings
+        best_positions = [list(p) for p in positions]
+    return best_positions
+
+
+def assign_layer_coordinates(targets: list[float], node_spacing: float) -> list[float]:
+    """Place the nodes of a layer (in order) as close to their targets as possible
+    while keeping them `node_spacing` apart, by averaging a downward and an upward
+    packing (each of which keeps the spacing, so their average does too)"""
+    down = []
+    for target in targets:
+        down.append(target if not down else max(target, down[-1] + node_spacing))
+    up = []
+    for target in reversed(targets):
+        up.append(target if not up else min(target, up[-1] - node_spacing))
+    up.reverse()
+    return [(a + b) / 2 for a, b in zip(down, up)]
+
+
+def compute_layered_layout(
+    layers: list[list[Node]],
+    forward: bool = False,
+    layer_spacing: float = 150,
+    node_spacing: float = 30,
+    n_sweeps: int = 4,
+) -> dict[Node, tuple[float, float]]:
+    """Lay out the graph's layers in columns, Sugiyama-style: order the nodes within
+    each layer to reduce crossings, then place each node near the mean height of its
+    parents. Links only join adjacent layers, so no dummy nodes are needed. Forward
+    graphs go left to right, and backward graphs right to left (the goal is on the
+    right either way)."""
+    layer_links = get_layer_links(layers)
+    positions = minimize_crossings(layer_links, n_sweeps)
+    coordinates = {}
+    prev_ys = []
+    for i, (layer, parents) in enumerate(zip(layers, layer_links)):
+        order = sorted(range(len(layer)), key=lambda v: positions[i][v])
+        targets = [
+            (
+                sum(prev_ys[u] for u in parents[v]) / len(parents[v])
+                if parents[v]
+                else None
+            )
+            for v in order
+        ]
+        if all(target is None for target in targets):
+            targets = [
+                (k - (len(order) - 1) / 2) * node_spacing for k in range(len(order))
+            ]
+        else:
+            # Nodes without parents are spaced out from their nearest neighbors that
+            # have them
+            first = next(k for k, target in enumerate(targets) if target is not None)
+            for k in range(first - 1, -1, -1):
+                targets[k] = targets[k + 1] - node_spacing
+            for k in range(first + 1, len(targets)):
+                if targets[k] is None:
+                    targets[k] = targets[k - 1] + node_spacing
+        ys = assign_layer_coordinates(targets, node_spacing)
+        x = (i if forward else len(layers) - 1 - i) * layer_spacing
+        prev_ys = [0] * len(layer)
+        for v, y in zip(order, ys):
+            prev_ys[v] = y
+            coordinates[layer[v]] = (x, y)
+    return coordinates
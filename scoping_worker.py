@@ -0,0 +1,159 @@
+from browser import bind, self
+
+import io
+import json
+
+from scoping.core import scope
+from scoping.options import ScopingOptions
+from scoping.sas_parser import SasTaskReader
+from scoping.task import ScopingTask
+from scoping.visualization import Node, TaskGraph, compute_layered_layout
+
+# This script runs in a Web Worker (declared in index.html), so that scoping doesn't
+# freeze the page. `main.py` sends it a JSON request with a job number, the uploaded
+# SAS content (and which upload it is), the scoping options and whether to collapse
+# equivalent actions in the graph, and it replies with
+# JSON messages tagged with the same job number: "progress" messages between stages,
+# then a "result" (or "error"). Each message is encoded once, graph data included, and
+# `main.py` parses it natively and hands the graph object to `main.js` as it is.
+
+# The tasks parsed from the latest upload, which are reused for every option
+# combination that is requested for it
+parsed_upload = None
+parsed_tasks = None
+
+
+def send(job, message_type, **data):
+    self.send(json.dumps(dict(data, job=job, type=message_type)))
+
+
+def get_graph_data(layers, sas_task, scoping_options):
+    # Graph data for `main.js`, in columns: node i is described by entry i of each of
+    # the "nodes" lists, and the links refer to nodes by these integer ids rather than
+    # by name. The nodes come with their positions in a layered layout (with the
+    # operators that aren't in the graph in a column of their own), so `main.js` only
+    # has to draw them
+    nodes = {
+        "name": [],
+        "group": [],
+        "precondition": [],
+        "effect": [],
+        "members": [],
+        "x": [],
+        "y": [],
+    }
+    node_ids = {}  # node name -> id
+    # (parent name, node id) pairs, turned into links once every node has an id
+    parent_names = []
+
+    graph_names = {
+        name
+        for layer in layers
+        for node in layer
+        for name in node.members or [node.name]
+    }
+    other_nodes = [
+        Node(op.name, [], []) for op in sas_task.operators if op.name not in graph_names
+    ]
+    layout = compute_layered_layout(
+        layers + [other_nodes], scoping_options.enable_forward_pass
+    )
+
+    def add_node(node, group, precondition=None, effect=None):
+        node_ids[node.name] = len(nodes["name"])
+        x, y = layout[node]
+        nodes["name"].append(node.name)
+        nodes["group"].append(group)
+        nodes["precondition"].append(precondition)
+        nodes["effect"].append(effect)
+        nodes["members"].append(node.members)
+        nodes["x"].append(x)
+        nodes["y"].append(y)
+
+    def to_strings(facts):
+        return [" ".join(str(x) for x in fact) for fact in facts]
+
+    for i in range(len(layers)):
+        layer = layers[i]
+        for node in layer:
+            if node.name not in node_ids:
+                add_node(
+                    node, i, to_strings(node.precondition), to_strings(node.effect)
+                )
+                for p in node.parents:
+                    parent_names.append((p.name, node_ids[node.name]))
+
+    for node in other_nodes:
+        add_node(node, len(layers))
+
+    links = {"source": [], "target": []}
+    for parent_name, node_id in parent_names:
+        links["source"].append(node_ids[parent_name])
+        links["target"].append(node_id)
+
+    return {
+        "nodes": nodes,
+        "links": links,
+        "is_forward": scoping_options.enable_forward_pass,
+    }
+
+
+def get_parsed_tasks(job, upload, sas_content):
+    global parsed_upload
+    global parsed_tasks
+
+    if upload != parsed_upload:
+        send(job, "progress", stage="Parsing")
+        sas_task = SasTaskReader.from_str(sas_content)
+        parsed_tasks = sas_task, ScopingTask.from_sas(sas_task)
+        parsed_upload = upload
+    return parsed_tasks
+
+
+def run_scoping(job, upload, sas_content, options, collapse_actions):
+    sas_task, scoping_task = get_parsed_tasks(job, upload, sas_content)
+    scoping_options = ScopingOptions(**options)
+
+    send(job, "progress", stage="Scoping")
+    scoped_task, scoping_layers = scope(
+        scoping_task, scoping_options, return_layers=True
+    )
+
+    send(job, "progress", stage="Building graph")
+    graph = TaskGraph(scoping_task, scoping_options, scoping_layers)
+    if collapse_actions:
+        # One node per partition of the actions that are equivalent on the variables
+        # that are left after scoping
+        layers = graph.collapse(scoped_task.domains.variables)
+    else:
+        layers = graph.layers
+    layers = [layer for layer in layers if layer]
+    graph_data = get_graph_data(layers, sas_task, scoping_options)
+
+    send(job, "progress", stage="Writing scoped task")
+    f = io.StringIO()
+    scoped_task.to_sas().output(f)
+
+    send(
+        job,
+        "result",
+        graph=graph_data,
+        layer_count=len(layers),
+        sas_content=f.getvalue(),
+    )
+
+
+@bind(self, "message")
+def message(ev):
+    request = json.loads(ev.data)
+    job = request["job"]
+    try:
+        run_scoping(
+            job,
+            request["upload"],
+            request["sas_content"],
+            request["options"],
+            request["collapse_actions"],
+        )
+    except Exception as e:
+        send(job, "error", message=f"{type(e).__name__}: {e}")
@@ -6,7 +6,7 @@ import sys
 import traceback
 from typing import Dict, List, Optional, Tuple, Union
 
-from scoping.sas_parser import SasParser
+from scoping.sas_parser import SasTaskReader
 
 VarValPair = Tuple[int, int]
 
@@ -709,9 +709,7 @@ def main(domain_filename=None, task_filename=None):
     timer = timers.Timer()
     if options.domain.endswith(".sas"):
         # Read the sas task
-        parser = SasParser(pth=options.domain)
-        parser.parse()
-        sas_task = parser.to_fd()
+        sas_task = SasTaskReader.from_path(options.domain)
 
         # Run causal graph filtering?
         if options.reorder_variables or options.filter_unimportant_vars: